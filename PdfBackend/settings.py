@@ -1,6 +1,8 @@
 import os
 from pathlib import Path
 
+from corsheaders.defaults import default_headers
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -32,12 +34,18 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Outermost, so its timings cover every other middleware too.
+    "question.middleware.PerformanceMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
+    # Sends list-view reads to QUESTION_READ_REPLICAS, if any.
+    "question.middleware.ReadReplicaMiddleware",
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # Needs request.user; does nothing unless QUESTION_PROFILE_DIR is set.
+    "question.middleware.ProfilingMiddleware",
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -67,11 +75,40 @@ WSGI_APPLICATION = 'PdfBackend.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        # django.db.backends.sqlite3 plus an in-process FIFO queue for writers.
+        'ENGINE': 'question.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # WAL: readers never wait for the writer. synchronous=NORMAL is
+            # safe under WAL (a power cut can lose the last commits, never
+            # corrupt). mmap_size: read pages straight from the page cache.
+            "init_command": (
+                "PRAGMA journal_mode=WAL;"
+                "PRAGMA synchronous=NORMAL;"
+                "PRAGMA mmap_size=268435456;"
+            ),
+            # Writers take the lock at BEGIN instead of failing on lock
+            # upgrade halfway through a transaction.
+            "transaction_mode": "IMMEDIATE",
+            # Busy timeout (seconds), also the limit for the write queue.
+            "timeout": 20,
+        },
     }
 }
 
+# Read replicas: QUESTION_DB_REPLICAS="/path/a.sqlite3,/path/b.sqlite3" adds
+# aliases replica1, replica2, ... Views with ``read_replica = True`` read
+# from them (question.routers); `manage.py sync_replicas` copies the primary
+# into them. A client reads from the primary for QUESTION_REPLICA_STICKY_SECONDS
+# after its own write, so keep the sync interval below that.
+QUESTION_READ_REPLICAS = []
+for _n, _path in enumerate(filter(None, os.environ.get("QUESTION_DB_REPLICAS", "").split(",")), start=1):
+    DATABASES[f"replica{_n}"] = {**DATABASES["default"], "NAME": _path, "TEST": {"MIRROR": "default"}}
+    QUESTION_READ_REPLICAS.append(f"replica{_n}")
+QUESTION_REPLICA_STICKY_SECONDS = 5
+
+DATABASE_ROUTERS = ["question.routers.ReplicaRouter"]
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -117,8 +154,128 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
+STORAGES = {
+    "default": {
+        # FileSystemStorage that reports write time to Server-Timing.
+        "BACKEND": "question.storage.InstrumentedFileSystemStorage",
+    },
+    "staticfiles": {
+        "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
+    },
+}
+
+# Resumable uploads (question.resumable): partial files live here, outside
+# MEDIA_ROOT so they are never served, until finished and used or
+# QUESTION_UPLOAD_SESSION_TTL seconds pass without a PATCH; `manage.py
+# purge_uploads` deletes expired ones.
+QUESTION_UPLOAD_SESSION_DIR = os.environ.get("QUESTION_UPLOAD_SESSION_DIR") or os.path.join(BASE_DIR, "upload-sessions")
+QUESTION_UPLOAD_SESSION_TTL = 24 * 60 * 60
+QUESTION_UPLOAD_MAX_SIZE = 100 * 1024 * 1024
+
+# An upload job (question.bulk) whose worker has not committed a chunk for
+# this many seconds is taken over by the next worker that polls.
+QUESTION_UPLOAD_JOB_TIMEOUT = int(os.environ.get("QUESTION_UPLOAD_JOB_TIMEOUT", 10 * 60))
+
+# Group commit for UploadCrop (question.groupcommit): QUESTION_GROUP_COMMIT_MS=5
+# batches single-crop uploads arriving within 5 ms into one transaction.
+# Experimental and off by default: it measured only about +5% throughput.
+_group_commit_ms = os.environ.get("QUESTION_GROUP_COMMIT_MS")
+QUESTION_GROUP_COMMIT = {"window_ms": float(_group_commit_ms), "max_batch": 32} if _group_commit_ms else None
+
+# Successful uploads sent with an Idempotency-Key are replayed to retries
+# for this many seconds (question.idempotency).
+QUESTION_IDEMPOTENCY_TTL = 24 * 60 * 60
+
+# Per-process admission control for the upload views (question.admission):
+# concurrent requests, how many more may wait, and for how many seconds,
+# before the answer is 429 with Retry-After.
+QUESTION_ADMISSION = {
+    "UploadCrop": {"slots": 8, "queue": 16, "timeout": 5},
+    "UploadCropBulk": {"slots": 2, "queue": 4, "timeout": 10},
+}
+
+# Shared directory for per-process metric snapshots when running several
+# workers; /metrics/ sums them. Unset: single-process, in-memory only.
+QUESTION_METRICS_DIR = os.environ.get("QUESTION_METRICS_DIR")
+QUESTION_METRICS_ALLOWED_IPS = ("127.0.0.1", "::1")
+
+# On-demand profiling (staff + "X-Profile: 1"); disabled while unset.
+QUESTION_PROFILE_DIR = os.environ.get("QUESTION_PROFILE_DIR")
+QUESTION_PROFILE_SAMPLE_INTERVAL = 0.005  # seconds between stack samples
+
+# Queries slower than this (ms) are logged with their plan; unset or 0 (the
+# default) disables the log and its extra EXPLAIN. String parameters are
+# logged as type and length only, unless QUESTION_SLOW_QUERY_PARAMS=1.
+# QUESTION_SLOW_QUERY_LOG is the JSONL file read by `manage.py slow_queries`.
+QUESTION_SLOW_QUERY_MS = float(os.environ.get("QUESTION_SLOW_QUERY_MS") or 0) or None
+QUESTION_SLOW_QUERY_PARAMS = os.environ.get("QUESTION_SLOW_QUERY_PARAMS") == "1"
+QUESTION_SLOW_QUERY_LOG = os.environ.get("QUESTION_SLOW_QUERY_LOG")
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {
+        "plain": {"format": "%(asctime)s %(levelname)s %(name)s %(message)s"},
+    },
+    "filters": {
+        # Fraction of sub-WARNING records kept; warnings and errors always pass.
+        "perf_sample": {
+            "()": "question.log.SamplingFilter",
+            "rate": float(os.environ.get("QUESTION_PERF_LOG_SAMPLE", "1.0")),
+        },
+        "upload_sample": {
+            "()": "question.log.SamplingFilter",
+            "rate": float(os.environ.get("QUESTION_UPLOAD_LOG_SAMPLE", "1.0")),
+        },
+    },
+    "handlers": {
+        # Request threads only enqueue; a listener thread writes to stderr.
+        "queue": {
+            "()": "question.log.NonBlockingHandler",
+            "maxsize": 10000,
+            "formatter": "plain",
+        },
+    },
+    "loggers": {
+        # One JSON line per request from question.middleware.PerformanceMiddleware,
+        # only with QUESTION_PERF_LOG_LEVEL=INFO (and QUESTION_PERF_LOG_SAMPLE to thin it).
+        "question.perf": {
+            "handlers": ["queue"],
+            "filters": ["perf_sample"],
+            "level": os.environ.get("QUESTION_PERF_LOG_LEVEL", "WARNING"),
+            "propagate": False,
+        },
+        "question.slow_query": {
+            "handlers": ["queue"],
+            "level": "WARNING",
+            "propagate": False,
+        },
+        # UploadCrop: DEBUG adds a capped preview of every received field.
+        "question.upload": {
+            "handlers": ["queue"],
+            "filters": ["upload_sample"],
+            "level": os.environ.get("QUESTION_UPLOAD_LOG_LEVEL", "INFO"),
+            "propagate": False,
+        },
+    },
+}
+
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:5173",  # Vite dev
     "http://127.0.0.1:5173",
 ]
-CORS_ALLOW_CREDENTIALS = True
\ No newline at end of file
+CORS_ALLOW_CREDENTIALS = True
+# Read-your-writes for API clients: echo X-Last-Write back on later reads.
+_TUS_HEADERS = ["Tus-Resumable", "Upload-Length", "Upload-Metadata", "Upload-Offset"]
+CORS_EXPOSE_HEADERS = [
+    "X-Last-Write",
+    "Idempotent-Replayed",
+    "Retry-After",
+    "Location",
+    "Upload-Expires",
+    "Tus-Version",
+    "Tus-Extension",
+    "Tus-Max-Size",
+    *_TUS_HEADERS,
+]
+CORS_ALLOW_HEADERS = (*default_headers, "x-last-write", "idempotency-key", *(h.lower() for h in _TUS_HEADERS))
\ No newline at end of file
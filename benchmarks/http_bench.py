@@ -0,0 +1,397 @@
+"""HTTP benchmark for the upload, list and taxonomy endpoints.
+
+Runs either in-process (Django test client against a throwaway SQLite copy
+seeded with ``manage.py seed_bank``) or against a running server::
+
+    python benchmarks/http_bench.py --questions 20000 -o before.json
+    python benchmarks/http_bench.py --url http://127.0.0.1:8000 --server-pid 1234
+    python benchmarks/http_bench.py --compare before.json -o after.json
+
+Every scenario reports p50/p95/p99 latency, throughput and errors; in-process
+runs also report SQL queries per request. The JSON carries the git commit
+and run parameters so results from different commits can be compared.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Query strings for /api/cropped-images/, filled from the discovered taxonomy.
+LIST_FILTERS = (
+    "",
+    "chapter={chapter}",
+    "chapter={chapter}&is_active=1",
+    "chapter={chapter}&difficulty=hard&is_active=1",
+    "verified=0",
+    "usage_types={usage}",
+    "subject={subject}&page=3",
+    "topic={topic}",
+)
+
+TAXONOMY_PATHS = (
+    "/api/classes/",
+    "/api/subjects/",
+    "/api/chapters/?class_id={class_name}",
+    "/api/concepts/?chapter_id={chapter}",
+    "/api/topics/?concept_id={concept}",
+    "/api/image-types/",
+    "/api/usage-types/",
+)
+
+SCENARIOS = ("list", "taxonomy", "upload", "upload-bulk")
+
+
+def _png(rng):
+    from io import BytesIO
+
+    from PIL import Image
+
+    buf = BytesIO()
+    Image.new("L", (240, 80), rng.randrange(256)).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def multipart(fields, files):
+    """Encode form fields and ``{name: (filename, bytes)}`` files; returns (body, content_type)."""
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+        )
+    for name, (filename, data) in files.items():
+        parts.append(
+            (
+                f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                "Content-Type: image/png\r\n\r\n"
+            ).encode()
+            + data
+            + b"\r\n"
+        )
+    parts.append(f"--{boundary}--\r\n".encode())
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+class InProcessTransport:
+    """Django test client, one per thread, with per-request query counting."""
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def request(self, method, path, body=None, content_type=None):
+        from django.db import connection
+        from django.test import Client
+        from django.test.utils import CaptureQueriesContext
+
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = Client()
+        kwargs = {"data": body, "content_type": content_type} if body is not None else {}
+        with CaptureQueriesContext(connection) as ctx:
+            started = time.perf_counter()
+            response = getattr(client, method.lower())(path, **kwargs)
+            content = b"".join(response.streaming_content) if response.streaming else response.content
+            elapsed = time.perf_counter() - started
+        return response.status_code, elapsed, len(ctx.captured_queries), content
+
+    def close(self):
+        from django.db import connections
+
+        connections.close_all()
+
+
+class HttpTransport:
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip("/")
+
+    def request(self, method, path, body=None, content_type=None):
+        req = urllib.request.Request(self.base_url + path, data=body, method=method)
+        if content_type:
+            req.add_header("Content-Type", content_type)
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(req, timeout=60) as response:
+                content = response.read()
+                code = response.status
+        except urllib.error.HTTPError as exc:
+            content = exc.read()
+            code = exc.code
+        return code, time.perf_counter() - started, None, content
+
+    def close(self):
+        pass
+
+
+def discover(transport):
+    """Pick real ids to build requests from, through the public API."""
+
+    def get(path):
+        code, _, _, content = transport.request("GET", path)
+        if code != 200:
+            raise SystemExit(f"GET {path} returned {code}; is the database seeded?")
+        return json.loads(content)
+
+    topics = get("/api/topics/")
+    image_types = get("/api/image-types/")
+    usage_types = get("/api/usage-types/")
+    if not topics or not image_types:
+        raise SystemExit("Need at least one topic and image type; run manage.py seed_bank first.")
+    return {"topics": topics, "image_types": image_types, "usage_types": usage_types}
+
+
+def build_request(scenario, taxonomy, rng):
+    topic = rng.choice(taxonomy["topics"])
+    ids = {
+        "class_name": topic["class_name_id"],
+        "subject": topic["subject_id"],
+        "chapter": topic["chapter_id"],
+        "concept": topic["concept_id"],
+        "topic": topic["id"],
+        "usage": rng.choice(taxonomy["usage_types"])["id"] if taxonomy["usage_types"] else "",
+    }
+    if scenario == "list":
+        return "GET", "/api/cropped-images/?" + rng.choice(LIST_FILTERS).format(**ids), None, None
+    if scenario == "taxonomy":
+        return "GET", rng.choice(TAXONOMY_PATHS).format(**ids), None, None
+
+    item = {
+        "classId": ids["class_name"],
+        "subjectId": ids["subject"],
+        "chapterId": ids["chapter"],
+        "conceptId": ids["concept"],
+        "topicId": ids["topic"],
+        "imageType": taxonomy["image_types"][0]["id"],
+        "difficulty": rng.choice(("easy", "medium", "hard")),
+        "rectPdf": json.dumps({"page": 1, "x": 10, "y": 20, "width": 300, "height": 80}),
+    }
+    if scenario == "upload":
+        return ("POST", "/api/upload-crop/") + multipart(item, {"image": ("crop.png", _png(rng))})
+
+    # upload-bulk: two questions, the first with one extra image.
+    items = [
+        dict(item, groupKey="a"),
+        dict(item, groupKey="a", groupIndex=2),
+        dict(item, groupKey="b"),
+    ]
+    files = {f"image_{i}": (f"{i}.png", _png(rng)) for i in range(len(items))}
+    return ("POST", "/api/upload-crop-bulk/") + multipart({"items": json.dumps(items)}, files)
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def run_scenario(transport, scenario, taxonomy, args):
+    rng = random.Random(f"{args.seed}:{scenario}")
+    # Build every request up front so encoding is not part of the measurement.
+    requests = [build_request(scenario, taxonomy, rng) for _ in range(args.warmup + args.requests)]
+    for method, path, body, content_type in requests[: args.warmup]:
+        transport.request(method, path, body, content_type)
+
+    def call(req):
+        code, elapsed, queries, _ = transport.request(*req)
+        return code, elapsed, queries
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(call, requests[args.warmup:]))
+    wall = time.perf_counter() - started
+
+    latencies = sorted(elapsed * 1000 for _, elapsed, _ in results)
+    queries = [q for _, _, q in results if q is not None]
+    return {
+        "requests": len(results),
+        "errors": sum(1 for code, _, _ in results if code >= 400),
+        "status_codes": dict(sorted(Counter(str(code) for code, _, _ in results).items())),
+        "throughput_rps": round(len(results) / wall, 2) if wall else None,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50), 3),
+            "p95": round(percentile(latencies, 95), 3),
+            "p99": round(percentile(latencies, 99), 3),
+            "mean": round(statistics.fmean(latencies), 3),
+            "max": round(latencies[-1], 3),
+        },
+        "queries": (
+            {"mean": round(statistics.fmean(queries), 2), "max": max(queries)} if queries else None
+        ),
+    }
+
+
+def git_info():
+    def git(*cmd):
+        try:
+            return subprocess.run(
+                ("git",) + cmd, cwd=ROOT, capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    status = git("status", "--porcelain", "--untracked-files=no")
+    return {"commit": git("rev-parse", "HEAD"), "dirty": bool(status) if status is not None else None}
+
+
+def _django_version():
+    try:
+        import django
+    except ImportError:
+        return None
+    return django.get_version()
+
+
+def peak_rss_kb(server_pid=None):
+    """Peak RSS of the server: this process in-process, else --server-pid via /proc."""
+    if server_pid is None:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    try:
+        with open(f"/proc/{server_pid}/status") as fh:
+            for line in fh:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def setup_in_process(args):
+    """Point Django at a scratch database and media dir, then migrate and seed."""
+    sys.path.insert(0, ROOT)
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "PdfBackend.settings")
+    from django.conf import settings
+
+    scratch = tempfile.mkdtemp(prefix="http-bench-")
+    db_path = os.path.join(scratch, "db.sqlite3")
+    if args.db:
+        shutil.copyfile(args.db, db_path)
+    settings.DATABASES["default"]["NAME"] = db_path
+    settings.MEDIA_ROOT = os.path.join(scratch, "media")
+    settings.DEBUG = False
+    settings.ALLOWED_HOSTS = ["testserver"]
+
+    import django
+    from django.core.management import call_command
+
+    django.setup()
+    call_command("migrate", verbosity=0)
+    if not args.db:
+        call_command(
+            "seed_bank",
+            seed=args.seed,
+            classes=args.classes,
+            chapters=args.chapters,
+            concepts=args.chapters * 3,
+            topics=args.chapters * 10,
+            questions=args.questions,
+            stdout=open(os.devnull, "w"),
+        )
+    return scratch
+
+
+def compare(current, baseline):
+    lines = [f"vs {baseline['meta'].get('git', {}).get('commit') or 'baseline'}:"]
+    for name, result in current["scenarios"].items():
+        base = baseline["scenarios"].get(name)
+        if not base:
+            continue
+
+        def delta(new, old):
+            return f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+
+        lines.append(
+            f"  {name:12} p50 {delta(result['latency_ms']['p50'], base['latency_ms']['p50'])}"
+            f"  p95 {delta(result['latency_ms']['p95'], base['latency_ms']['p95'])}"
+            f"  rps {delta(result['throughput_rps'], base['throughput_rps'])}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Benchmark a running server instead of an in-process client.")
+    parser.add_argument("--server-pid", type=int, help="With --url: read the server's peak RSS from /proc.")
+    parser.add_argument("--db", help="In-process: copy this seeded SQLite file instead of seeding.")
+    parser.add_argument("--questions", type=int, default=5000, help="In-process seed size.")
+    parser.add_argument("--classes", type=int, default=12)
+    parser.add_argument("--chapters", type=int, default=200)
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS, help="Repeatable; default: all.")
+    parser.add_argument("--requests", type=int, default=200, help="Measured requests per scenario.")
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--compare", help="Print deltas against an earlier result file.")
+    parser.add_argument("-o", "--output", help="Write JSON here instead of stdout.")
+    args = parser.parse_args(argv)
+
+    scratch = None
+    if args.url:
+        transport = HttpTransport(args.url)
+        dataset = {"url": args.url}
+    else:
+        scratch = setup_in_process(args)
+        transport = InProcessTransport()
+        dataset = {"db": args.db} if args.db else {
+            "questions": args.questions, "classes": args.classes, "chapters": args.chapters,
+        }
+
+    try:
+        taxonomy = discover(transport)
+        scenarios = {}
+        # Keep stdout clean for the JSON report even if views print.
+        with contextlib.redirect_stdout(sys.stderr):
+            for scenario in args.scenario or SCENARIOS:
+                print(f"running {scenario} ...")
+                scenarios[scenario] = run_scenario(transport, scenario, taxonomy, args)
+    finally:
+        transport.close()
+        if scratch:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    result = {
+        "meta": {
+            "git": git_info(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "mode": "http" if args.url else "in-process",
+            "dataset": dataset,
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "warmup": args.warmup,
+            "seed": args.seed,
+            "python": platform.python_version(),
+            "django": _django_version(),
+            "platform": platform.platform(),
+        },
+        "peak_rss_kb": peak_rss_kb(args.server_pid if args.url else None),
+        "scenarios": scenarios,
+    }
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            fh.write(text + "\n")
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as fh:
+            print(compare(result, json.load(fh)), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
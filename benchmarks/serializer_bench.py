@@ -0,0 +1,300 @@
+"""Micro-benchmarks for the hot DRF serializers.
+
+Serialization runs against unsaved in-memory instances whose relations are
+pre-attached (FK objects assigned, to-many relations in
+``_prefetched_objects_cache``), so no queries are made. Validation needs
+the related rows for its primary-key lookups; they live in an in-memory
+SQLite database created at start-up.
+
+    python benchmarks/serializer_bench.py                      # compare to baseline
+    python benchmarks/serializer_bench.py --update-baseline    # record a new baseline
+    python benchmarks/serializer_bench.py --sizes 1 100 --bench topic.serialize
+
+Exits with status 1 when a benchmark is slower (median items/sec) or
+allocates more (peak KiB) than the baseline by more than the configured
+threshold. Timings are the median of at least three repeats so one noisy
+run cannot fail the gate.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import timeit
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "serializer_baseline.json")
+DEFAULT_SIZES = (1, 100, 10000)
+MIN_REPEAT = 3
+
+
+def setup_django():
+    sys.path.insert(0, ROOT)
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "PdfBackend.settings")
+    from django.conf import settings
+
+    settings.DATABASES["default"]["NAME"] = ":memory:"
+    import django
+    from django.core.management import call_command
+
+    django.setup()
+    call_command("migrate", verbosity=0)
+
+
+class Fixtures:
+    """One saved taxonomy chain (for validation) plus in-memory builders."""
+
+    def __init__(self):
+        from question.models import (
+            Chapter,
+            ClassName,
+            Concept,
+            ImageType,
+            QuestionType,
+            Sources,
+            Subject,
+            Topic,
+            UsageType,
+        )
+
+        self.class_name = ClassName.objects.create(name="Class 10")
+        self.subject = Subject.objects.create(name="Physics")
+        self.chapter = Chapter.objects.create(name="Optics", class_name=self.class_name, subject=self.subject)
+        self.concept = Concept.objects.create(name="Refraction", chapter=self.chapter)
+        self.topic = Topic.objects.create(name="Snell's law", concept=self.concept)
+        self.image_type = ImageType.objects.create(name="Question")
+        self.solution_type = ImageType.objects.create(name="Solution")
+        self.question_type = QuestionType.objects.create(name="MCQ")
+        self.source = Sources.objects.create(name="NCERT")
+        self.usage_types = [UsageType.objects.create(name="Exam"), UsageType.objects.create(name="Practice")]
+
+        from PIL import Image
+
+        buf = io.BytesIO()
+        Image.new("L", (240, 80), 250).save(buf, format="PNG")
+        self.png = buf.getvalue()
+
+    def crops(self, n):
+        from django.utils import timezone
+
+        from question.models import CroppedImage, CroppedImageExtra
+
+        now = timezone.now()
+        items = []
+        for i in range(n):
+            crop = CroppedImage(
+                id=i + 1,
+                image=f"cropped/{i}.png",
+                image_type=self.image_type,
+                rect_pdf={"page": 3, "x": 10.5, "y": 20.25, "width": 300, "height": 80},
+                rect_screen={"x": 12, "y": 40, "width": 600, "height": 160},
+                class_name=self.class_name,
+                subject=self.subject,
+                chapter=self.chapter,
+                concept=self.concept,
+                topic=self.topic,
+                question_type=self.question_type,
+                difficulty="medium",
+                marks=2,
+                priority=3,
+                source=self.source,
+                created_at=now,
+                updated_at=now,
+            )
+            extras = [
+                CroppedImageExtra(
+                    id=i + 1,
+                    parent=crop,
+                    image=f"cropped/{i}-2.png",
+                    image_type=self.solution_type,
+                    sort_order=2,
+                    created_at=now,
+                    updated_at=now,
+                )
+            ] if i % 3 == 0 else []
+            crop._prefetched_objects_cache = {"usage_types": list(self.usage_types), "extra_images": extras}
+            items.append(crop)
+        return items
+
+    def concepts(self, n):
+        from question.models import Concept
+
+        return [Concept(id=i + 1, name=f"Concept {i}", chapter=self.chapter) for i in range(n)]
+
+    def topics(self, n):
+        from question.models import Topic
+
+        return [Topic(id=i + 1, name=f"Topic {i}", concept=self.concept) for i in range(n)]
+
+    def crop_payloads(self, n):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        return [
+            {
+                "image": SimpleUploadedFile(f"{i}.png", self.png, content_type="image/png"),
+                "image_type": self.image_type.pk,
+                "rect_pdf": {"page": 3, "x": 10.5, "y": 20.25, "width": 300, "height": 80},
+                "class_name": self.class_name.pk,
+                "subject": self.subject.pk,
+                "chapter": self.chapter.pk,
+                "concept": self.concept.pk,
+                "topic": self.topic.pk,
+                "question_type": self.question_type.pk,
+                "difficulty": "medium",
+                "marks": 2,
+                "usage_types": [u.pk for u in self.usage_types],
+                "source": self.source.pk,
+            }
+            for i in range(n)
+        ]
+
+    def name_payloads(self, n):
+        return [{"name": f"Item {i}"} for i in range(n)]
+
+
+def build_benchmarks(fx):
+    """name -> factory(n) returning a zero-argument callable that processes n items."""
+    from question.serializers import (
+        ConceptSerializer,
+        CropSerializer,
+        CroppedImageReadSerializer,
+        TopicSerializer,
+    )
+
+    def serialize(serializer_class, make):
+        def factory(n):
+            instances = make(n)
+            return lambda: serializer_class(instances, many=True).data
+        return factory
+
+    def validate(serializer_class, make):
+        def factory(n):
+            payloads = make(n)
+
+            def run():
+                # Uploaded files are consumed by ImageField validation.
+                for payload in payloads:
+                    if "image" in payload:
+                        payload["image"].seek(0)
+                serializer = serializer_class(data=payloads, many=True)
+                if not serializer.is_valid():
+                    raise AssertionError(serializer.errors[:1])
+            return run
+        return factory
+
+    return {
+        "cropped_image_read.serialize": serialize(CroppedImageReadSerializer, fx.crops),
+        "cropped_image_read.validate": validate(CroppedImageReadSerializer, fx.crop_payloads),
+        "concept.serialize": serialize(ConceptSerializer, fx.concepts),
+        "concept.validate": validate(ConceptSerializer, fx.name_payloads),
+        "topic.serialize": serialize(TopicSerializer, fx.topics),
+        "topic.validate": validate(TopicSerializer, fx.name_payloads),
+        "crop.serialize": serialize(CropSerializer, fx.crops),
+        "crop.validate": validate(CropSerializer, fx.crop_payloads),
+    }
+
+
+def measure(func, n, repeat, min_time, max_time):
+    """Median-of-``repeat`` timing (each repeat runs for at least ``min_time``) plus peak allocation.
+
+    Repeats are capped so one benchmark spends about ``max_time`` seconds,
+    but never below ``MIN_REPEAT`` so the median means something even for
+    slow ones (10k validations).
+    """
+    timer = timeit.Timer(func)
+    number = 1
+    while True:
+        elapsed = timer.timeit(number)
+        if elapsed >= min_time or number >= 1_000_000:
+            break
+        number *= 2
+    repeat = max(MIN_REPEAT, min(repeat, int(max_time / elapsed)))
+    median = statistics.median(timer.repeat(repeat=repeat, number=number)) / number
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "items_per_sec": round(n / median, 1),
+        "usec_per_item": round(median / n * 1e6, 3),
+        "peak_kib": round(peak / 1024, 1),
+    }
+
+
+def compare(results, baseline, max_slowdown, max_memory_growth):
+    """Return human-readable regression lines (empty when within thresholds)."""
+    failures = []
+    for key, result in results.items():
+        base = baseline.get(key)
+        if not base:
+            continue
+        speed = result["items_per_sec"] / base["items_per_sec"] - 1
+        memory = result["peak_kib"] / base["peak_kib"] - 1 if base["peak_kib"] else 0
+        status = "ok"
+        if speed < -max_slowdown or memory > max_memory_growth:
+            status = "REGRESSION"
+            failures.append(key)
+        print(f"{key:40} {speed:+7.1%} items/sec  {memory:+7.1%} peak KiB  {status}")
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--bench", action="append", help="Run only these benchmarks (repeatable).")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.2, help="Seconds per timing repeat.")
+    parser.add_argument("--max-time", type=float, default=5.0, help="Rough time budget per benchmark.")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--max-slowdown", type=float, default=0.25, help="Allowed median items/sec drop (0.25 = 25%%).")
+    parser.add_argument("--max-memory-growth", type=float, default=0.25, help="Allowed peak KiB growth.")
+    args = parser.parse_args(argv)
+
+    setup_django()
+    benchmarks = build_benchmarks(Fixtures())
+    unknown = set(args.bench or ()) - benchmarks.keys()
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(sorted(unknown))}")
+
+    results = {}
+    for name, factory in benchmarks.items():
+        if args.bench and name not in args.bench:
+            continue
+        for n in args.sizes:
+            key = f"{name}[{n}]"
+            results[key] = measure(factory(n), n, args.repeat, args.min_time, args.max_time)
+            r = results[key]
+            print(f"{key:40} {r['items_per_sec']:>12,.0f} items/sec  {r['peak_kib']:>10,.1f} peak KiB")
+
+    if args.update_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, encoding="utf-8") as fh:
+                baseline = json.load(fh)["results"]
+        baseline.update(results)
+        with open(args.baseline, "w", encoding="utf-8") as fh:
+            json.dump({"python": platform.python_version(), "results": baseline}, fh, indent=2, sort_keys=True)
+            fh.write("\n")
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("No baseline yet; rerun with --update-baseline.")
+        return 0
+    with open(args.baseline, encoding="utf-8") as fh:
+        baseline = json.load(fh)["results"]
+    print()
+    failures = compare(results, baseline, args.max_slowdown, args.max_memory_growth)
+    if failures:
+        print(f"\n{len(failures)} regression(s): {', '.join(failures)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
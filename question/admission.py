@@ -0,0 +1,121 @@
+"""Admission control for the write-heavy upload endpoints.
+
+Each endpoint listed in QUESTION_ADMISSION gets a fixed number of
+``slots`` per process. A request that finds every slot taken waits in a
+FIFO queue of at most ``queue`` requests, for up to ``timeout`` seconds.
+If the queue is full, or the wait times out, the request is answered 429
+with a Retry-After estimated from recent hold times. Bursts of imports
+therefore cannot take every worker thread and database turn away from the
+list views.
+
+The wait happens before the view reads the request body, so a rejected
+upload costs no parsing or storage I/O. Endpoints that QUESTION_ADMISSION
+does not list are not limited.
+"""
+import functools
+import math
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from rest_framework.exceptions import Throttled
+
+from .metrics import ADMISSION_IN_FLIGHT, ADMISSION_QUEUE_DEPTH, ADMISSION_REJECTED, ADMISSION_WAIT
+
+QUEUE_FULL = "queue_full"
+TIMEOUT = "timeout"
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+class Limiter:
+    """``slots`` concurrent holders; at most ``queue`` more wait, in order, up to ``timeout`` seconds."""
+
+    def __init__(self, name, slots, queue=0, timeout=0):
+        self.name = name
+        self.slots = slots
+        self.queue = queue
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._free = slots
+        self._waiters = deque()
+        self._hold = 1.0  # moving average of seconds a slot is held, for Retry-After
+
+    def acquire(self):
+        """None once a slot is held, else why not (QUEUE_FULL or TIMEOUT)."""
+        with self._lock:
+            if self._free and not self._waiters:
+                self._free -= 1
+                ADMISSION_IN_FLIGHT.inc(endpoint=self.name)
+                return None
+            if len(self._waiters) >= self.queue:
+                return QUEUE_FULL
+            waiter = threading.Event()
+            self._waiters.append(waiter)
+            ADMISSION_QUEUE_DEPTH.inc(endpoint=self.name)
+        if waiter.wait(self.timeout):
+            return None
+        with self._lock:
+            if waiter.is_set():  # handed a slot just as the wait timed out
+                return None
+            self._waiters.remove(waiter)
+            ADMISSION_QUEUE_DEPTH.dec(endpoint=self.name)
+            return TIMEOUT
+
+    def release(self, held=None):
+        """Give the slot to the oldest waiter, or back to the pool. ``held`` is how long it was held."""
+        with self._lock:
+            if held is not None:
+                self._hold = 0.8 * self._hold + 0.2 * held
+            if self._waiters:
+                # The slot passes straight on, so in-flight stays the same.
+                self._waiters.popleft().set()
+                ADMISSION_QUEUE_DEPTH.dec(endpoint=self.name)
+            else:
+                self._free += 1
+                ADMISSION_IN_FLIGHT.dec(endpoint=self.name)
+
+    def retry_after(self):
+        """Whole seconds until a slot is likely free for a new request."""
+        with self._lock:
+            return max(1, math.ceil(self._hold * (len(self._waiters) + 1) / self.slots))
+
+
+def limiter(endpoint):
+    """The process-wide Limiter of ``endpoint`` as configured in QUESTION_ADMISSION, or None."""
+    config = getattr(settings, "QUESTION_ADMISSION", {}).get(endpoint)
+    if not config:
+        return None
+    key = (endpoint, config["slots"], config.get("queue", 0), config.get("timeout", 0))
+    with _limiters_lock:
+        found = _limiters.get(key)
+        if found is None:
+            found = _limiters[key] = Limiter(*key)
+        return found
+
+
+def admission_controlled(handler):
+    """Run a view method only while holding one of its endpoint's slots; 429 when saturated."""
+
+    @functools.wraps(handler)
+    def wrapper(view, request, *args, **kwargs):
+        endpoint = type(view).__name__
+        limit = limiter(endpoint)
+        if limit is None:
+            return handler(view, request, *args, **kwargs)
+
+        started = time.perf_counter()
+        refused = limit.acquire()
+        if refused is not None:
+            ADMISSION_REJECTED.inc(endpoint=endpoint, reason=refused)
+            raise Throttled(wait=limit.retry_after(), detail="Too many uploads in progress.")
+        admitted = time.perf_counter()
+        ADMISSION_WAIT.observe(admitted - started, endpoint=endpoint)
+        try:
+            return handler(view, request, *args, **kwargs)
+        finally:
+            limit.release(time.perf_counter() - admitted)
+
+    return wrapper
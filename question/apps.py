@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class QuestionConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'question'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from .middleware import install_query_hooks
+
+        connection_created.connect(install_query_hooks)
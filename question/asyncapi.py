@@ -0,0 +1,54 @@
+"""APIView with ``async def`` handlers.
+
+DRF's ``APIView.dispatch`` is synchronous. ``AsyncAPIView.dispatch`` is a
+coroutine: it awaits ``async def`` handlers and runs everything that may
+touch the database synchronously (authentication, permissions and
+throttling in ``initial``, and any plain ``def`` handler, such as the
+list views' POST) through ``sync_to_async``. Django sees an async view,
+so under ASGI a request waiting on the database does not hold a worker
+thread; under WSGI Django drives it with ``async_to_sync``, on an event
+loop thread of its own, which joins the request's profile when it is
+being profiled (question.profiling).
+"""
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from rest_framework.views import APIView
+
+from .profiling import profiled_thread
+from .querylog import query_origin, site
+
+
+class AsyncAPIView(APIView):
+    view_is_async = True
+
+    async def dispatch(self, request, *args, **kwargs):
+        with profiled_thread():
+            return await self._dispatch(request, *args, **kwargs)
+
+    async def _dispatch(self, request, *args, **kwargs):
+        # Same steps as APIView.dispatch.
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+
+            if iscoroutinefunction(handler):
+                code = handler.__code__
+                with query_origin(site(code.co_filename, code.co_firstlineno, code.co_name)):
+                    response = await handler(request, *args, **kwargs)
+            else:
+                response = await sync_to_async(handler)(request, *args, **kwargs)
+
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
@@ -0,0 +1,183 @@
+"""SQLite backend that queues writers in-process.
+
+SQLite allows one writer at a time. With a busy timeout, writers that find
+the database locked sleep and retry inside SQLite, in no particular order,
+and a writer can still time out with "database is locked" while others get
+through. This backend makes the writers of one process wait their turn in
+a FIFO ``WriteQueue`` instead, so each one reaches SQLite only once the
+lock is free. The busy timeout is then only needed for other processes.
+
+Queued:
+
+- ``atomic()`` blocks, when ``transaction_mode`` is IMMEDIATE or EXCLUSIVE
+  (such a BEGIN takes the write lock anyway). The turn is held until
+  COMMIT or ROLLBACK.
+- INSERT/UPDATE/DELETE/REPLACE run in autocommit mode, for one statement.
+
+Enabled by default; ``"serialize_writes": False`` in OPTIONS turns it off.
+The wait shows up as ``db_write_wait`` in the request metrics and in the
+question_db_write_wait_seconds histogram.
+"""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from django.db import OperationalError
+from django.db.backends.sqlite3 import base
+
+from ... import instrumentation
+from ...metrics import DB_WRITE_WAIT, DB_WRITE_WAITING
+
+WRITE_VERBS = ("INSERT", "UPDATE", "DELETE", "REPLACE")
+LOCKING_MODES = ("IMMEDIATE", "EXCLUSIVE")
+DEFAULT_TIMEOUT = 5.0  # sqlite3.connect()'s own default
+
+_queues = {}
+_queues_lock = threading.Lock()
+
+
+class WriteQueue:
+    """A lock granted in request order. ``release`` hands it straight to the next waiter."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._held = False
+        self._waiters = deque()
+
+    def acquire(self, timeout=None):
+        with self._lock:
+            if not self._held:
+                self._held = True
+                return True
+            waiter = threading.Event()
+            self._waiters.append(waiter)
+        if waiter.wait(timeout):
+            return True
+        with self._lock:
+            if waiter.is_set():  # handed over just as the wait timed out
+                return True
+            self._waiters.remove(waiter)
+            return False
+
+    def release(self):
+        with self._lock:
+            if self._waiters:
+                self._waiters.popleft().set()
+            else:
+                self._held = False
+
+
+def write_queue(name):
+    """The process-wide WriteQueue of database ``name``."""
+    key = str(name)
+    with _queues_lock:
+        queue = _queues.get(key)
+        if queue is None:
+            queue = _queues[key] = WriteQueue()
+        return queue
+
+
+class CursorWrapper(base.SQLiteCursorWrapper):
+    wrapper = None  # the DatabaseWrapper, set by create_cursor()
+
+    def execute(self, query, params=None):
+        if not self._queued(query):
+            return super().execute(query, params)
+        with self.wrapper.write_turn():
+            return super().execute(query, params)
+
+    def executemany(self, query, param_list):
+        if not self._queued(query):
+            return super().executemany(query, param_list)
+        with self.wrapper.write_turn():
+            return super().executemany(query, param_list)
+
+    def _queued(self, query):
+        # Only autocommit writes; inside a transaction the turn is already held
+        # (IMMEDIATE) or, for DEFERRED, SQLite's busy timeout applies as before.
+        wrapper = self.wrapper
+        return (
+            wrapper.serialize_writes
+            and not wrapper.holds_write_turn
+            and not self.connection.in_transaction
+            and query.lstrip()[:7].upper().startswith(WRITE_VERBS)
+        )
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.holds_write_turn = False
+        options = self.settings_dict["OPTIONS"]
+        self.serialize_writes = options.get("serialize_writes", True)
+        self.write_timeout = options.get("timeout", DEFAULT_TIMEOUT)
+
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        kwargs.pop("serialize_writes", None)
+        return kwargs
+
+    def create_cursor(self, name=None):
+        cursor = self.connection.cursor(factory=CursorWrapper)
+        cursor.wrapper = self
+        return cursor
+
+    @contextmanager
+    def write_turn(self):
+        self.acquire_write_turn()
+        try:
+            yield
+        finally:
+            self.release_write_turn()
+
+    def acquire_write_turn(self):
+        queue = write_queue(self.settings_dict["NAME"])
+        started = time.perf_counter()
+        if queue.acquire(timeout=0):
+            self.holds_write_turn = True
+            return
+        DB_WRITE_WAITING.inc()
+        try:
+            with instrumentation.span("db_write_wait"):
+                acquired = queue.acquire(timeout=self.write_timeout)
+        finally:
+            DB_WRITE_WAITING.dec()
+            DB_WRITE_WAIT.observe(time.perf_counter() - started)
+        if not acquired:
+            raise OperationalError("database is locked (timed out in the write queue)")
+        self.holds_write_turn = True
+
+    def release_write_turn(self):
+        if self.holds_write_turn:
+            self.holds_write_turn = False
+            write_queue(self.settings_dict["NAME"]).release()
+
+    def _start_transaction_under_autocommit(self):
+        if not (self.serialize_writes and self.transaction_mode in LOCKING_MODES):
+            return super()._start_transaction_under_autocommit()
+        self.acquire_write_turn()
+        try:
+            super()._start_transaction_under_autocommit()
+        except BaseException:
+            self.release_write_turn()
+            raise
+
+    def _commit(self):
+        try:
+            return super()._commit()
+        finally:
+            self.release_write_turn()
+
+    def _rollback(self):
+        try:
+            return super()._rollback()
+        finally:
+            self.release_write_turn()
+
+    def _close(self):
+        try:
+            return super()._close()
+        finally:
+            self.release_write_turn()
+
@@ -0,0 +1,435 @@
+"""Bulk crop import, shared by UploadCropBulk and the upload job worker.
+
+``BulkImport.add`` turns one element of the ``items`` array plus its file
+into a CroppedImage, or into a CroppedImageExtra of its group's primary,
+resolving taxonomy by id or by name. It raises ValidationError for a bad
+item and remembers the files it stored, so callers that roll back can
+delete them. An ``on_stage(index, stage)`` callback hears when an item is
+"validated", "thumbnailed" (its placeholder was computed as the image was
+saved) and "stored".
+
+Large batches can instead go through ``enqueue``: the request stores the
+files under a fresh ``upload-jobs/<hex>/`` and then records an UploadJob,
+and ``manage.py upload_worker`` runs it with ``run_job``. The job commits in
+chunks of items, so its progress is visible while it runs; each commit
+is also the job's heartbeat. A running job with no heartbeat for
+QUESTION_UPLOAD_JOB_TIMEOUT (its worker died or hangs) is claimed again by
+the next worker, which first deletes the crops of its committed chunks.
+If any item fails, the worker deletes everything the job created once all
+items have been tried. The job is all-or-nothing like the synchronous
+endpoint, but until it finishes readers can see crops from committed
+chunks. Each step is also recorded as an UploadJobEvent for the SSE
+stream (question.events).
+"""
+import json
+import os
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from .filters import as_int
+from .models import (
+    Chapter,
+    ClassName,
+    Concept,
+    CroppedImage,
+    CroppedImageExtra,
+    ImageType,
+    QuestionType,
+    Sources,
+    Subject,
+    Topic,
+    UploadJob,
+    UploadJobEvent,
+    UsageType,
+)
+from .serializers import CropSerializer
+
+RENAME_MAP = {
+    "rectPdf": "rect_pdf",
+    "rectScreen": "rect_screen",
+    "usage": "usage_type",
+    "questionType": "question_type",
+    "imageType": "image_type",
+    "classId": "class_name",
+    "subjectId": "subject",
+    "chapterId": "chapter",
+    "conceptId": "concept",
+    "topicId": "topic",
+}
+
+JOB_CHUNK_SIZE = 50
+STAGING_DIR = "upload-jobs"
+
+
+def _get_by_id_or_name(model, value, name_field="name"):
+    if value is None:
+        return None
+    pk = as_int(value)
+    if pk is not None:
+        return model.objects.get(pk=pk)
+    obj, _ = model.objects.get_or_create(**{name_field: str(value)})
+    return obj
+
+
+def parse_items(raw):
+    """The ``items`` form field as a list; raises ValidationError like the endpoint always has."""
+    if not raw:
+        raise ValidationError({"items": ["This field is required."]})
+    try:
+        items = json.loads(raw) if isinstance(raw, str) else raw
+    except json.JSONDecodeError:
+        raise ValidationError({"items": ["Invalid JSON."]})
+    if not isinstance(items, list):
+        raise ValidationError({"items": ["Must be a JSON array."]})
+    return items
+
+
+def _group_key(payload, idx):
+    group_key = (
+        payload.get("groupKey")
+        or payload.get("group_key")
+        or payload.get("questionGroup")
+        or payload.get("question_group")
+    )
+    return f"__single__{idx}" if group_key is None else str(group_key)
+
+
+class BulkImport:
+    def __init__(self, on_stage=None):
+        self.on_stage = on_stage
+        self.created = []
+        self.created_extras = []
+        self.file_names = []
+        self.primary_by_group_key = {}
+        self.failed_groups = set()
+
+    def add(self, idx, item, upload_file):
+        """Import item ``idx``. On error, deletes the files this item stored and re-raises."""
+        marks = (len(self.created), len(self.created_extras), len(self.file_names))
+        group_key = _group_key(item, idx) if isinstance(item, dict) else None
+        try:
+            self._add(idx, item, upload_file, group_key)
+        except Exception:
+            for name in self.file_names[marks[2]:]:
+                try:
+                    default_storage.delete(name)
+                except Exception:
+                    pass
+            del self.created[marks[0]:], self.created_extras[marks[1]:], self.file_names[marks[2]:]
+            if group_key is not None and group_key not in self.primary_by_group_key:
+                self.failed_groups.add(group_key)
+            raise
+
+    def _stage(self, idx, stage):
+        if self.on_stage is not None:
+            self.on_stage(idx, stage)
+
+    def delete_files(self, start=0):
+        """Delete the files stored since the ``start``-th (after their rows were rolled back)."""
+        for name in self.file_names[start:]:
+            try:
+                default_storage.delete(name)
+            except Exception:
+                pass
+
+    def _add(self, idx, item, upload_file, group_key):
+        if not isinstance(item, dict):
+            raise ValidationError({"items": {idx: "Each item must be an object."}})
+
+        payload = dict(item)
+
+        # Attach file
+        file_key = f"image_{idx}"
+        if not upload_file:
+            raise ValidationError({"items": {idx: {file_key: "Missing file."}}})
+        payload["image"] = upload_file
+
+        # Parse JSON fields if needed
+        for k in ("rectPdf", "rectScreen", "rect_pdf", "rect_screen"):
+            if k in payload and isinstance(payload[k], str):
+                try:
+                    payload[k] = json.loads(payload[k])
+                except json.JSONDecodeError:
+                    pass
+
+        # Normalize keys
+        for src, dst in RENAME_MAP.items():
+            if src in payload and dst not in payload:
+                payload[dst] = payload.pop(src)
+
+        # Drop removed fields if frontend still sends them
+        payload.pop("pageNo", None)
+        payload.pop("documentName", None)
+        payload.pop("page_no", None)
+        payload.pop("document_name", None)
+
+        group_index_raw = payload.get("groupIndex") or payload.get("group_index")
+        group_index = as_int(group_index_raw)
+
+        if group_key in self.failed_groups:
+            raise ValidationError({"items": {idx: "The first item of this group failed."}})
+
+        # If this group already has a primary CroppedImage, store this as an extra image.
+        primary = self.primary_by_group_key.get(group_key)
+        if primary is not None:
+            # Extra images inherit question metadata from primary.
+            extra_image_type_obj = None
+            if payload.get("image_type") not in (None, ""):
+                extra_image_type_obj = _get_by_id_or_name(ImageType, payload.get("image_type"))
+
+            # Determine stable order within the group.
+            # If frontend provides groupIndex (1=primary, 2..n=extras) we store it.
+            # Otherwise we append after the last known extra.
+            if group_index is None or group_index < 2:
+                last = primary.extra_images.aggregate(m=Max("sort_order")).get("m")
+                group_index = (last or 1) + 1
+            self._stage(idx, "validated")
+
+            extra = CroppedImageExtra.objects.create(
+                parent=primary,
+                image=payload["image"],
+                image_type=extra_image_type_obj or primary.image_type,
+                rect_pdf=payload.get("rect_pdf") or {},
+                rect_screen=payload.get("rect_screen") or {},
+                sort_order=group_index,
+            )
+            self.created_extras.append(extra)
+            if getattr(extra.image, "name", None):
+                self.file_names.append(extra.image.name)
+            if extra.placeholder:
+                self._stage(idx, "thumbnailed")
+            self._stage(idx, "stored")
+            return
+
+        # Resolve taxonomy
+        class_obj = _get_by_id_or_name(ClassName, payload.get("class_name"))
+        subject_obj = _get_by_id_or_name(Subject, payload.get("subject"))
+
+        chapter_val = payload.get("chapter")
+        chapter_obj = None
+        if chapter_val is not None and class_obj is not None and subject_obj is not None:
+            pk = as_int(chapter_val)
+            if pk is not None:
+                chapter_obj = Chapter.objects.get(pk=pk)
+            else:
+                chapter_obj, _ = Chapter.objects.get_or_create(
+                    name=str(chapter_val),
+                    class_name=class_obj,
+                    subject=subject_obj,
+                )
+
+        concept_val = payload.get("concept")
+        concept_obj = None
+        if concept_val is not None and chapter_obj is not None:
+            pk = as_int(concept_val)
+            if pk is not None:
+                concept_obj = Concept.objects.get(pk=pk)
+            else:
+                concept_obj, _ = Concept.objects.get_or_create(
+                    name=str(concept_val),
+                    chapter=chapter_obj,
+                )
+
+        topic_val = payload.get("topic")
+        topic_obj = None
+        if topic_val is not None and concept_obj is not None:
+            pk = as_int(topic_val)
+            if pk is not None:
+                topic_obj = Topic.objects.get(pk=pk)
+            else:
+                topic_obj, _ = Topic.objects.get_or_create(
+                    name=str(topic_val),
+                    concept=concept_obj,
+                )
+
+        question_type_obj = _get_by_id_or_name(QuestionType, payload.get("question_type"))
+        image_type_obj = _get_by_id_or_name(ImageType, payload.get("image_type"))
+        source_obj = _get_by_id_or_name(Sources, payload.get("source"))
+
+        if class_obj is not None:
+            payload["class_name"] = class_obj.pk
+        if subject_obj is not None:
+            payload["subject"] = subject_obj.pk
+        if chapter_obj is not None:
+            payload["chapter"] = chapter_obj.pk
+        if concept_obj is not None:
+            payload["concept"] = concept_obj.pk
+        if topic_obj is not None:
+            payload["topic"] = topic_obj.pk
+        if question_type_obj is not None:
+            payload["question_type"] = question_type_obj.pk
+        if image_type_obj is not None:
+            payload["image_type"] = image_type_obj.pk
+        if source_obj is not None:
+            payload["source"] = source_obj.pk
+
+        usage_value = payload.pop("usage_type", None)
+
+        # Not a model field on CroppedImage; used only for grouping.
+        payload.pop("groupIndex", None)
+        payload.pop("group_index", None)
+
+        serializer = CropSerializer(data=payload)
+        serializer.is_valid(raise_exception=True)
+        self._stage(idx, "validated")
+        cropped = serializer.save()
+        self.created.append(cropped)
+        if getattr(cropped.image, "name", None):
+            self.file_names.append(cropped.image.name)
+        if cropped.placeholder:
+            self._stage(idx, "thumbnailed")
+
+        self.primary_by_group_key[group_key] = cropped
+
+        if usage_value is not None:
+            usage_obj = _get_by_id_or_name(UsageType, usage_value)
+            if usage_obj is not None:
+                cropped.usage_types.add(usage_obj)
+        self._stage(idx, "stored")
+
+
+def enqueue(items, files):
+    """Stage ``files`` (field name -> upload) in storage and queue an UploadJob for ``items``.
+
+    The files are written before the job's transaction, which then only
+    inserts the row, so slow storage does not hold the database write lock.
+    """
+    prefix = f"{STAGING_DIR}/{uuid.uuid4().hex}"
+    staged = {}
+    try:
+        for idx in range(len(items)):
+            upload = files.get(f"image_{idx}")
+            if upload:
+                staged[f"image_{idx}"] = default_storage.save(f"{prefix}/image_{idx}/{upload.name}", upload)
+        with transaction.atomic():
+            return UploadJob.objects.create(items=items, total=len(items), files=staged)
+    except Exception:
+        for name in staged.values():
+            default_storage.delete(name)
+        raise
+
+
+class JobReclaimed(Exception):
+    """Another worker claimed the job after it went QUESTION_UPLOAD_JOB_TIMEOUT without a heartbeat."""
+
+
+def claim_next_job():
+    """Mark the oldest queued or stale running job running and return it, or None. Safe with several workers."""
+    now = timezone.now()
+    stale = Q(status=UploadJob.RUNNING, heartbeat_at__lt=now - timedelta(seconds=settings.QUESTION_UPLOAD_JOB_TIMEOUT))
+    candidates = UploadJob.objects.filter(Q(status=UploadJob.QUEUED) | stale).order_by("created_at", "id")
+    for pk, status, heartbeat_at in candidates.values_list("pk", "status", "heartbeat_at")[:10]:
+        with transaction.atomic():
+            if not UploadJob.objects.filter(pk=pk, status=status, heartbeat_at=heartbeat_at).update(
+                status=UploadJob.RUNNING, started_at=now, heartbeat_at=now
+            ):
+                continue
+            job = UploadJob.objects.get(pk=pk)
+            if status == UploadJob.RUNNING:
+                # Undo the committed chunks of the abandoned run; the staged
+                # files are still there, as only a finished run deletes them.
+                # Deleting the rows also deletes their files (post_delete receivers).
+                CroppedImage.objects.filter(pk__in=job.crop_ids).delete()
+                job.processed, job.errors, job.crop_ids = 0, {}, []
+                job.save(update_fields=["processed", "errors", "crop_ids"])
+            return job
+    return None
+
+
+def _item_error(detail, idx):
+    # BulkImport errors are wrapped as {"items": {idx: ...}}; serializer errors are not.
+    if isinstance(detail, dict) and isinstance(detail.get("items"), dict) and idx in detail["items"]:
+        return detail["items"][idx]
+    return detail
+
+
+def run_job(job, chunk_size=JOB_CHUNK_SIZE):
+    """Import a claimed job's items, chunk by chunk, and record the outcome on the job.
+
+    Raises JobReclaimed, leaving the job to its new worker, if it was claimed again meanwhile.
+    """
+    # Events are collected in memory and written with their chunk, so an
+    # item whose savepoint rolls back still reports how far it got.
+    events = []
+    bulk = BulkImport(on_stage=lambda idx, stage: events.append(UploadJobEvent(job=job, index=idx, stage=stage)))
+    errors = {}
+    # Updates through this only apply while the job is still ours.
+    claimed = UploadJob.objects.filter(pk=job.pk, started_at=job.started_at)
+    UploadJobEvent.objects.create(job=job, stage=UploadJob.RUNNING, detail={"total": job.total})
+    try:
+        for start in range(0, job.total, chunk_size):
+            created, stored_files = len(bulk.created), len(bulk.file_names)
+            try:
+                with transaction.atomic():
+                    stored = []
+                    for idx in range(start, min(start + chunk_size, job.total)):
+                        name = job.files.get(f"image_{idx}")
+                        upload = File(default_storage.open(name), name=os.path.basename(name)) if name else None
+                        try:
+                            with transaction.atomic():
+                                bulk.add(idx, job.items[idx], upload)
+                            stored.append(idx)
+                        except ValidationError as exc:
+                            errors[str(idx)] = _item_error(exc.detail, idx)
+                        except ObjectDoesNotExist as exc:
+                            errors[str(idx)] = str(exc)
+                        finally:
+                            if upload is not None:
+                                upload.close()
+                        if str(idx) in errors:
+                            events.append(UploadJobEvent(job=job, index=idx, stage="error", detail=errors[str(idx)]))
+                    # Committed together with the rows they describe.
+                    events.extend(UploadJobEvent(job=job, index=idx, stage="committed") for idx in stored)
+                    UploadJobEvent.objects.bulk_create(events)
+                    events.clear()
+                    job.processed = min(start + chunk_size, job.total)
+                    job.errors = errors
+                    job.crop_ids = [crop.pk for crop in bulk.created]
+                    if not claimed.update(
+                        processed=job.processed, errors=errors, crop_ids=job.crop_ids, heartbeat_at=timezone.now()
+                    ):
+                        raise JobReclaimed(job.pk)
+            except BaseException:
+                # The chunk's rows were rolled back; no post_delete will remove its files.
+                bulk.delete_files(stored_files)
+                del bulk.created[created:]
+                raise
+    except JobReclaimed:
+        raise
+    except Exception:
+        errors["job"] = "Import failed."
+
+    if errors:
+        job.status, job.result, deleted, job.crop_ids = UploadJob.FAILED, None, job.crop_ids, []
+    else:
+        job.status, job.result = UploadJob.SUCCEEDED, CropSerializer(bulk.created, many=True).data
+    job.errors = errors
+    job.finished_at = timezone.now()
+    with transaction.atomic():
+        if not claimed.update(
+            status=job.status, result=job.result, errors=errors, crop_ids=job.crop_ids, finished_at=job.finished_at
+        ):
+            raise JobReclaimed(job.pk)
+        UploadJobEvent.objects.create(
+            job=job,
+            stage=job.status,
+            detail={"processed": job.processed, "total": job.total, "errors": len(errors)},
+        )
+    if errors:
+        # Deleting the rows also deletes their files (post_delete receivers).
+        CroppedImage.objects.filter(pk__in=deleted).delete()
+    for name in job.files.values():
+        try:
+            default_storage.delete(name)
+        except Exception:
+            pass
+    return job
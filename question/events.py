@@ -0,0 +1,174 @@
+"""Server-Sent Events encoding of upload job progress.
+
+The worker writes UploadJobEvent rows in the same transaction as the items
+they describe (see ``bulk.run_job``), so a stream never shows an item as
+stored before it is visible in the database. ``stream``/``astream`` replay
+the events after ``last_id`` (the browser's Last-Event-ID on reconnect)
+and then poll for new ones until the job's final event.
+
+``astream`` shares one ``_JobPoller`` per job and event loop: however many
+clients watch a job, the process queries for its new events once every
+POLL_INTERVAL and hands them to every subscriber, which sleeps with
+asyncio and holds no thread. ``stream`` is the WSGI fallback; it polls
+for its own client and holds a worker thread while it runs. Either
+stream ends after MAX_DURATION; the browser then reconnects with its
+Last-Event-ID and carries on where it stopped.
+"""
+import asyncio
+import json
+import time
+from bisect import bisect_right
+
+from .models import UploadJob, UploadJobEvent
+
+POLL_INTERVAL = 0.5  # seconds between polls while nothing new arrived
+KEEPALIVE = 15  # seconds of silence before a comment line keeps proxies from timing out
+MAX_DURATION = 10 * 60  # seconds before a stream ends and the client reconnects
+BATCH = 500
+RETRY_MS = 2000
+FINAL_STAGES = {UploadJob.SUCCEEDED, UploadJob.FAILED}
+
+
+def _query(job_id, last_id, up_to=None):
+    qs = UploadJobEvent.objects.filter(job_id=job_id, id__gt=last_id)
+    if up_to is not None:
+        qs = qs.filter(id__lte=up_to)
+    return qs.order_by("id").values_list("id", "index", "stage", "detail")[:BATCH]
+
+
+def encode(event_id, index, stage, detail):
+    """One SSE frame: ``item`` events for item stages, ``job`` events for job status."""
+    if index is None:
+        kind, data = "job", {"status": stage, **(detail or {})}
+    else:
+        kind, data = "item", {"index": index, "stage": stage, **({"detail": detail} if detail else {})}
+    return f"id: {event_id}\nevent: {kind}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+def _frames(rows):
+    """(SSE text, last id, whether the job's final event was among ``rows``)."""
+    chunks, last_id, done = [], None, False
+    for event_id, index, stage, detail in rows:
+        chunks.append(encode(event_id, index, stage, detail))
+        last_id = event_id
+        done = done or (index is None and stage in FINAL_STAGES)
+    return "".join(chunks), last_id, done
+
+
+def stream(job_id, last_id=0):
+    yield f"retry: {RETRY_MS}\n\n"
+    deadline = time.monotonic() + MAX_DURATION
+    quiet = 0.0
+    while time.monotonic() < deadline:
+        text, newest, done = _frames(list(_query(job_id, last_id)))
+        if text:
+            yield text
+            last_id, quiet = newest, 0.0
+        if done:
+            return
+        if not text:
+            if quiet >= KEEPALIVE:
+                yield ": keepalive\n\n"
+                quiet = 0.0
+            time.sleep(POLL_INTERVAL)
+            quiet += POLL_INTERVAL
+
+
+class _JobPoller:
+    """Polls one job's events for all of its ``astream`` subscribers on this event loop.
+
+    ``rows`` holds every event after ``start_id`` in id order; subscribers
+    read it at their own pace. The poll task stops after the job's final
+    event and is cancelled when the last subscriber leaves.
+    """
+
+    def __init__(self, job_id, start_id):
+        self.job_id = job_id
+        self.start_id = start_id
+        self.rows = []
+        self.ids = []
+        self.done = False
+        self.subscribers = 0
+        self.changed = asyncio.Event()
+        self.task = None
+
+    async def _run(self):
+        last_id = self.start_id
+        try:
+            while not self.done:
+                rows = [row async for row in _query(self.job_id, last_id)]
+                if rows:
+                    self.rows.extend(rows)
+                    self.ids.extend(row[0] for row in rows)
+                    last_id = rows[-1][0]
+                    self.done = any(index is None and stage in FINAL_STAGES for _, index, stage, _ in rows)
+                    self._notify()
+                if len(rows) < BATCH and not self.done:
+                    await asyncio.sleep(POLL_INTERVAL)
+        finally:
+            self._notify()
+
+    def _notify(self):
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+    def after(self, last_id):
+        return self.rows[bisect_right(self.ids, last_id):]
+
+
+_pollers = {}  # (event loop, job id) -> _JobPoller
+
+
+def _subscribe(job_id, last_id):
+    key = (asyncio.get_running_loop(), job_id)
+    poller = _pollers.get(key)
+    if poller is None or poller.task.done():
+        poller = _pollers[key] = _JobPoller(job_id, last_id)
+        poller.task = asyncio.get_running_loop().create_task(poller._run())
+    poller.subscribers += 1
+    return poller
+
+
+def _unsubscribe(poller):
+    poller.subscribers -= 1
+    if not poller.subscribers:
+        poller.task.cancel()
+        key = (asyncio.get_running_loop(), poller.job_id)
+        if _pollers.get(key) is poller:
+            del _pollers[key]
+
+
+async def astream(job_id, last_id=0):
+    yield f"retry: {RETRY_MS}\n\n"
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + MAX_DURATION
+    poller = _subscribe(job_id, last_id)
+    try:
+        # Events from before the shared poller started are this client's own replay.
+        while last_id < poller.start_id:
+            text, newest, done = _frames([row async for row in _query(job_id, last_id, up_to=poller.start_id)])
+            if not text:
+                break
+            yield text
+            last_id = newest
+            if done:
+                return
+        last_id = max(last_id, poller.start_id)
+        while True:
+            changed = poller.changed
+            text, newest, done = _frames(poller.after(last_id))
+            if text:
+                yield text
+                last_id = newest
+            if done or (poller.task.done() and not text):
+                return  # the job finished, or polling failed: the client reconnects
+            timeout = min(KEEPALIVE, deadline - loop.time())
+            if timeout <= 0:
+                return
+            try:
+                await asyncio.wait_for(changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                if loop.time() < deadline:
+                    yield ": keepalive\n\n"
+    finally:
+        _unsubscribe(poller)
@@ -0,0 +1,332 @@
+"""Streaming exports of the question bank.
+
+Rows are read with ``.iterator(chunk_size=...)`` and encoded one chunk at a
+time, so memory stays flat no matter how many rows are exported. The ZIP
+bundle additionally reads image files in FILE_CHUNK_SIZE pieces.
+
+Under ASGI, Django would consume a sync iterator passed to
+StreamingHttpResponse with ``sync_to_async(list)``, building the whole
+export in memory before the first byte goes out; ``astream`` wraps the
+stream so each piece is produced in a worker thread as it is sent.
+"""
+import csv
+import datetime
+import json
+import os
+import zipfile
+
+from asgiref.sync import sync_to_async
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F, Max, Q
+from django.utils import timezone
+
+from .models import CroppedImageExtra, QuestionUsage
+
+NDJSON_CONTENT_TYPE = "application/x-ndjson"
+CSV_CONTENT_TYPE = "text/csv"
+ZIP_CONTENT_TYPE = "application/zip"
+
+DEFAULT_CHUNK_SIZE = 1000
+FILE_CHUNK_SIZE = 64 * 1024
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+# FKs exported as both "<fk>" (id) and "<fk>_name", like CroppedImageReadSerializer.
+_NAMED_FKS = (
+    "image_type",
+    "class_name",
+    "subject",
+    "chapter",
+    "concept",
+    "topic",
+    "question_type",
+    "source",
+)
+
+EXPORT_COLUMNS = (
+    "id",
+    "image",
+    "image_type",
+    "image_type_name",
+    "rect_pdf",
+    "rect_screen",
+    "class_name",
+    "class_name_name",
+    "subject",
+    "subject_name",
+    "chapter",
+    "chapter_name",
+    "concept",
+    "concept_name",
+    "topic",
+    "topic_name",
+    "question_type",
+    "question_type_name",
+    "difficulty",
+    "marks",
+    "usage_types",
+    "priority",
+    "verified",
+    "source",
+    "source_name",
+    "is_active",
+    "created_at",
+    "updated_at",
+)
+
+class ExportJSONEncoder(DjangoJSONEncoder):
+    """DjangoJSONEncoder keeping microseconds, like the CSV output, so import_bank restores exact timestamps."""
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+_ANNOTATED_COLUMNS = {f"{fk}_name" for fk in _NAMED_FKS} | {"usage_types"}
+_VALUE_FIELDS = tuple(c for c in EXPORT_COLUMNS if c not in _ANNOTATED_COLUMNS)
+
+
+def _attach_usage_types(rows):
+    links = (
+        QuestionUsage.objects.filter(question_id__in=[row["id"] for row in rows])
+        .order_by("usage_type_id")
+        .values_list("question_id", "usage_type_id", "usage_type__name")
+    )
+    by_question = {}
+    for question_id, usage_type_id, name in links:
+        by_question.setdefault(question_id, []).append({"id": usage_type_id, "name": name})
+
+    return [
+        {**row, "usage_types": by_question.get(row["id"], [])}
+        for row in rows
+    ]
+
+
+def iter_export_batches(qs, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield lists of at most ``chunk_size`` export rows (dicts keyed by EXPORT_COLUMNS).
+
+    Usage types are fetched with one extra query per chunk instead of one per row.
+    """
+    values = qs.values(
+        *_VALUE_FIELDS,
+        **{f"{fk}_name": F(f"{fk}__name") for fk in _NAMED_FKS},
+    )
+    batch = []
+    for row in values.iterator(chunk_size=chunk_size):
+        batch.append(row)
+        if len(batch) >= chunk_size:
+            yield _attach_usage_types(batch)
+            batch = []
+    if batch:
+        yield _attach_usage_types(batch)
+
+
+def iter_ndjson(qs, chunk_size=DEFAULT_CHUNK_SIZE):
+    for batch in iter_export_batches(qs, chunk_size=chunk_size):
+        yield "".join(
+            json.dumps({c: row[c] for c in EXPORT_COLUMNS}, cls=ExportJSONEncoder, ensure_ascii=False) + "\n"
+            for row in batch
+        )
+
+
+class _Echo:
+    """File-like object whose write() hands the formatted line back to csv.writer's caller."""
+
+    def write(self, value):
+        return value
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, cls=ExportJSONEncoder, ensure_ascii=False)
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return value
+
+
+def iter_csv(qs, chunk_size=DEFAULT_CHUNK_SIZE):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_COLUMNS)
+    for batch in iter_export_batches(qs, chunk_size=chunk_size):
+        yield "".join(
+            writer.writerow([_csv_value(row[c]) for c in EXPORT_COLUMNS])
+            for row in batch
+        )
+
+
+def _archive_path(question_id, sort_order, name):
+    return f"images/{question_id}/{sort_order:02d}-{os.path.basename(name)}"
+
+
+def _attach_extra_images(rows):
+    extras = (
+        CroppedImageExtra.objects.filter(parent_id__in=[row["id"] for row in rows])
+        .order_by("parent_id", "sort_order", "id")
+        .values(
+            "id",
+            "parent_id",
+            "image",
+            "image_type",
+            "rect_pdf",
+            "rect_screen",
+            "sort_order",
+            image_type_name=F("image_type__name"),
+        )
+    )
+    by_parent = {}
+    for extra in extras:
+        parent_id = extra.pop("parent_id")
+        extra["archive_path"] = _archive_path(parent_id, extra["sort_order"], extra["image"])
+        by_parent.setdefault(parent_id, []).append(extra)
+
+    for row in rows:
+        row["archive_path"] = _archive_path(row["id"], 1, row["image"])
+        row["extra_images"] = by_parent.get(row["id"], [])
+    return rows
+
+
+def iter_bundle_batches(qs, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Like iter_export_batches, plus archive paths and extra images in sort_order."""
+    for batch in iter_export_batches(qs, chunk_size=chunk_size):
+        yield _attach_extra_images(batch)
+
+
+def _iter_rows(qs, top_pk, chunk_size):
+    """Bundle batches of ``qs`` rows with pk <= ``top_pk``, newest first.
+
+    Pages by keyset on (created_at, pk): each page is the ``chunk_size``
+    rows below the last one sent, so no list of ids is held and every page
+    is one indexed LIMIT query.
+    """
+    if top_pk is None:
+        return
+    qs = qs.filter(pk__lte=top_pk).order_by("-created_at", "-pk")
+    page = qs
+    while True:
+        batch = next(iter_bundle_batches(page[:chunk_size], chunk_size=chunk_size), [])
+        if batch:
+            yield batch
+        if len(batch) < chunk_size:
+            return
+        last = batch[-1]
+        page = qs.filter(Q(created_at__lt=last["created_at"]) | Q(created_at=last["created_at"], pk__lt=last["id"]))
+
+
+class _ZipSink:
+    """Write-only, unseekable target for ZipFile.
+
+    Without tell()/seek() ZipFile falls back to data descriptors, so it never
+    needs to rewind; iter_zip drains whatever was written after each step.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _zip_info(name, compress_type, file_size=0):
+    info = zipfile.ZipInfo(name, date_time=timezone.now().timetuple()[:6])
+    info.compress_type = compress_type
+    info.file_size = file_size
+    return info
+
+
+def iter_zip(qs, chunk_size=DEFAULT_CHUNK_SIZE, storage=default_storage):
+    """Stream a ZIP with manifest.json first, then every primary and extra image.
+
+    Images are stored uncompressed (they already are) and copied in
+    FILE_CHUNK_SIZE reads. Files missing from storage are skipped and listed
+    in a trailing missing.json entry, since the manifest has already been sent.
+    Rows come newest first (created_at, then pk). The highest pk is read
+    once up front and both passes (manifest, then files) stop there, so rows
+    created meanwhile cannot make them disagree.
+    """
+    for data in _iter_zip_parts(qs, chunk_size, storage):
+        if data:
+            yield data
+
+
+def _iter_zip_parts(qs, chunk_size, storage):
+    top_pk = qs.aggregate(top=Max("pk"))["top"]
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, "w", allowZip64=True) as zf:
+        manifest_info = _zip_info(MANIFEST_NAME, zipfile.ZIP_DEFLATED)
+        with zf.open(manifest_info, "w", force_zip64=True) as entry:
+            exported_at = json.dumps(timezone.now(), cls=ExportJSONEncoder)
+            entry.write(
+                f'{{"version": {MANIFEST_VERSION}, "exported_at": {exported_at}, "questions": ['.encode()
+            )
+            first = True
+            for batch in _iter_rows(qs, top_pk, chunk_size):
+                for row in batch:
+                    if not first:
+                        entry.write(b",")
+                    first = False
+                    entry.write(json.dumps(row, cls=ExportJSONEncoder, ensure_ascii=False).encode())
+                yield sink.drain()
+            entry.write(b"]}\n")
+        yield sink.drain()
+
+        missing = []
+        for batch in _iter_rows(qs, top_pk, chunk_size):
+            for row in batch:
+                for name, arcname in [(row["image"], row["archive_path"])] + [
+                    (extra["image"], extra["archive_path"]) for extra in row["extra_images"]
+                ]:
+                    try:
+                        size = storage.size(name)
+                        source = storage.open(name, "rb")
+                    except (OSError, ValueError):
+                        missing.append({"image": name, "archive_path": arcname})
+                        continue
+                    with source, zf.open(_zip_info(arcname, zipfile.ZIP_STORED, size), "w") as entry:
+                        while True:
+                            chunk = source.read(FILE_CHUNK_SIZE)
+                            if not chunk:
+                                break
+                            entry.write(chunk)
+                            yield sink.drain()
+                    yield sink.drain()
+
+        if missing:
+            zf.writestr(_zip_info("missing.json", zipfile.ZIP_DEFLATED), json.dumps(missing))
+    yield sink.drain()
+
+
+async def astream(iterator):
+    """Async iterator over ``iterator``, advancing it in the request's sync thread one piece at a time."""
+    iterator = iter(iterator)
+    done = object()
+    advance = sync_to_async(next)
+    while True:
+        piece = await advance(iterator, done)
+        if piece is done:
+            return
+        yield piece
+
+
+# name -> (stream function, content type, file extension)
+EXPORT_FORMATS = {
+    "ndjson": (iter_ndjson, NDJSON_CONTENT_TYPE, "ndjson"),
+    "csv": (iter_csv, CSV_CONTENT_TYPE, "csv"),
+    "zip": (iter_zip, ZIP_CONTENT_TYPE, "zip"),
+}
+
+# Formats that yield bytes rather than text.
+BINARY_EXPORT_FORMATS = {"zip"}
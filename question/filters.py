@@ -0,0 +1,79 @@
+"""Query-param filters shared by list views, exports and management commands.
+
+``params`` only needs a ``.get()`` method, so DRF ``query_params``, Django
+``QueryDict`` and plain dicts all work.
+"""
+from django.db.models import Exists, OuterRef
+
+from .models import QuestionUsage
+
+
+def as_int(value):
+    """``int(value)``, or None when ``value`` is missing or not a number."""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+CROPPED_IMAGE_FK_FILTERS = {
+    "image_type": "image_type_id",
+    "class_name": "class_name_id",
+    "subject": "subject_id",
+    "chapter": "chapter_id",
+    "concept": "concept_id",
+    "topic": "topic_id",
+    "question_type": "question_type_id",
+    "source": "source_id",
+}
+
+
+def filter_cropped_images(qs, params):
+    for query_key, field_name in CROPPED_IMAGE_FK_FILTERS.items():
+        value = params.get(query_key)
+        if value in (None, ""):
+            continue
+        parsed = as_int(value)
+        if parsed is None:
+            continue
+        qs = qs.filter(**{field_name: parsed})
+
+    difficulty = params.get("difficulty")
+    if difficulty:
+        qs = qs.filter(difficulty=difficulty)
+
+    marks = params.get("marks")
+    if marks not in (None, ""):
+        parsed_marks = as_int(marks)
+        if parsed_marks is not None:
+            qs = qs.filter(marks=parsed_marks)
+
+    priority = params.get("priority")
+    if priority not in (None, ""):
+        parsed_priority = as_int(priority)
+        if parsed_priority is not None:
+            qs = qs.filter(priority=parsed_priority)
+
+    verified = params.get("verified")
+    if verified in ("0", "1", "true", "false", "True", "False"):
+        truthy = verified in ("1", "true", "True")
+        qs = qs.filter(verified=truthy)
+
+    is_active = params.get("is_active")
+    if is_active in ("0", "1", "true", "false", "True", "False"):
+        truthy = is_active in ("1", "true", "True")
+        qs = qs.filter(is_active=truthy)
+
+    usage_types = params.get("usage_types") or params.get("usage_type")
+    if usage_types:
+        parts = [p.strip() for p in str(usage_types).split(",") if p.strip()]
+        ids = [i for i in (as_int(p) for p in parts) if i is not None]
+        if ids:
+            # Correlated EXISTS instead of JOIN + DISTINCT: rows are still read in
+            # -created_at index order, so a page stops early instead of sorting
+            # every match.
+            qs = qs.filter(
+                Exists(QuestionUsage.objects.filter(question_id=OuterRef("pk"), usage_type_id__in=ids))
+            )
+
+    return qs
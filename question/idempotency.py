@@ -0,0 +1,129 @@
+"""Idempotency-Key support for the upload views.
+
+A client that retries a POST after a timeout sends the same
+``Idempotency-Key`` header. The first request with a key claims an
+IdempotencyKey row for it. When the request succeeds, the row keeps its
+status, data and Location header, and a retry gets that response back
+(with ``Idempotent-Replayed: true``) without the view running again, so
+no second crop or file is created.
+
+A key is bound to a fingerprint of the request: method, path, form fields
+and the names and sizes of the uploaded files. Reusing it for a different
+request is a 422. A retry that arrives while the first request is still
+running is a 409. Failed requests (4xx/5xx) release their key, so
+correcting the request and retrying under the same key runs it again.
+Keys live for QUESTION_IDEMPOTENCY_TTL seconds. A key that is still
+running after LOCK_TIMEOUT seconds is treated as abandoned.
+"""
+import functools
+import hashlib
+import json
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .metrics import record_cache
+from .models import IdempotencyKey
+
+HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+STORED_HEADERS = ("Location",)
+MAX_KEY_LENGTH = 255
+LOCK_TIMEOUT = 10 * 60  # seconds before a key whose request never finished can be claimed again
+SWEEP_INTERVAL = 60  # seconds between deletes of expired keys, per process
+
+_next_sweep = 0.0
+
+
+def fingerprint(request):
+    """sha256 of what makes two requests "the same" for an Idempotency-Key."""
+    files = request.FILES
+    data = request.data
+    pairs = data.lists() if hasattr(data, "lists") else data.items()
+    fields = {k: v for k, v in pairs if k not in files}
+    uploads = sorted((k, f.name, f.size) for k, values in files.lists() for f in values)
+    body = json.dumps([request.method, request.get_full_path(), fields, uploads], sort_keys=True, default=str)
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+def _sweep(now):
+    global _next_sweep
+    if time.monotonic() < _next_sweep:
+        return
+    _next_sweep = time.monotonic() + SWEEP_INTERVAL
+    IdempotencyKey.objects.filter(expires_at__lte=now).delete()
+
+
+def _claim(scope, key, digest):
+    """(row, True) if this request now owns ``key``, (existing row, False) if not, (None, False) on a lost race."""
+    now = timezone.now()
+    _sweep(now)
+    for _ in range(3):
+        try:
+            with transaction.atomic():
+                row = IdempotencyKey.objects.create(
+                    scope=scope, key=key, fingerprint=digest, expires_at=now + timedelta(seconds=LOCK_TIMEOUT)
+                )
+            return row, True
+        except IntegrityError:
+            pass
+        row = IdempotencyKey.objects.filter(scope=scope, key=key).first()
+        if row is not None and row.expires_at > now:
+            return row, False
+        # Expired (or deleted meanwhile): clear it and try to claim again.
+        IdempotencyKey.objects.filter(scope=scope, key=key, expires_at__lte=now).delete()
+    return None, False
+
+
+def idempotent(handler):
+    """Replay the stored response of a view method to retries with the same Idempotency-Key."""
+
+    @functools.wraps(handler)
+    def wrapper(view, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return handler(view, request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return Response(
+                {"detail": f"{HEADER} is longer than {MAX_KEY_LENGTH} characters."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        digest = fingerprint(request)
+        row, claimed = _claim(type(view).__name__, key, digest)
+        if not claimed:
+            if row is not None and row.fingerprint != digest:
+                return Response(
+                    {"detail": f"{HEADER} was already used for a different request."},
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                )
+            if row is None or row.status_code is None:
+                return Response(
+                    {"detail": f"A request with this {HEADER} is still running."},
+                    status=status.HTTP_409_CONFLICT,
+                )
+            record_cache("idempotency", hit=True)
+            return Response(row.response, status=row.status_code, headers={**row.headers, REPLAYED_HEADER: "true"})
+
+        record_cache("idempotency", hit=False)
+        try:
+            response = handler(view, request, *args, **kwargs)
+        except Exception:
+            row.delete()
+            raise
+        if response.status_code >= 400 or not isinstance(response, Response):
+            row.delete()
+            return response
+        row.status_code = response.status_code
+        row.response = response.data
+        row.headers = {h: response[h] for h in STORED_HEADERS if h in response}
+        row.expires_at = timezone.now() + timedelta(seconds=settings.QUESTION_IDEMPOTENCY_TTL)
+        row.save(update_fields=["status_code", "response", "headers", "expires_at"])
+        return response
+
+    return wrapper
@@ -0,0 +1,83 @@
+"""Metadata of stored crop images: width, height, byte size, format, sha256
+and a placeholder.
+
+It is read once, when an image is stored (the pre_save receiver in
+models.py, import_bank and seed_bank), so clients can lay out grids and
+find duplicates without fetching or re-opening any file. Dimensions and
+format come from the image header. The placeholder is a data: URI of a
+thumbnail at most PLACEHOLDER_SIZE pixels on its longer side, about 100
+bytes as WebP, that a grid can paint before any image bytes arrive; it
+is the one value that needs the pixels decoded (JPEG at reduced scale).
+Rows stored before these columns existed are filled in by ``manage.py
+backfill_image_metadata``.
+"""
+import base64
+import hashlib
+import io
+
+from PIL import Image, UnidentifiedImageError, features
+
+FIELDS = ("width", "height", "byte_size", "image_format", "sha256", "placeholder")
+PLACEHOLDER_SIZE = 20
+# WebP is a quarter the size of PNG at this scale; PNG if Pillow lacks it.
+_PLACEHOLDER_FORMAT = "WEBP" if features.check("webp") else "PNG"
+_READ_SIZE = 64 * 1024
+
+
+def placeholder(img):
+    """data: URI of a PLACEHOLDER_SIZE thumbnail of ``img``, flattened onto white. Shrinks ``img``."""
+    img.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE))
+    rgba = img.convert("RGBA")
+    flat = Image.new("RGB", rgba.size, "white")
+    flat.paste(rgba, mask=rgba.getchannel("A"))
+    buf = io.BytesIO()
+    flat.save(buf, _PLACEHOLDER_FORMAT, quality=40)
+    return f"data:image/{_PLACEHOLDER_FORMAT.lower()};base64,{base64.b64encode(buf.getvalue()).decode()}"
+
+
+def from_file(fp):
+    """Metadata of an open binary image file. Leaves it rewound."""
+    fp.seek(0)
+    digest = hashlib.sha256()
+    size = 0
+    for chunk in iter(lambda: fp.read(_READ_SIZE), b""):
+        digest.update(chunk)
+        size += len(chunk)
+    fp.seek(0)
+    width = height = None
+    image_format = thumb = ""
+    try:
+        with Image.open(fp) as img:
+            (width, height), image_format = img.size, img.format or ""
+            thumb = placeholder(img)
+    except (UnidentifiedImageError, OSError):
+        pass
+    fp.seek(0)
+    return {
+        "width": width,
+        "height": height,
+        "byte_size": size,
+        "image_format": image_format.lower(),
+        "sha256": digest.hexdigest(),
+        "placeholder": thumb,
+    }
+
+
+def apply(instance, metadata):
+    for field, value in metadata.items():
+        setattr(instance, field, value)
+
+
+def from_bytes(data):
+    return from_file(io.BytesIO(data))
+
+
+def from_storage(name):
+    """Metadata of a stored file, or None when it is missing."""
+    from django.core.files.storage import default_storage
+
+    try:
+        with default_storage.open(name, "rb") as fp:
+            return from_file(fp)
+    except FileNotFoundError:
+        return None
@@ -0,0 +1,247 @@
+"""Bulk import of question-bank bundles written by ``export_bank --format zip``.
+
+The command in management/commands/import_bank.py drives these pieces:
+image work runs in a process pool (prepare_image), taxonomy is resolved
+in bulk per chunk (TaxonomyResolver), and the manifest is parsed
+incrementally (iter_manifest_questions) so its size does not matter.
+"""
+import io
+import json
+import os
+import zipfile
+
+from PIL import Image
+
+from . import imagemeta
+from .export import MANIFEST_NAME
+from .filters import as_int
+from .models import (
+    Chapter,
+    ClassName,
+    Concept,
+    ImageType,
+    QuestionType,
+    Sources,
+    Subject,
+    Topic,
+    UsageType,
+)
+
+_READ_SIZE = 64 * 1024
+
+
+def open_manifest(bundle_path):
+    """Return a text file object for the bundle's manifest (ZIP or directory)."""
+    if os.path.isdir(bundle_path):
+        return open(os.path.join(bundle_path, MANIFEST_NAME), encoding="utf-8")
+    archive = zipfile.ZipFile(bundle_path)
+    return io.TextIOWrapper(archive.open(MANIFEST_NAME), encoding="utf-8")
+
+
+def iter_manifest_questions(fp):
+    """Yield each object of the manifest's "questions" array without loading the whole file."""
+    decoder = json.JSONDecoder()
+    buf = ""
+    while True:
+        start = buf.find('"questions"')
+        bracket = buf.find("[", start) if start != -1 else -1
+        if bracket != -1:
+            buf = buf[bracket + 1:]
+            break
+        chunk = fp.read(_READ_SIZE)
+        if not chunk:
+            raise ValueError("Manifest has no \"questions\" array.")
+        buf += chunk
+
+    while True:
+        buf = buf.lstrip()
+        if buf.startswith(","):
+            buf = buf[1:]
+            continue
+        if buf.startswith("]"):
+            return
+        if buf:
+            try:
+                obj, end = decoder.raw_decode(buf)
+            except json.JSONDecodeError:
+                obj = None
+            if obj is not None:
+                yield obj
+                buf = buf[end:]
+                continue
+        chunk = fp.read(_READ_SIZE)
+        if not chunk:
+            raise ValueError("Manifest ended before the \"questions\" array was closed.")
+        buf += chunk
+
+
+# Per-process cache so each pool worker parses a ZIP's central directory once.
+_open_archives = {}
+
+
+def _read_member(bundle_path, archive_path):
+    if os.path.isdir(bundle_path):
+        with open(os.path.join(bundle_path, archive_path), "rb") as fh:
+            return fh.read()
+    archive = _open_archives.get(bundle_path)
+    if archive is None:
+        archive = _open_archives[bundle_path] = zipfile.ZipFile(bundle_path)
+    return archive.read(archive_path)
+
+
+def init_worker():
+    """Pool initializer: make Django usable under the spawn start method too."""
+    import django
+    from django.apps import apps
+
+    if not apps.ready:
+        django.setup()
+
+
+def prepare_image(bundle_path, archive_path, target_name):
+    """Decode and store one bundle image. Runs in a worker process.
+
+    Returns (storage name, imagemeta metadata). Raises on unreadable images
+    so the caller can skip the owning question.
+    """
+    from django.core.files.base import ContentFile
+    from django.core.files.storage import default_storage
+
+    data = _read_member(bundle_path, archive_path)
+    with Image.open(io.BytesIO(data)) as img:
+        # Full decode, not just the header, so truncated files are rejected here.
+        img.load()
+    return default_storage.save(target_name, ContentFile(data)), imagemeta.from_bytes(data)
+
+
+def _key(value):
+    pk = as_int(value)
+    if pk is not None:
+        return ("pk", pk)
+    return ("name", str(value))
+
+
+def taxonomy_key(item, field):
+    """Lookup key for ``field`` of a manifest item, or None when absent.
+
+    The exported "<field>_name" wins because ids do not carry over between
+    databases; otherwise the raw value follows the views' id-or-name rule.
+    """
+    name = item.get(f"{field}_name")
+    if name not in (None, ""):
+        return ("name", str(name))
+    value = item.get(field)
+    if value in (None, ""):
+        return None
+    return _key(value)
+
+
+def _usage_key(value):
+    if isinstance(value, dict):
+        if value.get("name") not in (None, ""):
+            return ("name", str(value["name"]))
+        value = value.get("id")
+    return _key(value)
+
+
+class TaxonomyResolver:
+    """Resolve taxonomy ids/names for many items at once, creating missing rows in bulk.
+
+    Follows the same rules as UploadCrop/UploadCropBulk: integers are primary
+    keys, anything else is a name, and chapter/concept/topic are only
+    resolved when their parent resolved. Results are cached across chunks.
+    """
+
+    NAMED_MODELS = {
+        "class_name": ClassName,
+        "subject": Subject,
+        "image_type": ImageType,
+        "question_type": QuestionType,
+        "source": Sources,
+    }
+
+    def __init__(self):
+        self._cache = {}
+
+    def _resolve(self, model, keys, scope_fields=()):
+        """Fill the cache for (pk|name, value, *scope ids) keys of ``model``."""
+        cache = self._cache.setdefault(model, {})
+        keys = {k for k in keys if k not in cache}
+        if not keys:
+            return
+
+        pks = {k[1] for k in keys if k[0] == "pk"}
+        if pks:
+            for pk, obj in model.objects.in_bulk(pks).items():
+                cache[("pk", pk)] = obj
+
+        def _scoped_key(obj):
+            return ("name", obj.name) + tuple(getattr(obj, f) for f in scope_fields)
+
+        wanted = {k for k in keys if k[0] == "name"}
+        if not wanted:
+            return
+        lookup = {"name__in": {k[1] for k in wanted}}
+        for i, field in enumerate(scope_fields, start=2):
+            lookup[f"{field}__in"] = {k[i] for k in wanted}
+
+        found = {_scoped_key(obj): obj for obj in model.objects.filter(**lookup)}
+        missing = wanted - found.keys()
+        if missing:
+            model.objects.bulk_create(
+                [model(name=k[1], **dict(zip(scope_fields, k[2:]))) for k in missing],
+                ignore_conflicts=True,
+            )
+            for obj in model.objects.filter(**lookup):
+                found.setdefault(_scoped_key(obj), obj)
+        for k in wanted:
+            if k in found:
+                cache[k] = found[k]
+
+    def _get(self, model, key):
+        return self._cache.get(model, {}).get(key)
+
+    def resolve(self, items):
+        """Return one dict of resolved model instances per item (missing/unresolved -> None)."""
+        out = [{} for _ in items]
+
+        for field, model in self.NAMED_MODELS.items():
+            keys = {}
+            for i, item in enumerate(items):
+                key = taxonomy_key(item, field)
+                if key is not None:
+                    keys[i] = key
+            self._resolve(model, keys.values())
+            for i, key in keys.items():
+                out[i][field] = self._get(model, key)
+
+        usage_keys = {}
+        for i, item in enumerate(items):
+            usage_keys[i] = [_usage_key(u) for u in item.get("usage_types") or []]
+        self._resolve(UsageType, {k for keys in usage_keys.values() for k in keys})
+        for i, keys in usage_keys.items():
+            out[i]["usage_types"] = [
+                obj for obj in (self._get(UsageType, k) for k in keys) if obj is not None
+            ]
+
+        # Scoped levels: chapter -> concept -> topic, each needs its parent(s).
+        levels = (
+            ("chapter", Chapter, ("class_name_id", "subject_id"), ("class_name", "subject")),
+            ("concept", Concept, ("chapter_id",), ("chapter",)),
+            ("topic", Topic, ("concept_id",), ("concept",)),
+        )
+        for field, model, scope_fields, parents in levels:
+            keys = {}
+            for i, item in enumerate(items):
+                key = taxonomy_key(item, field)
+                parent_objs = [out[i].get(p) for p in parents]
+                if key is None or any(p is None for p in parent_objs):
+                    continue
+                if key[0] == "name":
+                    key = key + tuple(p.pk for p in parent_objs)
+                keys[i] = key
+            self._resolve(model, keys.values(), scope_fields)
+            for i, key in keys.items():
+                out[i][field] = self._get(model, key)
+
+        return out
@@ -0,0 +1,79 @@
+"""Per-request performance counters.
+
+PerformanceMiddleware opens a RequestMetrics for each request and stores it
+in a context variable. Code on the request path adds to it through
+``span(name)`` (elapsed time) and ``incr(name)`` (counters). Outside a
+request, both are no-ops. DB time and query counts come from
+``QueryTimer``, installed as an execute wrapper on every connection
+(``middleware.install_query_hooks``).
+"""
+import contextvars
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+_current = contextvars.ContextVar("question_request_metrics", default=None)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.timings = defaultdict(float)  # span name -> seconds
+        self.counts = defaultdict(int)
+        self.path = None
+        self.view = None  # set once the URL resolves
+        self._active = set()
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+
+def current():
+    """The RequestMetrics of the running request, or None."""
+    return _current.get()
+
+
+def activate(metrics):
+    return _current.set(metrics)
+
+
+def deactivate(token):
+    _current.reset(token)
+
+
+@contextmanager
+def span(name):
+    """Add the time spent in the block to ``name``.
+
+    Re-entering a span that is already open (nested serializers, a storage
+    call inside another storage call) does not count the time twice.
+    """
+    metrics = _current.get()
+    if metrics is None or name in metrics._active:
+        yield
+        return
+    metrics._active.add(name)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.timings[name] += time.perf_counter() - started
+        metrics._active.discard(name)
+
+
+def incr(name, value=1):
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.counts[name] += value
+
+
+class QueryTimer:
+    """Execute wrapper (see ``connection.execute_wrapper``) feeding "db" time and "queries"."""
+
+    def __call__(self, execute, sql, params, many, context):
+        with span("db"):
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                incr("queries")
@@ -0,0 +1,81 @@
+"""Logging helpers: a non-blocking queue handler, sampling, and value previews.
+
+Configured from settings.LOGGING. Request threads only put records on a
+bounded queue; a QueueListener thread does the actual I/O. The listener
+starts with the first record a process logs, so management commands and
+pool workers that never log run no extra thread. When the queue is full
+the record is dropped and counted (question_log_records_dropped_total)
+rather than making the request wait.
+"""
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import threading
+
+from django.core.files.uploadedfile import UploadedFile
+
+from .metrics import Counter
+
+DROPPED = Counter("question_log_records_dropped_total", "Log records dropped because the log queue was full.")
+
+PREVIEW_LIMIT = 200
+
+
+class NonBlockingHandler(logging.handlers.QueueHandler):
+    """QueueHandler feeding a background listener that writes to stderr."""
+
+    def __init__(self, maxsize=10000):
+        super().__init__(queue.Queue(maxsize))
+        self.target = logging.StreamHandler()
+        self.listener = None
+        self._listener_pid = None
+        self._start_lock = threading.Lock()
+
+    def _start_listener(self):
+        with self._start_lock:
+            # Per pid: a forked child inherits the listener object but not its
+            # thread, and a copy of the parent's queue that it must not re-emit.
+            if self._listener_pid != os.getpid():
+                if self._listener_pid is not None:
+                    self.queue = queue.Queue(self.queue.maxsize)
+                self.listener = logging.handlers.QueueListener(self.queue, self.target)
+                self.listener.start()
+                self._listener_pid = os.getpid()
+
+    def enqueue(self, record):
+        if self._listener_pid != os.getpid():
+            self._start_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DROPPED.inc()
+
+    def close(self):
+        # logging.shutdown() closes handlers at exit; stop() drains the queue first.
+        if self._listener_pid == os.getpid():
+            self.listener.stop()
+            self._listener_pid = None
+        super().close()
+
+
+class SamplingFilter(logging.Filter):
+    """Let through a ``rate`` fraction of records below WARNING; warnings and errors always pass."""
+
+    def __init__(self, rate=1.0):
+        super().__init__()
+        self.rate = float(rate)
+
+    def filter(self, record):
+        return record.levelno >= logging.WARNING or self.rate >= 1 or random.random() < self.rate
+
+
+def preview(value, limit=PREVIEW_LIMIT):
+    """Short, log-safe description of a request value: files by metadata, text capped at ``limit``."""
+    if isinstance(value, UploadedFile):
+        return f"<file name={value.name!r} size={value.size} type={value.content_type!r}>"
+    text = value if isinstance(value, str) else repr(value)
+    if len(text) > limit:
+        return f"{text[:limit]}...(+{len(text) - limit} chars)"
+    return text
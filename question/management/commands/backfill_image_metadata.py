@@ -0,0 +1,61 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.db.models import Q
+
+from question import imagemeta
+from question.importer import init_worker
+from question.models import CroppedImage, CroppedImageExtra
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill in width, height, byte size, format, sha256 and placeholder for crops and extra "
+        "images stored before uploads recorded them. Files are read in a process pool; rerunning "
+        "only visits rows that are still missing metadata."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+        parser.add_argument("--batch-size", type=int, default=500, help="Rows per update transaction.")
+
+    def handle(self, *args, **options):
+        if options["workers"] < 1 or options["batch_size"] < 1:
+            raise CommandError("--workers and --batch-size must be positive.")
+
+        # Forked workers must not share the parent's SQLite handle.
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=options["workers"], initializer=init_worker) as pool:
+            for model in (CroppedImage, CroppedImageExtra):
+                filled, missing = self.backfill(pool, model, options["batch_size"])
+                self.stdout.write(f"{model.__name__}: {filled} filled, {missing} files missing.")
+
+    def backfill(self, pool, model, batch_size):
+        pending = (
+            model.objects.filter(Q(sha256="") | Q(placeholder=""))
+            .exclude(image="")
+            .only("pk", "image")
+            .order_by("pk")
+        )
+        last_pk = 0
+        filled = missing = 0
+        while True:
+            batch = list(pending.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                return filled, missing
+            last_pk = batch[-1].pk
+
+            found = []
+            names = [obj.image.name for obj in batch]
+            for obj, metadata in zip(batch, pool.map(imagemeta.from_storage, names, chunksize=16)):
+                if metadata is None:
+                    missing += 1
+                    continue
+                imagemeta.apply(obj, metadata)
+                found.append(obj)
+            with transaction.atomic():
+                model.objects.bulk_update(found, imagemeta.FIELDS)
+            filled += len(found)
+            self.stdout.write(f"{model.__name__} #{last_pk}: {filled} filled, {missing} missing")
@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from question.export import BINARY_EXPORT_FORMATS, DEFAULT_CHUNK_SIZE, EXPORT_FORMATS
+from question.filters import filter_cropped_images
+from question.models import CroppedImage
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream the question bank as NDJSON, CSV or a ZIP bundle "
+        "(manifest.json + images) with constant memory."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--format", choices=sorted(EXPORT_FORMATS), default="ndjson")
+        parser.add_argument("-o", "--output", help="Write to this file instead of stdout.")
+        parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+        parser.add_argument(
+            "--filter",
+            action="append",
+            default=[],
+            metavar="KEY=VALUE",
+            help="Same keys as /api/cropped-images/, e.g. --filter chapter=12 --filter verified=0.",
+        )
+
+    def handle(self, *args, **options):
+        params = {}
+        for raw in options["filter"]:
+            key, sep, value = raw.partition("=")
+            if not sep or not key:
+                raise CommandError(f"Invalid --filter {raw!r}; expected KEY=VALUE.")
+            params[key] = value
+
+        if options["chunk_size"] < 1:
+            raise CommandError("--chunk-size must be positive.")
+        binary = options["format"] in BINARY_EXPORT_FORMATS
+        if binary and not options["output"]:
+            raise CommandError(f"--format {options['format']} requires --output.")
+
+        qs = CroppedImage.objects.all().order_by("-created_at")
+        qs = filter_cropped_images(qs, params)
+        stream, _, _ = EXPORT_FORMATS[options["format"]]
+        chunks = stream(qs, chunk_size=options["chunk_size"])
+
+        if binary:
+            with open(options["output"], "wb") as fh:
+                for chunk in chunks:
+                    fh.write(chunk)
+        elif options["output"]:
+            with open(options["output"], "w", encoding="utf-8", newline="") as fh:
+                for chunk in chunks:
+                    fh.write(chunk)
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending="")
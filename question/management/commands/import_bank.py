@@ -0,0 +1,272 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.utils.dateparse import parse_datetime
+
+from question.filters import as_int
+from question.importer import (
+    TaxonomyResolver,
+    init_worker,
+    iter_manifest_questions,
+    open_manifest,
+    prepare_image,
+)
+from question.models import CroppedImage, CroppedImageExtra, QuestionUsage
+
+REQUIRED_TAXONOMY = ("class_name", "subject", "chapter", "image_type")
+DIFFICULTIES = {value for value, _ in CroppedImage.DIFFICULTY_CHOICES}
+
+
+# Restored from the manifest after insert: bulk_create would stamp the import time.
+TIMESTAMPS = ("created_at", "updated_at")
+
+
+def _as_bool(value, default):
+    if value in (None, ""):
+        return default
+    if isinstance(value, str):
+        return value in ("1", "true", "True")
+    return bool(value)
+
+
+class Command(BaseCommand):
+    help = (
+        "Import a question-bank bundle (ZIP or directory with manifest.json, as written by "
+        "export_bank --format zip). Images are decoded and stored in a process pool; rows "
+        "are inserted in chunked transactions with a resumable checkpoint."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("bundle", help="Path to the ZIP file or extracted bundle directory.")
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+        parser.add_argument("--batch-size", type=int, default=500, help="Questions per transaction.")
+        parser.add_argument("--checkpoint", help="Checkpoint file (default: <bundle>.checkpoint.json).")
+        parser.add_argument("--restart", action="store_true", help="Ignore an existing checkpoint.")
+
+    def handle(self, *args, **options):
+        bundle = options["bundle"]
+        if not os.path.exists(bundle):
+            raise CommandError(f"Bundle not found: {bundle}")
+        if options["workers"] < 1 or options["batch_size"] < 1:
+            raise CommandError("--workers and --batch-size must be positive.")
+
+        self.checkpoint_path = options["checkpoint"] or f"{bundle.rstrip(os.sep)}.checkpoint.json"
+        self.state = {"next_index": 0, "imported": 0, "failed": []}
+        if not options["restart"] and os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path, encoding="utf-8") as fh:
+                self.state = json.load(fh)
+            self._settle_pending()
+            self.stdout.write(f"Resuming at question #{self.state['next_index']}.")
+
+        self.bundle = bundle
+        self.resolver = TaxonomyResolver()
+
+        # Forked workers must not share the parent's SQLite handle.
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=options["workers"], initializer=init_worker) as pool:
+            with open_manifest(bundle) as fp:
+                pending = None
+                for start, chunk in self._chunks(iter_manifest_questions(fp), options["batch_size"]):
+                    # Submit the next chunk before committing the previous one so
+                    # the pool keeps decoding while the DB is busy.
+                    submitted = (start, chunk, [self._submit(pool, row) for row in chunk])
+                    if pending is not None:
+                        self._commit(*pending)
+                    pending = submitted
+                if pending is not None:
+                    self._commit(*pending)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {self.state['imported']} questions; {len(self.state['failed'])} failed."
+            )
+        )
+
+    def _chunks(self, questions, size):
+        chunk = []
+        start = None
+        for index, row in enumerate(questions):
+            if index < self.state["next_index"]:
+                continue
+            if start is None:
+                start = index
+            chunk.append(row)
+            if len(chunk) >= size:
+                yield start, chunk
+                chunk, start = [], None
+        if chunk:
+            yield start, chunk
+
+    def _submit(self, pool, row):
+        files = [(row.get("archive_path"), row.get("image"))] + [
+            (extra.get("archive_path"), extra.get("image")) for extra in row.get("extra_images") or []
+        ]
+        return [
+            pool.submit(
+                prepare_image,
+                self.bundle,
+                archive_path,
+                target or f"cropped/{os.path.basename(archive_path or '')}",
+            )
+            for archive_path, target in files
+        ]
+
+    def _commit(self, start, chunk, futures):
+        failed = []
+        stored = []
+        ready = []
+        for offset, (row, row_futures) in enumerate(zip(chunk, futures)):
+            images = []
+            error = None
+            for future in row_futures:
+                try:
+                    images.append(future.result())
+                except Exception as exc:
+                    error = error or f"{type(exc).__name__}: {exc}"
+            names = [name for name, _ in images]
+            stored.extend(names)
+            if error:
+                failed.append({"index": start + offset, "error": error})
+                self._delete_files(names)
+            else:
+                ready.append((start + offset, row, images))
+
+        # If the process dies between the commit and the checkpoint below, the
+        # next run finds these stored names in the table and skips the chunk.
+        self.state["pending"] = {
+            "next_index": start + len(chunk),
+            "images": [images[0][0] for _, _, images in ready],
+            "failed": failed,
+        }
+        self._save_checkpoint()
+        try:
+            with transaction.atomic():
+                imported, rejected = self._insert(ready)
+        except Exception as exc:
+            self._delete_files(stored)
+            raise CommandError(
+                f"Chunk starting at question #{start} failed ({exc}); "
+                f"rerun to resume from {self.checkpoint_path}."
+            ) from exc
+
+        del self.state["pending"]
+        failed.extend(rejected)
+        self.state["next_index"] = start + len(chunk)
+        self.state["imported"] += imported
+        self.state["failed"].extend(failed)
+        self._save_checkpoint()
+        self.stdout.write(
+            f"#{self.state['next_index']}: {self.state['imported']} imported, "
+            f"{len(self.state['failed'])} failed"
+        )
+
+    def _settle_pending(self):
+        """Account for a chunk whose commit outcome the checkpoint did not record.
+
+        Stored file names are unique, so the chunk committed if any of its
+        crops is in the table; rows it rejected are then not listed as failed.
+        """
+        pending = self.state.pop("pending", None)
+        if pending is None:
+            return
+        committed = CroppedImage.objects.filter(image__in=pending["images"]).count()
+        if committed or not pending["images"]:
+            self.state["next_index"] = pending["next_index"]
+            self.state["imported"] += committed
+            self.state["failed"].extend(pending["failed"])
+        self._save_checkpoint()
+
+    def _insert(self, ready):
+        rows = [row for _, row, _ in ready]
+        resolved = self.resolver.resolve(rows)
+        extras_resolved = iter(
+            self.resolver.resolve([extra for row in rows for extra in row.get("extra_images") or []])
+        )
+
+        rejected = []
+        crops = []
+        accepted = []
+        for (index, row, images), tax in zip(ready, resolved):
+            extra_taxes = [next(extras_resolved) for _ in row.get("extra_images") or []]
+            missing = [f for f in REQUIRED_TAXONOMY if tax.get(f) is None]
+            difficulty = row.get("difficulty") or "easy"
+            if missing or difficulty not in DIFFICULTIES:
+                reason = f"Unresolved: {', '.join(missing)}" if missing else f"Invalid difficulty {difficulty!r}"
+                rejected.append({"index": index, "error": reason})
+                self._delete_files([name for name, _ in images])
+                continue
+            name, metadata = images[0]
+            crops.append(
+                CroppedImage(
+                    image=name,
+                    **metadata,
+                    image_type=tax["image_type"],
+                    rect_pdf=row.get("rect_pdf") or {},
+                    rect_screen=row.get("rect_screen") or {},
+                    class_name=tax["class_name"],
+                    subject=tax["subject"],
+                    chapter=tax["chapter"],
+                    concept=tax.get("concept"),
+                    topic=tax.get("topic"),
+                    question_type=tax.get("question_type"),
+                    difficulty=difficulty,
+                    marks=as_int(row.get("marks")) or 1,
+                    priority=as_int(row.get("priority")),
+                    verified=_as_bool(row.get("verified"), False),
+                    source=tax.get("source"),
+                    is_active=_as_bool(row.get("is_active"), True),
+                )
+            )
+            accepted.append((row, images, tax, extra_taxes))
+
+        CroppedImage.objects.bulk_create(crops)
+        restored = set()
+        for crop, (row, _, _, _) in zip(crops, accepted):
+            for field in TIMESTAMPS:
+                value = parse_datetime(row.get(field) or "")
+                if value is not None:
+                    setattr(crop, field, value)
+                    restored.add(field)
+        if restored:
+            CroppedImage.objects.bulk_update(crops, sorted(restored))
+
+        extra_objs = []
+        usage_links = []
+        for crop, (row, images, tax, extra_taxes) in zip(crops, accepted):
+            for extra, (name, metadata), extra_tax in zip(row.get("extra_images") or [], images[1:], extra_taxes):
+                extra_objs.append(
+                    CroppedImageExtra(
+                        parent=crop,
+                        image=name,
+                        **metadata,
+                        image_type=extra_tax.get("image_type") or crop.image_type,
+                        rect_pdf=extra.get("rect_pdf") or {},
+                        rect_screen=extra.get("rect_screen") or {},
+                        sort_order=as_int(extra.get("sort_order")) or 0,
+                    )
+                )
+            usage_links.extend(
+                QuestionUsage(question=crop, usage_type=usage_type)
+                for usage_type in {u.pk: u for u in tax["usage_types"]}.values()
+            )
+
+        CroppedImageExtra.objects.bulk_create(extra_objs)
+        QuestionUsage.objects.bulk_create(usage_links)
+        return len(crops), rejected
+
+    def _delete_files(self, names):
+        for name in names:
+            try:
+                default_storage.delete(name)
+            except Exception:
+                pass
+
+    def _save_checkpoint(self):
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as fh:
+            json.dump(self.state, fh)
+        os.replace(tmp_path, self.checkpoint_path)
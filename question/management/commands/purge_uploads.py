@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from question.resumable import purge_expired, session_dir
+
+
+class Command(BaseCommand):
+    help = "Delete resumable uploads whose QUESTION_UPLOAD_SESSION_TTL has passed. Run it from cron."
+
+    def handle(self, *args, **options):
+        purged = purge_expired()
+        self.stdout.write(f"Purged {purged} expired upload(s) from {session_dir()}.")
@@ -0,0 +1,197 @@
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+
+from question import imagemeta
+from question.importer import init_worker
+from question.models import (
+    Chapter,
+    ClassName,
+    Concept,
+    CroppedImage,
+    CroppedImageExtra,
+    ImageType,
+    QuestionType,
+    QuestionUsage,
+    Sources,
+    Subject,
+    Topic,
+    UsageType,
+)
+from question.synthetic import (
+    DIFFICULTY_WEIGHTS,
+    IMAGE_TYPES,
+    QUESTION_TYPES,
+    SOURCES,
+    USAGE_TYPES,
+    rect,
+    store_png,
+)
+
+
+def _named(model, names):
+    """Create the named lookup rows that are missing and return them in ``names`` order."""
+    model.objects.bulk_create([model(name=name) for name in names], ignore_conflicts=True)
+    by_name = {obj.name: obj for obj in model.objects.filter(name__in=names)}
+    return [by_name[name] for name in names]
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a synthetic question bank for load and scale testing, e.g. "
+        "--classes 50 --chapters 2000 --topics 20000 --questions 1000000. "
+        "Output is deterministic for a given --seed and set of options; run it "
+        "against an empty database (rows are appended, not replaced)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--classes", type=int, default=50)
+        parser.add_argument("--subjects", type=int, default=12)
+        parser.add_argument("--chapters", type=int, default=2000)
+        parser.add_argument("--concepts", type=int, default=6000)
+        parser.add_argument("--topics", type=int, default=20000)
+        parser.add_argument("--questions", type=int, default=10000)
+        parser.add_argument(
+            "--extras-ratio",
+            type=float,
+            default=0.3,
+            help="Share of questions with one or two extra (solution) images.",
+        )
+        parser.add_argument("--image-size", default="240x80", help="WIDTHxHEIGHT of generated PNGs.")
+        parser.add_argument("--chunk-size", type=int, default=5000, help="Questions per transaction.")
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+
+    def handle(self, *args, **options):
+        for key in ("classes", "subjects", "chapters", "concepts", "topics", "chunk_size", "workers"):
+            if options[key] < 1:
+                raise CommandError(f"--{key.replace('_', '-')} must be positive.")
+        if options["questions"] < 0 or not 0 <= options["extras_ratio"] <= 1:
+            raise CommandError("--questions must be >= 0 and --extras-ratio between 0 and 1.")
+        try:
+            width, height = (int(v) for v in options["image_size"].lower().split("x"))
+        except ValueError:
+            raise CommandError("--image-size must look like 240x80.")
+        self.image_size = (width, height)
+
+        self.seed = options["seed"]
+        self.rng = random.Random(self.seed)
+        self.seed_taxonomy(options)
+
+        # Forked workers must not share the parent's SQLite handle.
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=options["workers"], initializer=init_worker) as pool:
+            pending = None
+            for start in range(0, options["questions"], options["chunk_size"]):
+                count = min(options["chunk_size"], options["questions"] - start)
+                rows = [self.build_row(start + i, options["extras_ratio"]) for i in range(count)]
+                # Render the next chunk's images while the previous chunk is inserted.
+                submitted = (rows, pool.map(store_png, self.image_jobs(rows), chunksize=64))
+                if pending is not None:
+                    self.insert(*pending)
+                pending = submitted
+            if pending is not None:
+                self.insert(*pending)
+
+        self.stdout.write(self.style.SUCCESS(f"Seeded {options['questions']} questions (seed {self.seed})."))
+
+    def seed_taxonomy(self, options):
+        rng = self.rng
+        with transaction.atomic():
+            self.image_types = _named(ImageType, IMAGE_TYPES)
+            self.question_types = _named(QuestionType, QUESTION_TYPES)
+            self.usage_types = _named(UsageType, USAGE_TYPES)
+            self.sources = _named(Sources, SOURCES)
+            classes = _named(ClassName, [f"Class {i + 1}" for i in range(options["classes"])])
+            subjects = _named(Subject, [f"Subject {i + 1}" for i in range(options["subjects"])])
+
+            chapters = Chapter.objects.bulk_create(
+                [
+                    Chapter(name=f"Chapter {i + 1}", class_name=rng.choice(classes), subject=rng.choice(subjects))
+                    for i in range(options["chapters"])
+                ],
+                batch_size=options["chunk_size"],
+            )
+            concepts = Concept.objects.bulk_create(
+                [Concept(name=f"Concept {i + 1}", chapter=rng.choice(chapters)) for i in range(options["concepts"])],
+                batch_size=options["chunk_size"],
+            )
+            self.topics = Topic.objects.bulk_create(
+                [Topic(name=f"Topic {i + 1}", concept=rng.choice(concepts)) for i in range(options["topics"])],
+                batch_size=options["chunk_size"],
+            )
+        self.stdout.write(
+            f"Taxonomy: {len(classes)} classes, {len(subjects)} subjects, {len(chapters)} chapters, "
+            f"{len(concepts)} concepts, {len(self.topics)} topics."
+        )
+
+    def build_row(self, index, extras_ratio):
+        """Draw one question (still without image names) from the shared RNG."""
+        rng = self.rng
+        topic = rng.choice(self.topics)
+        concept = topic.concept
+        chapter = concept.chapter
+        depth = rng.random()
+        crop = CroppedImage(
+            image_type=self.image_types[0],
+            rect_pdf=rect(rng),
+            rect_screen=rect(rng),
+            class_name_id=chapter.class_name_id,
+            subject_id=chapter.subject_id,
+            chapter=chapter,
+            concept=concept if depth < 0.9 else None,
+            topic=topic if depth < 0.75 else None,
+            question_type=rng.choice(self.question_types),
+            difficulty=rng.choices(*zip(*DIFFICULTY_WEIGHTS))[0],
+            marks=rng.choice((1, 1, 2, 3, 4, 5)),
+            priority=rng.randint(1, 5) if rng.random() < 0.4 else None,
+            verified=rng.random() < 0.6,
+            source=rng.choice(self.sources) if rng.random() < 0.8 else None,
+            is_active=rng.random() < 0.95,
+        )
+        extras = []
+        if rng.random() < extras_ratio:
+            for order in range(2, 2 + rng.randint(1, 2)):
+                extras.append(
+                    CroppedImageExtra(
+                        image_type=self.image_types[1],
+                        rect_pdf=rect(rng),
+                        rect_screen=rect(rng),
+                        sort_order=order,
+                    )
+                )
+        usage = rng.sample(self.usage_types, rng.randint(0, 2))
+        return index, crop, extras, usage
+
+    def image_jobs(self, rows):
+        width, height = self.image_size
+        prefix = f"cropped/seed-{self.seed}"
+        for index, _, extras, _ in rows:
+            yield (self.seed, f"{index}", f"{prefix}/{index:07d}.png", width, height)
+            for extra in extras:
+                key = f"{index}-{extra.sort_order}"
+                yield (self.seed, key, f"{prefix}/{key}.png", width, height)
+
+    def insert(self, rows, images):
+        images = iter(images)
+        for _, crop, extras, _ in rows:
+            for obj in (crop, *extras):
+                obj.image, metadata = next(images)
+                imagemeta.apply(obj, metadata)
+
+        with transaction.atomic():
+            CroppedImage.objects.bulk_create([crop for _, crop, _, _ in rows])
+            extra_objs = []
+            usage_links = []
+            for _, crop, extras, usage in rows:
+                for extra in extras:
+                    extra.parent = crop
+                    extra_objs.append(extra)
+                usage_links.extend(QuestionUsage(question=crop, usage_type=u) for u in usage)
+            CroppedImageExtra.objects.bulk_create(extra_objs)
+            QuestionUsage.objects.bulk_create(usage_links)
+
+        self.stdout.write(f"#{rows[-1][0] + 1}: {len(rows)} questions, {len(extra_objs)} extras")
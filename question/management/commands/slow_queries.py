@@ -0,0 +1,98 @@
+import json
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+SORT_KEYS = {
+    "total": lambda s: s["total_ms"],
+    "count": lambda s: s["count"],
+    "max": lambda s: s["max_ms"],
+    "mean": lambda s: s["total_ms"] / s["count"],
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Summarize the slow query log (QUESTION_SLOW_QUERY_LOG) by SQL fingerprint: "
+        "count, total/mean/max time, views, call sites and the latest plan."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--file", help="JSONL log to read (default: QUESTION_SLOW_QUERY_LOG).")
+        parser.add_argument("--top", type=int, default=20)
+        parser.add_argument("--sort", choices=sorted(SORT_KEYS), default="total")
+        parser.add_argument("--view", help="Only queries issued by this view (e.g. CroppedImageList).")
+        parser.add_argument("--json", action="store_true", help="Print the summary as JSON.")
+
+    def handle(self, *args, **options):
+        path = options["file"] or getattr(settings, "QUESTION_SLOW_QUERY_LOG", None)
+        if not path:
+            raise CommandError("No log file: pass --file or set QUESTION_SLOW_QUERY_LOG.")
+
+        summaries = {}
+        try:
+            with open(path, encoding="utf-8") as fh:
+                for line in fh:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if options["view"] and entry.get("view") != options["view"]:
+                        continue
+                    self.add(summaries, entry)
+        except FileNotFoundError:
+            raise CommandError(f"Log file not found: {path}")
+
+        ranked = sorted(summaries.values(), key=SORT_KEYS[options["sort"]], reverse=True)[: options["top"]]
+        for summary in ranked:
+            summary["mean_ms"] = round(summary["total_ms"] / summary["count"], 3)
+            summary["total_ms"] = round(summary["total_ms"], 3)
+            summary["views"] = dict(summary["views"].most_common())
+            summary["call_sites"] = dict(summary["call_sites"].most_common(5))
+
+        if options["json"]:
+            self.stdout.write(json.dumps(ranked, indent=2))
+            return
+        if not ranked:
+            self.stdout.write("No slow queries recorded.")
+            return
+        for rank, summary in enumerate(ranked, start=1):
+            self.stdout.write(
+                self.style.WARNING(
+                    f"#{rank} [{summary['fingerprint']}] {summary['count']}x  total {summary['total_ms']:.1f} ms  "
+                    f"mean {summary['mean_ms']:.1f} ms  max {summary['max_ms']:.1f} ms"
+                )
+            )
+            self.stdout.write(f"  sql:   {summary['sql'][:300]}")
+            self.stdout.write(f"  views: {', '.join(f'{v} ({n})' for v, n in summary['views'].items())}")
+            for site, count in summary["call_sites"].items():
+                self.stdout.write(f"  at:    {site} ({count})")
+            for step in summary["plan"] or ():
+                self.stdout.write(f"  plan:  {step}")
+
+    def add(self, summaries, entry):
+        summary = summaries.get(entry["fingerprint"])
+        if summary is None:
+            summary = summaries[entry["fingerprint"]] = {
+                "fingerprint": entry["fingerprint"],
+                "count": 0,
+                "total_ms": 0.0,
+                "max_ms": 0.0,
+                "sql": entry["sql"],
+                "params": entry.get("params"),
+                "plan": None,
+                "views": Counter(),
+                "call_sites": Counter(),
+            }
+        summary["count"] += 1
+        summary["total_ms"] += entry["duration_ms"]
+        if entry["duration_ms"] >= summary["max_ms"]:
+            # Keep the parameters of the slowest run: the best repro.
+            summary["max_ms"] = entry["duration_ms"]
+            summary["params"] = entry.get("params")
+        if entry.get("plan"):
+            summary["plan"] = entry["plan"]
+        summary["views"][entry.get("view") or "-"] += 1
+        if entry.get("call_site"):
+            summary["call_sites"][entry["call_site"]] += 1
@@ -0,0 +1,56 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+
+def copy_database(source, target, timeout=20):
+    """Copy SQLite file ``source`` into ``target`` with the online backup API.
+
+    The backup reads one consistent snapshot of the source (in WAL mode
+    without blocking its writers) and replaces the target's pages in a
+    single transaction, so replica readers see either the old or the new
+    copy, never a mix.
+    """
+    src = sqlite3.connect(source, timeout=timeout)
+    try:
+        dst = sqlite3.connect(target, timeout=timeout)
+        try:
+            src.backup(dst)
+        finally:
+            dst.close()
+    finally:
+        src.close()
+
+
+class Command(BaseCommand):
+    help = (
+        "Stand-in for replication between local SQLite files: copy the primary "
+        "database into every QUESTION_READ_REPLICAS alias, once or every --interval seconds."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--interval", type=float, default=0, help="Repeat every N seconds (default: once).")
+
+    def handle(self, *args, **options):
+        databases = settings.DATABASES
+        aliases = list(getattr(settings, "QUESTION_READ_REPLICAS", ()))
+        if not aliases:
+            raise CommandError("No replicas configured: set QUESTION_DB_REPLICAS.")
+        for alias in [DEFAULT_DB_ALIAS, *aliases]:
+            if "sqlite3" not in databases[alias]["ENGINE"]:
+                raise CommandError(f"{alias} is not an SQLite database.")
+        source = databases[DEFAULT_DB_ALIAS]["NAME"]
+
+        while True:
+            started = time.perf_counter()
+            for alias in aliases:
+                copy_database(source, databases[alias]["NAME"])
+            self.stdout.write(
+                f"Synced {len(aliases)} replica(s) from {source} in {(time.perf_counter() - started) * 1000:.0f} ms."
+            )
+            if options["interval"] <= 0:
+                return
+            time.sleep(options["interval"])
@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from question.bulk import JOB_CHUNK_SIZE, JobReclaimed, claim_next_job, run_job
+
+
+class Command(BaseCommand):
+    help = (
+        "Run queued bulk uploads (UploadCropBulk ?async=1). Polls the UploadJob table; "
+        "several workers can run side by side, and a job whose worker stopped is picked up again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Exit once no job is queued.")
+        parser.add_argument("--poll", type=float, default=1.0, help="Seconds between polls when idle.")
+        parser.add_argument("--chunk-size", type=int, default=JOB_CHUNK_SIZE, help="Items committed per transaction.")
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            job = claim_next_job()
+            if job is None:
+                if options["once"]:
+                    return
+                time.sleep(options["poll"])
+                continue
+
+            started = time.perf_counter()
+            try:
+                job = run_job(job, chunk_size=options["chunk_size"])
+            except JobReclaimed:
+                self.stderr.write(f"Job {job.pk}: timed out and taken over by another worker.")
+                continue
+            style = self.style.SUCCESS if job.status == job.SUCCEEDED else self.style.ERROR
+            self.stdout.write(
+                style(f"Job {job.pk}: {job.status}, {job.total} items in {time.perf_counter() - started:.1f}s")
+            )
@@ -0,0 +1,428 @@
+"""In-process metrics registry with Prometheus text exposition.
+
+Counters and histograms keep one shard per thread, so recording a value
+takes no lock; shards are only summed when the registry is collected.
+When a thread exits, its shard is folded into the metric's base values
+(the next time a thread registers a shard, or on collect), so a
+thread-per-request server does not pile up shards. Gauges are set rather
+than added, so they share one small lock.
+
+With several worker processes, set ``QUESTION_METRICS_DIR`` to a directory
+shared by them: each process writes a JSON snapshot there, named after its
+pid and start time, every ``FLUSH_INTERVAL`` seconds from a background
+thread (started by the first request) and at exit, and ``/metrics/`` sums
+every snapshot. Counter and histogram values of exited processes keep
+counting, as Prometheus expects of counters: the scrape folds their files
+into ``archive.json`` and deletes them. Gauges only come from live
+processes.
+"""
+import atexit
+import bisect
+import fcntl
+import json
+import math
+import os
+import threading
+import time
+
+from django.conf import settings
+
+FLUSH_INTERVAL = 1.0
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+ARCHIVE_NAME = "archive.json"
+LOCK_NAME = ".lock"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+SIZE_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+
+def _process_start(pid):
+    """Start time of ``pid`` in clock ticks since boot (Linux), or None where /proc has no such entry."""
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as fh:
+            stat = fh.read()
+    except OSError:
+        return None
+    # The fields after the parenthesised command name; starttime is field 22.
+    return int(stat[stat.rindex(b")") + 2:].split()[19])
+
+
+def _snapshot_name(pid, started):
+    return f"{pid}-{started}.json"
+
+
+def _parse_snapshot_name(filename):
+    """(pid, start) of a snapshot file name, or None for other files."""
+    stem, ext = os.path.splitext(filename)
+    pid, _, started = stem.partition("-")
+    if ext != ".json" or not (pid.isdigit() and started.isdigit()):
+        return None
+    return int(pid), int(started)
+
+
+def _merge_values(into, data):
+    for key, value in data["values"].items():
+        if key not in into["values"]:
+            into["values"][key] = value
+        elif isinstance(value, list):
+            into["values"][key] = [a + b for a, b in zip(into["values"][key], value)]
+        else:
+            into["values"][key] += value
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self._flusher_pid = None
+        self._started = None
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def reset(self):
+        for metric in self.metrics.values():
+            metric.reset()
+        self._flusher_pid = None
+        self._started = None
+
+    def collect(self):
+        """``{name: {"type", "help", "labelnames", "values": {label-json: value}}}`` for this process."""
+        return {
+            name: {
+                "type": metric.type,
+                "help": metric.help,
+                "labelnames": list(metric.labelnames),
+                "buckets": list(getattr(metric, "buckets", ())),
+                "values": {json.dumps(list(key)): value for key, value in metric.collect().items()},
+            }
+            for name, metric in self.metrics.items()
+        }
+
+    def _directory(self):
+        return getattr(settings, "QUESTION_METRICS_DIR", None)
+
+    def snapshot_name(self):
+        if self._started is None:
+            # Without /proc, the time of the first flush tells this process from
+            # an earlier one with the same pid just as well.
+            self._started = _process_start(os.getpid()) or int(time.time() * 1000)
+        return _snapshot_name(os.getpid(), self._started)
+
+    def flush(self):
+        """Write this process's snapshot to QUESTION_METRICS_DIR (no-op when unset)."""
+        directory = self._directory()
+        if not directory:
+            return
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, self.snapshot_name())
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as fh:
+            json.dump(self.collect(), fh, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    def start_flusher(self):
+        """Flush every FLUSH_INTERVAL seconds from a daemon thread; once per process, if QUESTION_METRICS_DIR is set."""
+        if self._flusher_pid == os.getpid() or not self._directory():
+            return
+        self._flusher_pid = os.getpid()
+        threading.Thread(target=self._flush_forever, name="question-metrics-flush", daemon=True).start()
+
+    def _flush_forever(self):
+        while True:
+            time.sleep(FLUSH_INTERVAL)
+            try:
+                self.flush()
+            except OSError:
+                pass
+
+    def sweep(self):
+        """Fold the snapshots of exited processes into ARCHIVE_NAME and delete them; returns the archive.
+
+        The archive records the files it has folded in, so a crash between
+        writing it and deleting them cannot count a process twice.
+        """
+        directory = self._directory()
+        with open(os.path.join(directory, LOCK_NAME), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            archive_path = os.path.join(directory, ARCHIVE_NAME)
+            try:
+                with open(archive_path, encoding="utf-8") as fh:
+                    archive = json.load(fh)
+            except (OSError, ValueError):
+                archive = {"folded": [], "metrics": {}}
+            names = set(os.listdir(directory))
+            folded = [name for name in archive["folded"] if name in names]
+            for name in sorted(names - set(folded)):
+                parsed = _parse_snapshot_name(name)
+                if parsed is None or _alive(*parsed):
+                    continue
+                try:
+                    with open(os.path.join(directory, name), encoding="utf-8") as fh:
+                        snapshot = json.load(fh)
+                except (OSError, ValueError):
+                    continue
+                for metric, data in snapshot.items():
+                    if data["type"] != "gauge":
+                        _merge_values(archive["metrics"].setdefault(metric, dict(data, values={})), data)
+                folded.append(name)
+            archive["folded"] = folded
+            tmp_path = f"{archive_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as fh:
+                json.dump(archive, fh, separators=(",", ":"))
+            os.replace(tmp_path, archive_path)
+            for name in folded:
+                try:
+                    os.remove(os.path.join(directory, name))
+                except FileNotFoundError:
+                    pass
+            return archive["metrics"]
+
+    def snapshots(self):
+        """This process's snapshot, those of the other live processes, and the archive of exited ones."""
+        yield self.collect()
+        directory = self._directory()
+        if not directory or not os.path.isdir(directory):
+            return
+        yield self.sweep()
+        own = self.snapshot_name()
+        for filename in os.listdir(directory):
+            if filename == own or _parse_snapshot_name(filename) is None:
+                continue
+            try:
+                with open(os.path.join(directory, filename), encoding="utf-8") as fh:
+                    yield json.load(fh)
+            except (OSError, ValueError):
+                continue
+
+    def exposition(self):
+        """Every process's metrics, summed, in Prometheus text format."""
+        merged = {}
+        for snapshot in self.snapshots():
+            for name, data in snapshot.items():
+                _merge_values(merged.setdefault(name, dict(data, values={})), data)
+
+        lines = []
+        for name, data in sorted(merged.items()):
+            lines.append(f"# HELP {name} {data['help']}")
+            lines.append(f"# TYPE {name} {data['type']}")
+            for key, value in sorted(data["values"].items()):
+                labels = dict(zip(data["labelnames"], json.loads(key)))
+                if data["type"] == "histogram":
+                    lines.extend(_histogram_lines(name, labels, data["buckets"], value))
+                else:
+                    lines.append(f"{name}{_labels(labels)} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _alive(pid, started):
+    """Whether the process that wrote ``<pid>-<started>.json`` is still running."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    # A reused pid belongs to a process that started later.
+    current = _process_start(pid)
+    return current is None or current == started
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _number(value):
+    if isinstance(value, float):
+        if math.isinf(value):
+            return "+Inf" if value > 0 else "-Inf"
+        return repr(value)
+    return str(value)
+
+
+def _histogram_lines(name, labels, buckets, value):
+    # value = per-bucket counts (last is +Inf), then sum.
+    counts, total = value[:-1], value[-1]
+    cumulative = 0
+    for bound, count in zip(list(buckets) + [math.inf], counts):
+        cumulative += count
+        yield f"{name}_bucket{_labels(dict(labels, le=_number(float(bound))))} {cumulative}"
+    yield f"{name}_sum{_labels(labels)} {_number(float(total))}"
+    yield f"{name}_count{_labels(labels)} {cumulative}"
+
+
+class _ShardedMetric:
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self.reset()
+        REGISTRY.register(self)
+
+    def reset(self):
+        self._local = threading.local()
+        self._shards = {}  # thread -> its shard
+        self._base = {}  # folded shards of exited threads
+
+    def _shard(self):
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._prune()
+                self._shards[threading.current_thread()] = shard
+        return shard
+
+    def _prune(self):
+        # An exited thread never writes its shard again, so it can be folded. Holds _lock.
+        for thread in [t for t in self._shards if not t.is_alive()]:
+            for key, value in self._shards.pop(thread).items():
+                self._base[key] = self._add(self._base[key], value) if key in self._base else self._copy(value)
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def collect(self):
+        with self._lock:
+            self._prune()
+            totals = {key: self._copy(value) for key, value in self._base.items()}
+            shards = list(self._shards.values())
+        for shard in shards:
+            for key, value in list(shard.items()):
+                totals[key] = self._add(totals[key], value) if key in totals else self._copy(value)
+        return totals
+
+
+class Counter(_ShardedMetric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        shard = self._shard()
+        key = self._key(labels)
+        shard[key] = shard.get(key, 0) + amount
+
+    def _add(self, a, b):
+        return a + b
+
+    def _copy(self, value):
+        return value
+
+
+class Histogram(_ShardedMetric):
+    type = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        super().__init__(name, help, labelnames)
+
+    def observe(self, value, **labels):
+        shard = self._shard()
+        key = self._key(labels)
+        slots = shard.get(key)
+        if slots is None:
+            # One count per bucket, one for +Inf, then the running sum.
+            slots = shard[key] = [0] * (len(self.buckets) + 2)
+        slots[bisect.bisect_left(self.buckets, value)] += 1
+        slots[-1] += value
+
+    def _add(self, a, b):
+        return [x + y for x, y in zip(a, b)]
+
+    def _copy(self, value):
+        return list(value)
+
+
+class Gauge(_ShardedMetric):
+    type = "gauge"
+
+    def reset(self):
+        self._values = {}
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def collect(self):
+        with self._lock:
+            return dict(self._values)
+
+
+REGISTRY = Registry()
+
+REQUESTS = Counter("question_http_requests_total", "HTTP requests.", ("view", "method", "status"))
+REQUEST_LATENCY = Histogram(
+    "question_http_request_duration_seconds", "Request wall time until the response is returned.", ("view", "method")
+)
+DB_QUERIES = Histogram("question_db_queries", "SQL queries per request.", ("view",), buckets=QUERY_BUCKETS)
+DB_SECONDS = Counter("question_db_seconds_total", "Time spent executing SQL.", ("view",))
+UPLOAD_BYTES = Counter("question_upload_bytes_total", "Multipart request bytes received.", ("view",))
+UPLOAD_FILES = Counter("question_upload_files_total", "Files received in multipart requests.", ("view",))
+STORAGE_WRITES = Counter("question_storage_writes_total", "Files written to default storage.")
+STORAGE_WRITE_BYTES = Counter("question_storage_write_bytes_total", "Bytes written to default storage.")
+STORAGE_DELETES = Counter("question_storage_deletes_total", "Files deleted from default storage.")
+CACHE_REQUESTS = Counter("question_cache_requests_total", "Cache lookups by result (hit/miss).", ("cache", "result"))
+BULK_ITEMS = Histogram("question_bulk_items", "Items per bulk request.", ("operation",), buckets=SIZE_BUCKETS)
+DB_WRITE_WAIT = Histogram("question_db_write_wait_seconds", "Time writers spent queued for the SQLite write lock.")
+DB_WRITE_WAITING = Gauge("question_db_write_waiting", "Writers currently queued for the SQLite write lock.")
+GROUP_COMMIT_SIZE = Histogram(
+    "question_group_commit_batch_size", "UploadCrop requests committed per transaction.", buckets=SIZE_BUCKETS
+)
+ADMISSION_IN_FLIGHT = Gauge("question_admission_in_flight", "Requests holding an admission slot.", ("endpoint",))
+ADMISSION_QUEUE_DEPTH = Gauge(
+    "question_admission_queue_depth", "Requests waiting for an admission slot.", ("endpoint",)
+)
+ADMISSION_WAIT = Histogram(
+    "question_admission_wait_seconds", "Time admitted requests waited for a slot.", ("endpoint",)
+)
+ADMISSION_REJECTED = Counter(
+    "question_admission_rejected_total", "Requests answered 429 by admission control.", ("endpoint", "reason")
+)
+
+
+def record_cache(cache, hit):
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def view_label(request):
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "unmatched"
+    func = getattr(match.func, "view_class", match.func)
+    return getattr(func, "__name__", "unknown")
+
+
+def observe_request(request, response, request_metrics, elapsed):
+    """Record one finished request (called by PerformanceMiddleware)."""
+    view = view_label(request)
+    REQUESTS.inc(view=view, method=request.method, status=response.status_code)
+    REQUEST_LATENCY.observe(elapsed, view=view, method=request.method)
+    DB_QUERIES.observe(request_metrics.counts["queries"], view=view)
+    DB_SECONDS.inc(request_metrics.timings["db"], view=view)
+    if request_metrics.counts["upload_bytes"]:
+        UPLOAD_BYTES.inc(request_metrics.counts["upload_bytes"], view=view)
+        # DRF copies the parsed files back onto the Django request.
+        files = getattr(request, "_files", None)
+        if files:
+            UPLOAD_FILES.inc(sum(len(values) for _, values in files.lists()), view=view)
+    REGISTRY.start_flusher()
+
+
+# A forked worker must not report its parent's numbers as its own.
+os.register_at_fork(after_in_child=REGISTRY.reset)
+atexit.register(REGISTRY.flush)
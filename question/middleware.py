@@ -0,0 +1,259 @@
+import json
+import logging
+import math
+import re
+import time
+import uuid
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from . import instrumentation, metrics as question_metrics, routers
+from .profiling import aprofile_call, profile_call
+from .querylog import SlowQueryLog
+
+logger = logging.getLogger("question.perf")
+
+LAST_WRITE_COOKIE = "question_last_write"
+LAST_WRITE_HEADER = "X-Last-Write"
+
+
+def install_query_hooks(sender, connection, **kwargs):
+    """connection_created receiver: put the query timer and slow query log on ``connection``.
+
+    They are installed once per connection, not per request, because under
+    ASGI the queries of a request run on the connections of a
+    ``sync_to_async`` thread, not those the middleware sees. Both act only
+    while a request is active (the context variable does cross threads).
+    They go first in the list, so ``execute_wrapper()`` blocks, which pop
+    the last entry, are unaffected.
+    """
+    if not any(isinstance(hook, instrumentation.QueryTimer) for hook in connection.execute_wrappers):
+        connection.execute_wrappers[:0] = [instrumentation.QueryTimer(), SlowQueryLog(connection)]
+
+
+class HybridMiddleware:
+    """Base for middleware that runs natively under both WSGI and ASGI.
+
+    Under ASGI with async views, one sync-only middleware would put every
+    request back on a thread; subclasses implement ``__call__`` and
+    ``__acall__`` with the same steps instead.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+
+# (Server-Timing name, RequestMetrics.timings key)
+SERVER_TIMING_SPANS = (
+    ("db", "db"),
+    ("serializer", "serializer"),
+    ("storage", "storage_write"),
+    ("dbwait", "db_write_wait"),
+)
+
+
+class PerformanceMiddleware(HybridMiddleware):
+    """Record wall, DB, serializer and storage-write time per request.
+
+    The numbers go out as a ``Server-Timing`` header (visible in the
+    browser's network panel) and, when the "question.perf" logger is at
+    INFO (QUESTION_PERF_LOG_LEVEL), as one JSON log line on it. For streaming responses they cover the time
+    until the response object is returned, not the streamed body.
+    """
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with self.measure(request) as metrics:
+            response = self.get_response(request)
+        return self.finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        with self.measure(request) as metrics:
+            response = await self.get_response(request)
+        return self.finish(request, response, metrics)
+
+    @contextmanager
+    def measure(self, request):
+        metrics = instrumentation.RequestMetrics()
+        metrics.path = request.path
+        if request.META.get("CONTENT_TYPE", "").startswith("multipart/"):
+            try:
+                metrics.counts["upload_bytes"] = int(request.META.get("CONTENT_LENGTH") or 0)
+            except ValueError:
+                pass
+
+        token = instrumentation.activate(metrics)
+        try:
+            yield metrics
+        finally:
+            instrumentation.deactivate(token)
+
+    def finish(self, request, response, metrics):
+        total = metrics.elapsed
+        question_metrics.observe_request(request, response, metrics, total)
+        self.add_server_timing(request, response, metrics, total)
+        self.log(request, response, metrics, total)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = instrumentation.current()
+        if metrics is not None:
+            metrics.view = question_metrics.view_label(request)
+
+    def add_server_timing(self, request, response, metrics, total):
+        entries = [f"total;dur={total * 1000:.1f}"]
+        for name, key in SERVER_TIMING_SPANS:
+            if key in metrics.timings or key == "db":
+                entry = f"{name};dur={metrics.timings[key] * 1000:.1f}"
+                if key == "db":
+                    entry += f';desc="{metrics.counts["queries"]} queries"'
+                entries.append(entry)
+        if metrics.counts.get("upload_bytes"):
+            entries.append(f'upload;desc="{metrics.counts["upload_bytes"]} bytes"')
+
+        existing = response.get("Server-Timing")
+        response["Server-Timing"] = ", ".join(([existing] if existing else []) + entries)
+        # Cross-origin pages only see Server-Timing when explicitly allowed.
+        origin = request.headers.get("Origin")
+        if origin and origin in getattr(settings, "CORS_ALLOWED_ORIGINS", ()):
+            response["Timing-Allow-Origin"] = origin
+
+    def log(self, request, response, metrics, total):
+        if not logger.isEnabledFor(logging.INFO):
+            return
+        match = getattr(request, "resolver_match", None)
+        record = {
+            "method": request.method,
+            "path": request.path,
+            "route": match.route if match else None,
+            "status": response.status_code,
+            "total_ms": round(total * 1000, 2),
+            "db_ms": round(metrics.timings["db"] * 1000, 2),
+            "queries": metrics.counts["queries"],
+            "serializer_ms": round(metrics.timings["serializer"] * 1000, 2),
+            "storage_write_ms": round(metrics.timings["storage_write"] * 1000, 2),
+            "upload_bytes": metrics.counts["upload_bytes"],
+        }
+        logger.info(json.dumps(record, separators=(",", ":")), extra={"perf": record})
+
+
+class ProfilingMiddleware(HybridMiddleware):
+    """Profile a single request on demand.
+
+    Opt-in twice over: QUESTION_PROFILE_DIR must be set, and the request
+    must come from a logged-in staff user and carry ``X-Profile: 1`` (or
+    ``?profile=1``). Anything else passes straight through. The stats and
+    collapsed stacks land in QUESTION_PROFILE_DIR under the name returned
+    in the ``X-Profile-Id`` response header.
+    """
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        user = getattr(request, "user", None)
+        if not (self.requested(request) and user is not None and user.is_staff):
+            return self.get_response(request)
+
+        name = self.profile_name(request)
+        response = profile_call(
+            lambda: self.get_response(request),
+            settings.QUESTION_PROFILE_DIR,
+            name,
+            settings.QUESTION_PROFILE_SAMPLE_INTERVAL,
+        )
+        response["X-Profile-Id"] = name
+        return response
+
+    async def __acall__(self, request):
+        if not self.requested(request):
+            return await self.get_response(request)
+        # request.user would query the session synchronously.
+        user = await request.auser() if hasattr(request, "auser") else None
+        if not (user is not None and user.is_staff):
+            return await self.get_response(request)
+
+        name = self.profile_name(request)
+        response = await aprofile_call(
+            lambda: self.get_response(request),
+            settings.QUESTION_PROFILE_DIR,
+            name,
+            settings.QUESTION_PROFILE_SAMPLE_INTERVAL,
+        )
+        response["X-Profile-Id"] = name
+        return response
+
+    def requested(self, request):
+        wanted = request.headers.get("X-Profile") == "1" or request.GET.get("profile") == "1"
+        return bool(wanted and getattr(settings, "QUESTION_PROFILE_DIR", None))
+
+    def profile_name(self, request):
+        slug = re.sub(r"[^A-Za-z0-9]+", "-", request.path).strip("-") or "root"
+        return f"{time.strftime('%Y%m%dT%H%M%S')}-{request.method}-{slug}-{uuid.uuid4().hex[:8]}"
+
+
+class ReadReplicaMiddleware(HybridMiddleware):
+    """Serve GET/HEAD requests of ``read_replica`` views from the read replicas.
+
+    Read-your-writes: a successful write request answers with the time of
+    the write, as the ``question_last_write`` cookie and the
+    ``X-Last-Write`` header. Requests that send either back (header for
+    non-browser clients) within QUESTION_REPLICA_STICKY_SECONDS read from
+    the primary, so a client never sees a replica older than its own write.
+    """
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = routers.begin()
+        try:
+            response = self.get_response(request)
+        finally:
+            routers.end(token)
+        return self.mark_write(request, response)
+
+    async def __acall__(self, request):
+        token = routers.begin()
+        try:
+            response = await self.get_response(request)
+        finally:
+            routers.end(token)
+        return self.mark_write(request, response)
+
+    def mark_write(self, request, response):
+        if (
+            routers.replica_aliases()
+            and request.method not in ("GET", "HEAD", "OPTIONS")
+            and response.status_code < 400
+        ):
+            stamp = f"{time.time():.3f}"
+            sticky = settings.QUESTION_REPLICA_STICKY_SECONDS
+            response.set_cookie(LAST_WRITE_COOKIE, stamp, max_age=math.ceil(sticky), httponly=True, samesite="Lax")
+            response[LAST_WRITE_HEADER] = stamp
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, "view_class", None)
+        if (
+            routers.replica_aliases()
+            and request.method in ("GET", "HEAD")
+            and getattr(view_class, "read_replica", False)
+            and not self.recently_wrote(request)
+        ):
+            routers.use_replicas()
+
+    def recently_wrote(self, request):
+        for stamp in (request.headers.get(LAST_WRITE_HEADER), request.COOKIES.get(LAST_WRITE_COOKIE)):
+            try:
+                if time.time() - float(stamp) < settings.QUESTION_REPLICA_STICKY_SECONDS:
+                    return True
+            except (TypeError, ValueError):
+                continue
+        return False
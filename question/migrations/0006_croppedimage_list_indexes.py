@@ -0,0 +1,45 @@
+# Generated by Django 5.2.9 on 2026-10-19 02:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('question', '0005_croppedimageextra_sort_order'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='croppedimageextra',
+            options={'ordering': ('sort_order', 'id')},
+        ),
+        migrations.AddIndex(
+            model_name='croppedimage',
+            index=models.Index(fields=['-created_at'], name='crop_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='croppedimage',
+            index=models.Index(fields=['chapter', '-created_at'], name='crop_chapter_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='croppedimage',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-created_at'], name='crop_active_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='croppedimage',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['chapter', '-created_at'], name='crop_chapter_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='croppedimage',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['chapter', 'difficulty', '-created_at'], name='crop_chapter_diff_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='croppedimage',
+            index=models.Index(condition=models.Q(('verified', False)), fields=['-created_at'], name='crop_unverified_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='croppedimage',
+            index=models.Index(condition=models.Q(('verified', False)), fields=['chapter', '-created_at'], name='crop_chapter_unverified_idx'),
+        ),
+    ]
@@ -0,0 +1,139 @@
+# Generated by Django 5.2.9 on 2026-10-19 02:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('question', '0006_croppedimage_list_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='chapter',
+            name='class_name',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='chapters', to='question.classname'),
+        ),
+        migrations.AlterField(
+            model_name='chapter',
+            name='subject',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='chapters', to='question.subject'),
+        ),
+        migrations.AlterField(
+            model_name='concept',
+            name='chapter',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='concepts', to='question.chapter'),
+        ),
+        migrations.AlterField(
+            model_name='croppedimage',
+            name='chapter',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='cropped_images', to='question.chapter'),
+        ),
+        migrations.AlterField(
+            model_name='croppedimage',
+            name='class_name',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='cropped_images', to='question.classname'),
+        ),
+        migrations.AlterField(
+            model_name='croppedimage',
+            name='concept',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='cropped_images', to='question.concept'),
+        ),
+        migrations.AlterField(
+            model_name='croppedimage',
+            name='image_type',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='cropped_images', to='question.imagetype'),
+        ),
+        migrations.AlterField(
+            model_name='croppedimage',
+            name='question_type',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='cropped_images', to='question.questiontype'),
+        ),
+        migrations.AlterField(
+            model_name='croppedimage',
+            name='source',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='cropped_images', to='question.sources'),
+        ),
+        migrations.AlterField(
+            model_name='croppedimage',
+            name='subject',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='cropped_images', to='question.subject'),
+        ),
+        migrations.AlterField(
+            model_name='croppedimage',
+            name='topic',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='cropped_images', to='question.topic'),
+        ),
+        migrations.AlterField(
+            model_name='croppedimageextra',
+            name='parent',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='extra_images', to='question.croppedimage'),
+        ),
+        migrations.AlterField(
+            model_name='topic',
+            name='concept',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='topics', to='question.concept'),
+        ),
+        migrations.AddIndex(
+            model_name='chapter',
+            index=models.Index(fields=['class_name', 'name'], name='chapter_class_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chapter',
+            index=models.Index(fields=['subject', 'name'], name='chapter_subject_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='concept',
+            index=models.Index(fields=['chapter', 'name'], name='concept_chapter_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='croppedimage',
+            index=models.Index(fields=['class_name', '-created_at'], name='crop_class_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='croppedimage',
+            index=models.Index(fields=['subject', '-created_at'], name='crop_subject_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='croppedimage',
+            index=models.Index(fields=['concept', '-created_at'], name='crop_concept_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='croppedimage',
+            index=models.Index(fields=['topic', '-created_at'], name='crop_topic_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='croppedimage',
+            index=models.Index(fields=['image_type', '-created_at'], name='crop_image_type_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='croppedimage',
+            index=models.Index(fields=['question_type', '-created_at'], name='crop_qtype_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='croppedimage',
+            index=models.Index(fields=['source', '-created_at'], name='crop_source_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='croppedimage',
+            index=models.Index(fields=['difficulty', '-created_at'], name='crop_difficulty_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='croppedimage',
+            index=models.Index(fields=['marks', '-created_at'], name='crop_marks_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='croppedimage',
+            index=models.Index(fields=['priority', '-created_at'], name='crop_priority_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='croppedimageextra',
+            index=models.Index(fields=['parent', 'sort_order'], name='extra_parent_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='topic',
+            index=models.Index(fields=['concept', 'name'], name='topic_concept_name_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.9 on 2026-10-19 03:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('question', '0008_uploadjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadJobEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveIntegerField(blank=True, null=True)),
+                ('stage', models.CharField(max_length=16)),
+                ('detail', models.JSONField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='question.uploadjob')),
+            ],
+        ),
+    ]
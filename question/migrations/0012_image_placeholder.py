@@ -0,0 +1,23 @@
+# Generated by Django 5.2.9 on 2026-10-19 03:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('question', '0011_image_metadata'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='croppedimage',
+            name='placeholder',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='croppedimageextra',
+            name='placeholder',
+            field=models.TextField(blank=True, default=''),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.9 on 2026-10-19 04:32
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('question', '0013_uploadjob_heartbeat'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='croppedimage',
+            name='crop_difficulty_created_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='croppedimage',
+            name='crop_marks_created_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='croppedimage',
+            name='crop_priority_created_idx',
+        ),
+    ]
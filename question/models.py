@@ -1,7 +1,9 @@
 from django.db import models
-from django.db.models.signals import post_delete
+from django.db.models.signals import post_delete, pre_save
 from django.dispatch import receiver
 
+from . import imagemeta
+
 class ClassName(models.Model):
     name = models.CharField(max_length=100, unique=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -21,8 +23,9 @@ class Subject(models.Model):
 
 class Chapter(models.Model):
     name = models.CharField(max_length=255)
-    class_name = models.ForeignKey(ClassName, on_delete=models.CASCADE, related_name="chapters")
-    subject = models.ForeignKey(Subject, on_delete=models.CASCADE, related_name="chapters")
+    # FK lookups are served by the (fk, name) indexes in Meta.
+    class_name = models.ForeignKey(ClassName, on_delete=models.CASCADE, related_name="chapters", db_index=False)
+    subject = models.ForeignKey(Subject, on_delete=models.CASCADE, related_name="chapters", db_index=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -36,11 +39,16 @@ class Chapter(models.Model):
                 name="uniq_chapter_per_class_subject",
             )
         ]
+        # ChapterList filters by class and/or subject and sorts by name.
+        indexes = [
+            models.Index(fields=["class_name", "name"], name="chapter_class_name_idx"),
+            models.Index(fields=["subject", "name"], name="chapter_subject_name_idx"),
+        ]
 
 
 class Concept(models.Model):
     name = models.CharField(max_length=255)
-    chapter = models.ForeignKey(Chapter, on_delete=models.CASCADE, related_name="concepts")
+    chapter = models.ForeignKey(Chapter, on_delete=models.CASCADE, related_name="concepts", db_index=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -54,11 +62,14 @@ class Concept(models.Model):
                 name="uniq_concept_per_chapter",
             )
         ]
+        indexes = [
+            models.Index(fields=["chapter", "name"], name="concept_chapter_name_idx"),
+        ]
 
 
 class Topic(models.Model):
     name = models.CharField(max_length=255)
-    concept = models.ForeignKey(Concept, on_delete=models.CASCADE, related_name="topics")
+    concept = models.ForeignKey(Concept, on_delete=models.CASCADE, related_name="topics", db_index=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -72,6 +83,9 @@ class Topic(models.Model):
                 name="uniq_topic_per_concept",
             )
         ]
+        indexes = [
+            models.Index(fields=["concept", "name"], name="topic_concept_name_idx"),
+        ]
 
 class ImageType(models.Model):
     name = models.CharField(max_length=100, unique=True)
@@ -114,25 +128,40 @@ class CroppedImage(models.Model):
     ]
 
     image = models.ImageField(upload_to="cropped/")
-
+    # Read from the file when it is stored (see question.imagemeta); null or
+    # empty on older rows until `manage.py backfill_image_metadata` has run.
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    byte_size = models.PositiveIntegerField(null=True, blank=True)
+    image_format = models.CharField(max_length=16, blank=True, default="")
+    sha256 = models.CharField(max_length=64, blank=True, default="")
+    # data: URI of a tiny thumbnail to paint before the image loads.
+    placeholder = models.TextField(blank=True, default="")
+
+    # Every FK below is indexed as (fk, -created_at) in Meta.indexes, which
+    # also serves plain FK lookups, so the default single-column index is off.
     image_type = models.ForeignKey(
         ImageType,
         on_delete=models.PROTECT,
         related_name="cropped_images",
+        db_index=False,
     )
 
     rect_pdf = models.JSONField(default=dict)
     rect_screen = models.JSONField(default=dict)
 
-    class_name = models.ForeignKey(ClassName, on_delete=models.CASCADE, related_name="cropped_images")
-    subject = models.ForeignKey(Subject, on_delete=models.CASCADE, related_name="cropped_images")
-    chapter = models.ForeignKey(Chapter, on_delete=models.CASCADE, related_name="cropped_images")
+    class_name = models.ForeignKey(
+        ClassName, on_delete=models.CASCADE, related_name="cropped_images", db_index=False
+    )
+    subject = models.ForeignKey(Subject, on_delete=models.CASCADE, related_name="cropped_images", db_index=False)
+    chapter = models.ForeignKey(Chapter, on_delete=models.CASCADE, related_name="cropped_images", db_index=False)
     concept = models.ForeignKey(
         Concept,
         on_delete=models.SET_NULL,
         related_name="cropped_images",
         null=True,
         blank=True,
+        db_index=False,
     )
     topic = models.ForeignKey(
         Topic,
@@ -140,6 +169,7 @@ class CroppedImage(models.Model):
         related_name="cropped_images",
         null=True,
         blank=True,
+        db_index=False,
     )
 
     question_type = models.ForeignKey(
@@ -148,6 +178,7 @@ class CroppedImage(models.Model):
         related_name="cropped_images",
         null=True,
         blank=True,
+        db_index=False,
     )
     difficulty = models.CharField(max_length=20, choices=DIFFICULTY_CHOICES, default="easy")
     marks = models.IntegerField(default=1)
@@ -165,6 +196,7 @@ class CroppedImage(models.Model):
         related_name="cropped_images",
         null=True,
         blank=True,
+        db_index=False,
     )
     is_active = models.BooleanField(default=True)
 
@@ -178,6 +210,65 @@ class CroppedImage(models.Model):
             f"{self.class_name} / {self.subject} / {self.chapter} / {concept}"
         )
 
+    class Meta:
+        # Matched to CroppedImageList, which always sorts by -created_at, so
+        # a filtered page stops after LIMIT rows instead of sorting every
+        # match. Each filter also needs its own index for the paginator's
+        # COUNT(*): without one the count scans the whole table, which the
+        # plan-regression suite (QueryPlanRegressionTests) rejects. Any
+        # index dropped from here must first go from that suite. The
+        # enum-like scalars (difficulty, marks, priority) are the exception:
+        # each value matches a large share of the bank, so an index would
+        # barely narrow their COUNT(*), and the suite lets it scan.
+        # Boolean filters compile to bare "is_active" / NOT "verified" terms,
+        # which SQLite only matches against partial-index conditions, never
+        # against index columns, so those dimensions are partial indexes.
+        indexes = [
+            # Unfiltered list.
+            models.Index(fields=["-created_at"], name="crop_created_idx"),
+            # One per FK filter; they double as the FK indexes for cascades
+            # and PROTECT checks when taxonomy or lookup rows are deleted.
+            models.Index(fields=["chapter", "-created_at"], name="crop_chapter_created_idx"),
+            models.Index(fields=["class_name", "-created_at"], name="crop_class_created_idx"),
+            models.Index(fields=["subject", "-created_at"], name="crop_subject_created_idx"),
+            models.Index(fields=["concept", "-created_at"], name="crop_concept_created_idx"),
+            models.Index(fields=["topic", "-created_at"], name="crop_topic_created_idx"),
+            models.Index(fields=["image_type", "-created_at"], name="crop_image_type_created_idx"),
+            models.Index(fields=["question_type", "-created_at"], name="crop_qtype_created_idx"),
+            models.Index(fields=["source", "-created_at"], name="crop_source_created_idx"),
+            # is_active=1, the default view of the question bank.
+            models.Index(
+                fields=["-created_at"],
+                condition=models.Q(is_active=True),
+                name="crop_active_created_idx",
+            ),
+            # Active crops of one chapter.
+            models.Index(
+                fields=["chapter", "-created_at"],
+                condition=models.Q(is_active=True),
+                name="crop_chapter_active_idx",
+            ),
+            # Same, narrowed by difficulty.
+            models.Index(
+                fields=["chapter", "difficulty", "-created_at"],
+                condition=models.Q(is_active=True),
+                name="crop_chapter_diff_active_idx",
+            ),
+            # Review queues: unverified crops, globally or per chapter.
+            models.Index(
+                fields=["-created_at"],
+                condition=models.Q(verified=False),
+                name="crop_unverified_idx",
+            ),
+            models.Index(
+                fields=["chapter", "-created_at"],
+                condition=models.Q(verified=False),
+                name="crop_chapter_unverified_idx",
+            ),
+            # Duplicate detection by content.
+            models.Index(fields=["sha256"], name="crop_sha256_idx"),
+        ]
+
 
 class CroppedImageExtra(models.Model):
     """Additional images for a single logical question.
@@ -190,9 +281,19 @@ class CroppedImageExtra(models.Model):
         CroppedImage,
         on_delete=models.CASCADE,
         related_name="extra_images",
+        db_index=False,
     )
 
     image = models.ImageField(upload_to="cropped/")
+    # Read from the file when it is stored (see question.imagemeta); null or
+    # empty on older rows until `manage.py backfill_image_metadata` has run.
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    byte_size = models.PositiveIntegerField(null=True, blank=True)
+    image_format = models.CharField(max_length=16, blank=True, default="")
+    sha256 = models.CharField(max_length=64, blank=True, default="")
+    # data: URI of a tiny thumbnail to paint before the image loads.
+    placeholder = models.TextField(blank=True, default="")
 
     image_type = models.ForeignKey(
         ImageType,
@@ -217,6 +318,11 @@ class CroppedImageExtra(models.Model):
 
     class Meta:
         ordering = ("sort_order", "id")
+        # Serves parent lookups and the default ordering (rowid breaks ties).
+        indexes = [
+            models.Index(fields=["parent", "sort_order"], name="extra_parent_order_idx"),
+            models.Index(fields=["sha256"], name="extra_sha256_idx"),
+        ]
 
 
 class QuestionUsage(models.Model):
@@ -230,6 +336,102 @@ class QuestionUsage(models.Model):
         return f"{self.question_id} → {self.usage_type}"
 
 
+class UploadJob(models.Model):
+    """A bulk upload staged by UploadCropBulk (?async=1) and run by ``manage.py upload_worker``."""
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (QUEUED, "Queued"),
+        (RUNNING, "Running"),
+        (SUCCEEDED, "Succeeded"),
+        (FAILED, "Failed"),
+    ]
+
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=QUEUED)
+    items = models.JSONField(default=list)
+    # "image_<idx>" -> staged storage name; the files are deleted once the job ran.
+    files = models.JSONField(default=dict)
+    total = models.PositiveIntegerField(default=0)
+    processed = models.PositiveIntegerField(default=0)
+    # Item index (as a string) -> error detail, or "job" for a failure of the whole job.
+    errors = models.JSONField(default=dict)
+    # CropSerializer data of the created crops, once succeeded.
+    result = models.JSONField(null=True, blank=True)
+    # Crops of the chunks committed so far, deleted if the job is rerun or fails.
+    crop_ids = models.JSONField(default=list)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Set when a worker claims the job; the worker checks it is unchanged on
+    # every commit, so a job reclaimed from it is never written twice.
+    started_at = models.DateTimeField(null=True, blank=True)
+    # Bumped with every chunk; a running job quiet for QUESTION_UPLOAD_JOB_TIMEOUT is requeued.
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        # The worker polls for the oldest queued (or stale running) job.
+        indexes = [
+            models.Index(fields=["status", "created_at"], name="uploadjob_status_created_idx"),
+        ]
+
+    def __str__(self):
+        return f"UploadJob#{self.pk} {self.status} {self.processed}/{self.total}"
+
+
+class UploadJobEvent(models.Model):
+    """One progress step of an UploadJob, streamed by /api/jobs/<id>/events/.
+
+    Item events carry the item ``index`` and a stage (validated,
+    thumbnailed, stored, committed, error); job events have no index and
+    carry the job status.
+    """
+
+    job = models.ForeignKey(UploadJob, on_delete=models.CASCADE, related_name="events")
+    index = models.PositiveIntegerField(null=True, blank=True)
+    stage = models.CharField(max_length=16)
+    detail = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"UploadJob#{self.job_id} item {self.index} {self.stage}"
+
+
+class IdempotencyKey(models.Model):
+    """A response stored for replay to retries with the same Idempotency-Key (see question.idempotency)."""
+
+    scope = models.CharField(max_length=64)  # view name
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)
+    # Null while the first request is still running.
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response = models.JSONField(null=True, blank=True)
+    headers = models.JSONField(default=dict)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["scope", "key"], name="uniq_idempotency_key_per_scope"),
+        ]
+        # Expired keys are swept by expiry.
+        indexes = [
+            models.Index(fields=["expires_at"], name="idempotency_expires_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.scope} {self.key} → {self.status_code}"
+
+
+@receiver(pre_save, sender=CroppedImage)
+@receiver(pre_save, sender=CroppedImageExtra)
+def fill_image_metadata(sender, instance, **kwargs):
+    """Record the metadata of a newly assigned image before the file is stored."""
+    image = instance.image
+    if image and not image._committed:
+        imagemeta.apply(instance, imagemeta.from_file(image.file))
+
+
 @receiver(post_delete, sender=CroppedImage)
 def delete_cropped_image_file(sender, instance, **kwargs):
     """Delete the underlying file when the CroppedImage row is deleted."""
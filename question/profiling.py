@@ -0,0 +1,195 @@
+"""Single-request profiling used by ProfilingMiddleware.
+
+A profiled request gets a ``ProfileSession``, kept in a context variable
+so it follows the request across threads. Every thread that runs the
+request's code is profiled on its own: cProfile, plus a background
+thread sampling that thread's stack. When the request is done the
+session writes ``<name>.prof`` (all threads' stats merged; open with
+``python -m pstats`` or snakeviz) and ``<name>.collapsed`` (one
+"frame;frame;... count" line per stack, the input format of
+flamegraph.pl and speedscope).
+
+Which threads that is depends on the server. Under WSGI it is the request
+thread, plus the event loop thread that ``async_to_sync`` starts for an
+async view (AsyncAPIView.dispatch joins it). Under ASGI it is the event
+loop thread, and the request's thread-sensitive sync thread, where Django
+runs sync views and every ``sync_to_async`` call of the request, database
+queries included. The event loop also runs other requests meanwhile, and
+those show up in the profile too.
+
+cProfile itself is scarcer than threads. Up to Python 3.11 it hooks one
+thread (``sys.setprofile``) and each thread can carry one profiler. From
+3.12 it is built on ``sys.monitoring``: one profiler per process, which
+sees every thread, and enabling a second raises ValueError. So a thread
+(or, from 3.12, a process) whose profiler is taken, by another thread of
+the request or a concurrent profiled request, is only sampled.
+"""
+import contextvars
+import cProfile
+import os
+import pstats
+import sys
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+from asgiref.sync import sync_to_async
+
+_session = contextvars.ContextVar("question_profile_session", default=None)
+
+_PROFILER_PER_THREAD = sys.version_info < (3, 12)
+_profilers_busy = set()
+_profilers_lock = threading.Lock()
+
+
+def _profiler_key():
+    return threading.get_ident() if _PROFILER_PER_THREAD else "process"
+
+
+def _claim_profiler():
+    """Reserve cProfile for the calling thread (up to 3.11) or the process; False if it is taken."""
+    key = _profiler_key()
+    with _profilers_lock:
+        if key in _profilers_busy:
+            return False
+        _profilers_busy.add(key)
+        return True
+
+
+def _release_profiler():
+    with _profilers_lock:
+        _profilers_busy.discard(_profiler_key())
+
+
+def _frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def write_collapsed(stacks, path):
+    with open(path, "w", encoding="utf-8") as fh:
+        for stack, count in stacks.most_common():
+            fh.write(f"{stack} {count}\n")
+
+
+class StackSampler:
+    """Sample one thread's Python stack every ``interval`` seconds."""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="question-stack-sampler", daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            labels = []
+            while frame is not None:
+                labels.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            if labels:
+                self.stacks[";".join(reversed(labels))] += 1
+
+    def write_collapsed(self, path):
+        write_collapsed(self.stacks, path)
+
+
+class ProfileSession:
+    """The samplers of one request, one per thread that runs it, and the profilers it could get."""
+
+    def __init__(self, directory, name, interval):
+        self.directory = directory
+        self.name = name
+        self.interval = interval
+        self._threads = {}  # thread id -> (cProfile.Profile or None, StackSampler)
+        self._lock = threading.Lock()
+
+    def start_thread(self):
+        """Start profiling the calling thread; False if it already is."""
+        ident = threading.get_ident()
+        with self._lock:
+            if ident in self._threads:
+                return False
+            profiler = cProfile.Profile() if _claim_profiler() else None
+            sampler = StackSampler(ident, self.interval)
+            self._threads[ident] = (profiler, sampler)
+        sampler.__enter__()
+        if profiler is not None:
+            try:
+                profiler.enable()
+            except ValueError:  # another tool, such as a debugger or coverage, holds sys.monitoring
+                _release_profiler()
+                self._threads[ident] = (None, sampler)
+        return True
+
+    def stop_thread(self):
+        profiler, sampler = self._threads[threading.get_ident()]
+        if profiler is not None:
+            profiler.disable()
+            _release_profiler()
+        sampler.__exit__(None, None, None)
+
+    def write(self):
+        os.makedirs(self.directory, exist_ok=True)
+        profiles = []
+        stacks = Counter()
+        for profiler, sampler in self._threads.values():
+            if profiler is not None:
+                profiler.create_stats()
+                if profiler.stats:
+                    profiles.append(profiler)
+            stacks.update(sampler.stacks)
+        if profiles:
+            pstats.Stats(*profiles).dump_stats(os.path.join(self.directory, f"{self.name}.prof"))
+        write_collapsed(stacks, os.path.join(self.directory, f"{self.name}.collapsed"))
+
+
+@contextmanager
+def profiled_thread():
+    """Profile the calling thread for the block, if the running request is being profiled and it is not yet."""
+    session = _session.get()
+    started = session is not None and session.start_thread()
+    try:
+        yield
+    finally:
+        if started:
+            session.stop_thread()
+
+
+def profile_call(func, directory, name, interval):
+    """Return ``func()``, writing ``<name>.prof`` and ``<name>.collapsed`` to ``directory``."""
+    session = ProfileSession(directory, name, interval)
+    token = _session.set(session)
+    try:
+        with profiled_thread():
+            return func()
+    finally:
+        _session.reset(token)
+        session.write()
+
+
+async def aprofile_call(func, directory, name, interval):
+    """``profile_call`` for a coroutine function: the event loop thread and the request's sync thread."""
+    session = ProfileSession(directory, name, interval)
+    token = _session.set(session)
+    session.start_thread()
+    # A thread-sensitive sync_to_async call runs in the thread every later one
+    # of this request runs in; the profiler stays on there until stopped.
+    in_sync_thread = await sync_to_async(session.start_thread)()
+    try:
+        return await func()
+    finally:
+        if in_sync_thread:
+            await sync_to_async(session.stop_thread)()
+        session.stop_thread()
+        _session.reset(token)
+        session.write()
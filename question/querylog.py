@@ -0,0 +1,174 @@
+"""Slow query log.
+
+``SlowQueryLog`` is an execute wrapper installed on every connection next
+to the query timer (``middleware.install_query_hooks``). Any statement a
+request runs that takes longer than QUESTION_SLOW_QUERY_MS (off while
+unset or 0) is recorded with its parameters, the view and path of the
+request, the first project frame that issued it, and (for SELECTs) the
+database's query plan. Queries an async view hands to ``sync_to_async``
+run on a thread whose stack does not lead back to the view; they are
+attributed to the origin set with ``query_origin`` (the label a list view
+passes to ``_alist``, e.g. "ChapterList.get") or else to the handler
+(AsyncAPIView.dispatch). Parameters can hold user data, so strings are
+logged as type and length only unless QUESTION_SLOW_QUERY_PARAMS is set,
+and then truncated to MAX_PARAM_LENGTH characters.
+Records go to the "question.slow_query" logger and, when
+QUESTION_SLOW_QUERY_LOG is set, to that JSONL file, which
+``manage.py slow_queries`` aggregates by ``fingerprint``.
+"""
+import contextvars
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DatabaseError
+
+from . import instrumentation
+
+logger = logging.getLogger("question.slow_query")
+
+_SQL_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b|%s")
+_SQL_IN_LISTS = re.compile(r"IN \((?:\?, )*\?\)")
+_WHITESPACE = re.compile(r"\s+")
+
+MAX_PARAMS = 50
+MAX_PARAM_LENGTH = 64
+
+_write_lock = threading.Lock()
+_origin = contextvars.ContextVar("question_query_origin", default=None)
+
+
+def normalize_sql(sql):
+    """SQL with literals and placeholders as ``?`` and IN lists collapsed, so similar queries compare equal."""
+    return _SQL_IN_LISTS.sub("IN (...)", _SQL_LITERALS.sub("?", _WHITESPACE.sub(" ", sql).strip()))
+
+
+def fingerprint(sql):
+    return hashlib.sha1(normalize_sql(sql).encode()).hexdigest()[:12]
+
+
+def _param(value, reveal):
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return f"<{len(value)} bytes>"
+    if isinstance(value, (int, float, bool)) or value is None:
+        return value
+    text = str(value)
+    if not reveal:
+        return f"<{type(value).__name__}, {len(text)} chars>"
+    if len(text) > MAX_PARAM_LENGTH:
+        text = text[:MAX_PARAM_LENGTH] + "..."
+    return text
+
+
+def site(filename, line, func):
+    """``filename:line (func)`` relative to BASE_DIR, or None outside the project."""
+    root = str(settings.BASE_DIR) + os.sep
+    if not filename.startswith(root) or "site-packages" in filename:
+        return None
+    return f"{os.path.relpath(filename, root)}:{line} ({func})"
+
+
+@contextmanager
+def query_origin(call_site):
+    """Attribute the block's queries that run in ``sync_to_async`` threads to ``call_site``, unless None."""
+    token = _origin.set(call_site or _origin.get())
+    try:
+        yield
+    finally:
+        _origin.reset(token)
+
+
+def _call_site():
+    """First project frame outside the instrumentation modules, as "path:line (func)".
+
+    The walk stops at asgiref: beyond it is whatever hosts the executor
+    (under WSGI, the middleware waiting in ``async_to_sync``), not the code
+    that awaited the query, so ``query_origin`` is used instead.
+    """
+    skip = {__file__, instrumentation.__file__}
+    frame = sys._getframe(2)
+    while frame is not None:
+        if frame.f_globals.get("__name__", "").startswith("asgiref."):
+            break
+        filename = frame.f_code.co_filename
+        found = filename not in skip and site(filename, frame.f_lineno, frame.f_code.co_name)
+        if found:
+            return found
+        frame = frame.f_back
+    return _origin.get()
+
+
+class SlowQueryLog:
+    """Execute wrapper recording request statements slower than QUESTION_SLOW_QUERY_MS."""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __call__(self, execute, sql, params, many, context):
+        threshold_ms = settings.QUESTION_SLOW_QUERY_MS
+        if not threshold_ms or instrumentation.current() is None:
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            if elapsed * 1000 >= threshold_ms:
+                self.record(sql, params, many, elapsed)
+
+    def params(self, params, many):
+        if many or params is None:
+            return None
+        reveal = getattr(settings, "QUESTION_SLOW_QUERY_PARAMS", False)
+        if isinstance(params, dict):
+            return {key: _param(value, reveal) for key, value in list(params.items())[:MAX_PARAMS]}
+        return [_param(value, reveal) for value in list(params)[:MAX_PARAMS]]
+
+    def explain(self, sql, params):
+        if not sql.lstrip().upper().startswith("SELECT"):
+            return None
+        prefix = "EXPLAIN QUERY PLAN " if self.connection.vendor == "sqlite" else "EXPLAIN "
+        # Run without any execute wrappers: no recursion into this logger and
+        # the EXPLAIN does not show up in the request's query count.
+        wrappers = self.connection.execute_wrappers
+        self.connection.execute_wrappers = []
+        try:
+            with self.connection.cursor() as cursor:
+                cursor.execute(prefix + sql, params)
+                rows = cursor.fetchall()
+        except DatabaseError:
+            return None
+        finally:
+            self.connection.execute_wrappers = wrappers
+        return [str(row[-1]) for row in rows]
+
+    def record(self, sql, params, many, elapsed):
+        metrics = instrumentation.current()
+        entry = {
+            "ts": time.time(),
+            "fingerprint": fingerprint(sql),
+            "duration_ms": round(elapsed * 1000, 3),
+            "sql": sql,
+            "params": self.params(params, many),
+            "many": many,
+            "alias": self.connection.alias,
+            "view": getattr(metrics, "view", None),
+            "path": getattr(metrics, "path", None),
+            "call_site": _call_site(),
+            "plan": None if many else self.explain(sql, params),
+        }
+        logger.warning(
+            "slow query %.1f ms [%s] %s", entry["duration_ms"], entry["fingerprint"], entry["view"], extra={"query": entry}
+        )
+        path = getattr(settings, "QUESTION_SLOW_QUERY_LOG", None)
+        if path:
+            line = json.dumps(entry, default=str) + "\n"
+            with _write_lock, open(path, "a", encoding="utf-8") as fh:
+                fh.write(line)
@@ -0,0 +1,267 @@
+"""Resumable uploads, following the core of the tus 1.0 protocol.
+
+A client creates an upload with ``POST /api/uploads/`` (``Upload-Length``,
+optionally ``Upload-Metadata`` with a base64 ``filename`` or ``filetype``),
+sends the bytes in ``PATCH`` requests that carry ``Upload-Offset``, and
+after a dropped connection asks ``HEAD`` for the offset to resume from.
+Only one PATCH writes to an upload at a time (an flock on its ``.part``);
+a second one gets 409 while the first runs. An upload whose offset
+reaches its length is finished: UploadCrop and the items of
+UploadCropBulk accept its id as ``uploadId`` in place of a multipart file,
+and the upload is deleted once its crop is saved or its job queued. A
+request that fails leaves the upload in place for the retry.
+
+Each upload is two files in QUESTION_UPLOAD_SESSION_DIR, which lies
+outside MEDIA_ROOT so unfinished bytes are never served: ``<id>.part``
+holds the bytes received so far, so its size is the offset, and
+``<id>.json`` the length, filename and expiry. Every PATCH moves the expiry
+QUESTION_UPLOAD_SESSION_TTL seconds out. Expired uploads read as missing;
+``manage.py purge_uploads`` deletes their files, along with ``.part`` and
+``.tmp`` files left without a state file (by a crash mid-create or
+mid-write) for longer than ORPHAN_AGE.
+"""
+import base64
+import binascii
+import fcntl
+import json
+import mimetypes
+import os
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.files import File
+from django.utils.http import http_date
+from rest_framework import status
+from rest_framework.exceptions import APIException, NotFound, ParseError, ValidationError
+
+TUS_VERSION = "1.0.0"
+TUS_EXTENSIONS = "creation,expiration,termination"
+CONTENT_TYPE = "application/offset+octet-stream"
+READ_SIZE = 64 * 1024
+UPLOAD_ID_KEYS = ("uploadId", "upload_id")
+ORPHAN_AGE = 60 * 60  # seconds before a .part or .tmp file without a state file is purged
+
+
+class OffsetConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "Upload-Offset does not match the upload's offset."
+
+
+class UploadBusy(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "Another request is writing to this upload."
+
+
+class UploadTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = "Upload is larger than its Upload-Length."
+
+
+def session_dir():
+    return settings.QUESTION_UPLOAD_SESSION_DIR
+
+
+def _paths(upload_id):
+    """(bytes, state) paths; raises ValueError for an id that is not a UUID."""
+    base = os.path.join(session_dir(), uuid.UUID(str(upload_id)).hex)
+    return base + ".part", base + ".json"
+
+
+def _save_state(path, state):
+    # Written aside and renamed so a concurrent reader never sees half a file.
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+
+def parse_metadata(header):
+    """``Upload-Metadata`` (``key base64,key base64``) as a dict."""
+    metadata = {}
+    for pair in filter(None, (p.strip() for p in (header or "").split(","))):
+        key, _, value = pair.partition(" ")
+        try:
+            metadata[key] = base64.b64decode(value, validate=True).decode()
+        except (binascii.Error, UnicodeDecodeError):
+            raise ParseError("Upload-Metadata values must be base64.")
+    return metadata
+
+
+def _filename(upload_id, metadata):
+    # Crops are validated by extension, so an unnamed upload borrows one from its type.
+    name = os.path.basename(metadata.get("filename", ""))
+    return name or upload_id.hex + (mimetypes.guess_extension(metadata.get("filetype", "")) or "")
+
+
+def create(length, metadata=None):
+    """Start an upload of ``length`` bytes and return its state."""
+    if length is None or length < 0:
+        raise ParseError("Upload-Length must be a non-negative integer.")
+    if length > settings.QUESTION_UPLOAD_MAX_SIZE:
+        raise UploadTooLarge(f"Upload-Length exceeds {settings.QUESTION_UPLOAD_MAX_SIZE} bytes.")
+    upload_id = uuid.uuid4()
+    os.makedirs(session_dir(), exist_ok=True)
+    part, state_path = _paths(upload_id)
+    open(part, "xb").close()
+    state = {
+        "length": length,
+        "filename": _filename(upload_id, metadata or {}),
+        "expires": time.time() + settings.QUESTION_UPLOAD_SESSION_TTL,
+    }
+    _save_state(state_path, state)
+    return {"id": upload_id, "offset": 0, **state}
+
+
+def get(upload_id):
+    """The upload's state with its current offset; raises NotFound if it is missing or expired."""
+    try:
+        part, state_path = _paths(upload_id)
+        with open(state_path) as f:
+            state = json.load(f)
+        offset = os.path.getsize(part)
+    except (ValueError, FileNotFoundError):
+        raise NotFound()
+    if state["expires"] < time.time():
+        discard(upload_id)
+        raise NotFound()
+    return {"id": uuid.UUID(str(upload_id)), "offset": offset, **state}
+
+
+def append(upload_id, offset, stream, content_length=None):
+    """Write ``stream`` at ``offset``, which must be the upload's current offset.
+
+    Whatever arrives before the connection drops is kept, so the client
+    resumes from the new offset. Raises UploadBusy while another request
+    is appending. Returns the updated state.
+    """
+    upload = get(upload_id)
+    part, state_path = _paths(upload_id)
+    with open(part, "r+b") as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise UploadBusy()
+        # Read under the lock: the previous writer may have just finished.
+        upload["offset"] = os.fstat(f.fileno()).st_size
+        if offset != upload["offset"]:
+            raise OffsetConflict(f"Upload-Offset must be {upload['offset']}.")
+        remaining = upload["length"] - offset
+        if content_length is not None and content_length > remaining:
+            raise UploadTooLarge()
+        f.seek(offset)
+        while stream is not None and remaining > 0:
+            chunk = stream.read(min(READ_SIZE, remaining))
+            if not chunk:
+                break
+            f.write(chunk)
+            remaining -= len(chunk)
+            offset += len(chunk)
+        upload["offset"] = offset
+        upload["expires"] = time.time() + settings.QUESTION_UPLOAD_SESSION_TTL
+        _save_state(state_path, {k: upload[k] for k in ("length", "filename", "expires")})
+    return upload
+
+
+def discard(*upload_ids):
+    for upload_id in upload_ids:
+        for path in _paths(upload_id):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def purge_expired(now=None):
+    """Delete expired uploads and orphaned files; returns how many uploads."""
+    now = time.time() if now is None else now
+    try:
+        names = set(os.listdir(session_dir()))
+    except FileNotFoundError:
+        return 0
+    purged = 0
+    for name in names:
+        upload_id, ext = os.path.splitext(name)
+        path = os.path.join(session_dir(), name)
+        if ext == ".json":
+            try:
+                with open(path) as f:
+                    expired = json.load(f)["expires"] < now
+            except (OSError, ValueError, KeyError):
+                continue
+            if expired:
+                discard(upload_id)
+                purged += 1
+        elif ext == ".tmp" or (ext == ".part" and upload_id + ".json" not in names):
+            try:
+                if os.path.getmtime(path) < now - ORPHAN_AGE:
+                    os.remove(path)
+            except FileNotFoundError:
+                pass
+    return purged
+
+
+def headers(upload):
+    """tus response headers describing ``upload``."""
+    return {
+        "Tus-Resumable": TUS_VERSION,
+        "Upload-Offset": str(upload["offset"]),
+        "Upload-Length": str(upload["length"]),
+        "Upload-Expires": http_date(upload["expires"]),
+        "Cache-Control": "no-store",
+    }
+
+
+def describe(upload):
+    return {
+        "id": str(upload["id"]),
+        "url": f"/api/uploads/{upload['id']}/",
+        "offset": upload["offset"],
+        "length": upload["length"],
+        "filename": upload["filename"],
+        "complete": upload["offset"] == upload["length"],
+    }
+
+
+def open_upload(upload_id):
+    """A finished upload as a File named after its filename; raises ValidationError."""
+    try:
+        upload = get(upload_id)
+    except NotFound:
+        raise ValidationError({"uploadId": "No such upload."})
+    if upload["offset"] < upload["length"]:
+        raise ValidationError({"uploadId": f"Upload is incomplete ({upload['offset']} of {upload['length']} bytes)."})
+    return File(open(_paths(upload_id)[0], "rb"), name=upload["filename"])
+
+
+def upload_id_of(item):
+    if isinstance(item, dict):
+        return next((item[k] for k in UPLOAD_ID_KEYS if item.get(k)), None)
+    return None
+
+
+@contextmanager
+def referenced_files(items, files):
+    """``files`` plus ``image_<idx>`` for each item that names a finished upload.
+
+    Yields (files, ids of the uploads used). A multipart file sent for an
+    item wins over its ``uploadId``. The opened uploads are closed on exit.
+    """
+    merged, used, opened = dict(files.items()), [], []
+    try:
+        for idx, item in enumerate(items):
+            upload_id = upload_id_of(item)
+            if upload_id is None or f"image_{idx}" in merged:
+                continue
+            try:
+                merged[f"image_{idx}"] = upload = open_upload(upload_id)
+            except ValidationError as exc:
+                raise ValidationError({"items": {idx: exc.detail}})
+            opened.append(upload)
+            used.append(upload_id)
+        yield merged, used
+    finally:
+        for upload in opened:
+            upload.close()
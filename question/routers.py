@@ -0,0 +1,68 @@
+"""Read replica routing.
+
+``ReadReplicaMiddleware`` marks GET/HEAD requests to views declaring
+``read_replica = True`` (the list endpoints); while such a request runs,
+``ReplicaRouter`` sends its reads to one of QUESTION_READ_REPLICAS. Every
+other query, including all writes, goes to the primary. With no replicas
+configured the router is a no-op.
+"""
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+_scope = ContextVar("question_replica_scope", default=None)
+
+
+class _Scope:
+    replica = False
+
+
+def replica_aliases():
+    return tuple(getattr(settings, "QUESTION_READ_REPLICAS", ()))
+
+
+def begin():
+    """Open a routing scope (one request); returns the token for ``end``."""
+    return _scope.set(_Scope())
+
+
+def use_replicas():
+    """Send the rest of the scope's reads to the replicas.
+
+    Flips a flag on the scope object rather than setting the context
+    variable: under ASGI, Django calls a sync ``process_view`` in a worker
+    thread with a copy of the context, which shares the object.
+    """
+    scope = _scope.get()
+    if scope is not None:
+        scope.replica = True
+
+
+def end(token):
+    _scope.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = replica_aliases()
+        scope = _scope.get()
+        if replicas and scope is not None and scope.replica:
+            return random.choice(replicas)
+        return None
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        pool = {DEFAULT_DB_ALIAS, *replica_aliases()}
+        if obj1._state.db in pool and obj2._state.db in pool:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Replicas are whole-file copies of the primary (sync_replicas).
+        if db in replica_aliases():
+            return False
+        return None
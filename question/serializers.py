@@ -1,4 +1,7 @@
 from rest_framework import serializers
+from rest_framework.fields import empty
+
+from . import instrumentation
 from .models import (
     Chapter,
     ClassName,
@@ -10,35 +13,56 @@ from .models import (
     Sources,
     Subject,
     Topic,
+    UploadJob,
     UsageType,
 )
 
 
-class ClassNameSerializer(serializers.ModelSerializer):
+class TimedModelSerializer(serializers.ModelSerializer):
+    """ModelSerializer that reports its (de)serialization time as the "serializer" span.
+
+    Outside a request (shell, commands, benchmarks) it skips the span, which
+    is per item for many=True and would otherwise cost on small serializers.
+    """
+
+    def to_representation(self, instance):
+        if instrumentation.current() is None:
+            return super().to_representation(instance)
+        with instrumentation.span("serializer"):
+            return super().to_representation(instance)
+
+    def run_validation(self, data=empty):
+        if instrumentation.current() is None:
+            return super().run_validation(data)
+        with instrumentation.span("serializer"):
+            return super().run_validation(data)
+
+
+class ClassNameSerializer(TimedModelSerializer):
     class Meta:
         model = ClassName
         fields = ("id", "name")
 
 
-class ClassNameWriteSerializer(serializers.ModelSerializer):
+class ClassNameWriteSerializer(TimedModelSerializer):
     class Meta:
         model = ClassName
         fields = ("id", "name")
 
 
-class SubjectSerializer(serializers.ModelSerializer):
+class SubjectSerializer(TimedModelSerializer):
     class Meta:
         model = Subject
         fields = ("id", "name")
 
 
-class SubjectWriteSerializer(serializers.ModelSerializer):
+class SubjectWriteSerializer(TimedModelSerializer):
     class Meta:
         model = Subject
         fields = ("id", "name")
 
 
-class ChapterSerializer(serializers.ModelSerializer):
+class ChapterSerializer(TimedModelSerializer):
     class_name = ClassNameSerializer(read_only=True)
     subject = SubjectSerializer(read_only=True)
 
@@ -50,13 +74,13 @@ class ChapterSerializer(serializers.ModelSerializer):
         fields = ("id", "name", "class_name", "subject", "class_name_id", "subject_id")
 
 
-class ChapterWriteSerializer(serializers.ModelSerializer):
+class ChapterWriteSerializer(TimedModelSerializer):
     class Meta:
         model = Chapter
         fields = ("id", "name", "class_name", "subject")
 
 
-class ConceptSerializer(serializers.ModelSerializer):
+class ConceptSerializer(TimedModelSerializer):
     chapter = ChapterSerializer(read_only=True)
     chapter_id = serializers.IntegerField(read_only=True)
     class_name_id = serializers.IntegerField(source="chapter.class_name_id", read_only=True)
@@ -74,13 +98,13 @@ class ConceptSerializer(serializers.ModelSerializer):
         )
 
 
-class ConceptWriteSerializer(serializers.ModelSerializer):
+class ConceptWriteSerializer(TimedModelSerializer):
     class Meta:
         model = Concept
         fields = ("id", "name", "chapter")
 
 
-class TopicSerializer(serializers.ModelSerializer):
+class TopicSerializer(TimedModelSerializer):
     concept_id = serializers.IntegerField(read_only=True)
     class_name_id = serializers.IntegerField(source="concept.chapter.class_name_id", read_only=True)
     subject_id = serializers.IntegerField(source="concept.chapter.subject_id", read_only=True)
@@ -98,44 +122,45 @@ class TopicSerializer(serializers.ModelSerializer):
         )
 
 
-class TopicWriteSerializer(serializers.ModelSerializer):
+class TopicWriteSerializer(TimedModelSerializer):
     class Meta:
         model = Topic
         fields = ("id", "name", "concept")
 
 
-class ImageTypeSerializer(serializers.ModelSerializer):
+class ImageTypeSerializer(TimedModelSerializer):
     class Meta:
         model = ImageType
         fields = ("id", "name")
 
 
-class QuestionTypeSerializer(serializers.ModelSerializer):
+class QuestionTypeSerializer(TimedModelSerializer):
     class Meta:
         model = QuestionType
         fields = ("id", "name")
 
 
-class UsageTypeSerializer(serializers.ModelSerializer):
+class UsageTypeSerializer(TimedModelSerializer):
     class Meta:
         model = UsageType
         fields = ("id", "name")
 
 
-class SourcesSerializer(serializers.ModelSerializer):
+class SourcesSerializer(TimedModelSerializer):
     class Meta:
         model = Sources
         fields = ("id", "name")
 
 
-class CropSerializer(serializers.ModelSerializer):
+class CropSerializer(TimedModelSerializer):
     # NOTE: Upload endpoints still use this serializer.
     class Meta:
         model = CroppedImage
         fields = "__all__"
+        read_only_fields = ("width", "height", "byte_size", "image_format", "sha256", "placeholder")
 
 
-class CroppedImageWriteSerializer(serializers.ModelSerializer):
+class CroppedImageWriteSerializer(TimedModelSerializer):
     usage_types = serializers.PrimaryKeyRelatedField(
         many=True,
         queryset=UsageType.objects.all(),
@@ -166,7 +191,7 @@ class CroppedImageWriteSerializer(serializers.ModelSerializer):
         read_only_fields = ("id",)
 
 
-class CroppedImageExtraReadSerializer(serializers.ModelSerializer):
+class CroppedImageExtraReadSerializer(TimedModelSerializer):
     image_type_name = serializers.CharField(source="image_type.name", read_only=True)
 
     class Meta:
@@ -175,6 +200,12 @@ class CroppedImageExtraReadSerializer(serializers.ModelSerializer):
             "id",
             "parent",
             "image",
+            "width",
+            "height",
+            "byte_size",
+            "image_format",
+            "sha256",
+            "placeholder",
             "image_type",
             "image_type_name",
             "rect_pdf",
@@ -185,7 +216,7 @@ class CroppedImageExtraReadSerializer(serializers.ModelSerializer):
         )
 
 
-class CroppedImageExtraWriteSerializer(serializers.ModelSerializer):
+class CroppedImageExtraWriteSerializer(TimedModelSerializer):
     class Meta:
         model = CroppedImageExtra
         fields = (
@@ -200,7 +231,7 @@ class CroppedImageExtraWriteSerializer(serializers.ModelSerializer):
         read_only_fields = ("id",)
 
 
-class CroppedImageReadSerializer(serializers.ModelSerializer):
+class CroppedImageReadSerializer(TimedModelSerializer):
     usage_types = UsageTypeSerializer(many=True, read_only=True)
     image_type_name = serializers.CharField(source="image_type.name", read_only=True)
     question_type_name = serializers.CharField(source="question_type.name", read_only=True)
@@ -217,6 +248,12 @@ class CroppedImageReadSerializer(serializers.ModelSerializer):
         fields = (
             "id",
             "image",
+            "width",
+            "height",
+            "byte_size",
+            "image_format",
+            "sha256",
+            "placeholder",
             "image_type",
             "image_type_name",
             "extra_images",
@@ -245,3 +282,26 @@ class CroppedImageReadSerializer(serializers.ModelSerializer):
             "created_at",
             "updated_at",
         )
+
+
+class UploadJobSerializer(TimedModelSerializer):
+    url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = UploadJob
+        fields = (
+            "id",
+            "url",
+            "status",
+            "total",
+            "processed",
+            "errors",
+            "result",
+            "created_at",
+            "started_at",
+            "finished_at",
+        )
+        read_only_fields = fields
+
+    def get_url(self, obj):
+        return f"/api/jobs/{obj.pk}/"
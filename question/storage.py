@@ -0,0 +1,20 @@
+from django.core.files.storage import FileSystemStorage
+
+from .instrumentation import span
+from .metrics import STORAGE_DELETES, STORAGE_WRITE_BYTES, STORAGE_WRITES
+
+
+class InstrumentedFileSystemStorage(FileSystemStorage):
+    """FileSystemStorage that reports write and delete time to the request metrics."""
+
+    def _save(self, name, content):
+        with span("storage_write"):
+            name = super()._save(name, content)
+        STORAGE_WRITES.inc()
+        STORAGE_WRITE_BYTES.inc(content.size)
+        return name
+
+    def delete(self, name):
+        with span("storage_delete"):
+            super().delete(name)
+        STORAGE_DELETES.inc()
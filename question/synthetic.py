@@ -0,0 +1,64 @@
+"""Deterministic synthetic data for the seed_bank management command.
+
+Everything is derived from the seed: the command draws taxonomy and rows
+from one ``random.Random(seed)`` in order, and each image is rendered from
+its own ``(seed, key)`` stream so pool workers can draw them in any order.
+"""
+import io
+import random
+
+from PIL import Image, ImageDraw
+
+from . import imagemeta
+
+IMAGE_TYPES = ("Question", "Solution", "Diagram")
+QUESTION_TYPES = ("MCQ", "Subjective", "Integer", "Assertion-Reason", "Match the Following")
+USAGE_TYPES = ("Exam", "Practice", "Homework", "Revision")
+SOURCES = ("NCERT", "Board", "JEE", "NEET", "Olympiad", "Reference Book")
+
+DIFFICULTY_WEIGHTS = (("easy", 5), ("medium", 3), ("hard", 2))
+
+
+def render_png(seed, key, width, height):
+    """Return PNG bytes that look vaguely like a cropped question: text lines on paper."""
+    rng = random.Random(f"{seed}:{key}")
+    img = Image.new("L", (width, height), 255 - rng.randrange(12))
+    draw = ImageDraw.Draw(img)
+    line_height = max(6, height // rng.randint(4, 7))
+    y = line_height // 2
+    while y + line_height // 2 < height:
+        x = rng.randrange(4, 12)
+        end = width - rng.randrange(4, width // 3 + 5)
+        while x < end:
+            word = rng.randrange(6, 30)
+            draw.rectangle((x, y, min(x + word, end), y + line_height // 2), fill=rng.randrange(20, 90))
+            x += word + rng.randrange(3, 8)
+        y += line_height
+    buf = io.BytesIO()
+    img.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def store_png(job):
+    """Render and store one image. Runs in a worker process.
+
+    ``job`` is ``(seed, key, name, width, height)``; returns the storage
+    name and the image's imagemeta metadata.
+    """
+    from django.core.files.base import ContentFile
+    from django.core.files.storage import default_storage
+
+    seed, key, name, width, height = job
+    data = render_png(seed, key, width, height)
+    return default_storage.save(name, ContentFile(data)), imagemeta.from_bytes(data)
+
+
+def rect(rng):
+    """A plausible crop rectangle (page number plus box in PDF points)."""
+    return {
+        "page": rng.randint(1, 400),
+        "x": round(rng.uniform(0, 300), 2),
+        "y": round(rng.uniform(0, 650), 2),
+        "width": round(rng.uniform(120, 520), 2),
+        "height": round(rng.uniform(30, 240), 2),
+    }
@@ -1,3 +1,1719 @@
-from django.test import TestCase
+import base64
+import csv
+import difflib
+import fcntl
+import hashlib
+import inspect
+import io
+import json
+import logging
+import re
+import os
+import pstats
+import random
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+from collections import deque
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import OperationalError, connection, router, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.exceptions import NotFound
+
+from . import admission, bulk, events, profiling, resumable, urls as question_urls
+from .admission import Limiter
+from .backends.sqlite3.base import DatabaseWrapper as SQLiteQueueWrapper, write_queue
+from .bulk import JobReclaimed, claim_next_job, run_job
+from .export import EXPORT_COLUMNS, iter_zip
+from .groupcommit import GroupCommit
+from .log import DROPPED, NonBlockingHandler, SamplingFilter
+from .filters import filter_cropped_images
+from .management.commands.import_bank import Command as ImportBank
+from .management.commands.sync_replicas import copy_database
+from .metrics import REGISTRY, Counter
+from .middleware import LAST_WRITE_COOKIE, ReadReplicaMiddleware
+from .models import (
+    Chapter,
+    ClassName,
+    Concept,
+    CroppedImage,
+    CroppedImageExtra,
+    IdempotencyKey,
+    ImageType,
+    QuestionType,
+    QuestionUsage,
+    Sources,
+    Subject,
+    Topic,
+    UploadJob,
+    UploadJobEvent,
+    UsageType,
+)
+from .profiling import ProfileSession, StackSampler
+from .querylog import normalize_sql
+from .routers import ReplicaRouter
+from .views import ClassList, CroppedImageDetail, CroppedImageList, UploadCrop, UploadJobDetail
+
+
+def png_upload(name="crop.png", size=(8, 8)):
+    buf = io.BytesIO()
+    Image.new("RGB", size, (200, 30, 30)).save(buf, "PNG")
+    return SimpleUploadedFile(name, buf.getvalue(), content_type="image/png")
+
+
+def seed_bank(classes=2, subjects=2, chapters_per_pair=3, crops_per_chapter=10):
+    """Small but fully linked bank: taxonomy, lookups, crops, extras and usage links."""
+    image_types = [ImageType.objects.create(name=n) for n in ("Question", "Solution")]
+    question_types = [QuestionType.objects.create(name=n) for n in ("MCQ", "Subjective")]
+    usage_types = [UsageType.objects.create(name=n) for n in ("Exam", "Practice")]
+    sources = [Sources.objects.create(name=n) for n in ("Board", "Olympiad")]
+
+    crops = []
+    for c in range(classes):
+        class_name = ClassName.objects.create(name=f"Class {c + 9}")
+        for s in range(subjects):
+            subject = Subject.objects.get_or_create(name=f"Subject {s}")[0]
+            for h in range(chapters_per_pair):
+                chapter = Chapter.objects.create(name=f"Chapter {h}", class_name=class_name, subject=subject)
+                concept = Concept.objects.create(name=f"Concept {h}", chapter=chapter)
+                topic = Topic.objects.create(name=f"Topic {h}", concept=concept)
+                for i in range(crops_per_chapter):
+                    crops.append(
+                        CroppedImage(
+                            image=f"cropped/{chapter.pk}-{i}.png",
+                            image_type=image_types[i % 2],
+                            class_name=class_name,
+                            subject=subject,
+                            chapter=chapter,
+                            concept=concept,
+                            topic=topic,
+                            question_type=question_types[i % 2],
+                            difficulty=("easy", "medium", "hard")[i % 3],
+                            marks=1 + i % 4,
+                            priority=i % 3,
+                            verified=i % 2 == 0,
+                            source=sources[i % 2],
+                            is_active=i % 5 != 0,
+                        )
+                    )
+    crops = CroppedImage.objects.bulk_create(crops)
+    CroppedImageExtra.objects.bulk_create(
+        CroppedImageExtra(parent=crop, image=f"cropped/extra-{crop.pk}.png", image_type=image_types[1], sort_order=2)
+        for crop in crops[::3]
+    )
+    QuestionUsage.objects.bulk_create(
+        QuestionUsage(question=crop, usage_type=usage_types[crop.pk % 2]) for crop in crops
+    )
+    return crops
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.crops = seed_bank(classes=1, subjects=1, chapters_per_pair=1, crops_per_chapter=3)
+        cls.usage = {
+            crop.pk: [{"id": u.pk, "name": u.name} for u in crop.usage_types.order_by("pk")] for crop in cls.crops
+        }
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def export(self, output):
+        response = self.client.get("/api/cropped-images/export/", {"output": output})
+        self.assertEqual(response.status_code, 200)
+        return b"".join(response.streaming_content)
+
+    def test_ndjson_and_csv_rows(self):
+        rows = [json.loads(line) for line in self.export("ndjson").decode().splitlines()]
+        self.assertEqual({row["id"] for row in rows}, {crop.pk for crop in self.crops})
+        self.assertEqual(list(rows[0]), list(EXPORT_COLUMNS))
+        self.assertEqual({row["id"]: row["usage_types"] for row in rows}, self.usage)
+        first = next(row for row in rows if row["id"] == self.crops[0].pk)
+        self.assertEqual((first["chapter_name"], first["image_type_name"], first["marks"]), ("Chapter 0", "Question", 1))
+
+        reader = csv.DictReader(io.StringIO(self.export("csv").decode()))
+        self.assertEqual(tuple(reader.fieldnames), EXPORT_COLUMNS)
+        by_id = {int(row["id"]): row for row in reader}
+        self.assertEqual({pk: json.loads(row["usage_types"]) for pk, row in by_id.items()}, self.usage)
+        self.assertEqual(by_id[self.crops[0].pk]["verified"], "True")
+        self.assertEqual(by_id[self.crops[0].pk]["rect_pdf"], "{}")
+
+        out = io.StringIO()
+        call_command("export_bank", filter=[f"marks={self.crops[1].marks}"], stdout=out)
+        self.assertEqual([json.loads(line)["id"] for line in out.getvalue().splitlines()], [self.crops[1].pk])
+
+    def test_zip_bundle_has_manifest_images_and_missing_list(self):
+        crop = self.crops[0]
+        extra = crop.extra_images.get()
+        for name in (crop.image.name, extra.image.name):
+            default_storage.save(name, io.BytesIO(name.encode()))
+
+        archive = zipfile.ZipFile(io.BytesIO(self.export("zip")))
+        names = archive.namelist()
+        self.assertEqual(names[0], "manifest.json")
+        manifest = json.loads(archive.read("manifest.json"))
+        self.assertEqual(manifest["version"], 1)
+        questions = {q["id"]: q for q in manifest["questions"]}
+        self.assertEqual(set(questions), {c.pk for c in self.crops})
+        entry = questions[crop.pk]
+        self.assertEqual(entry["archive_path"], f"images/{crop.pk}/01-{os.path.basename(crop.image.name)}")
+        self.assertEqual(entry["usage_types"], self.usage[crop.pk])
+        self.assertEqual([e["id"] for e in entry["extra_images"]], [extra.pk])
+        self.assertEqual(archive.read(entry["archive_path"]), crop.image.name.encode())
+        self.assertEqual(archive.read(entry["extra_images"][0]["archive_path"]), extra.image.name.encode())
+
+        missing = json.loads(archive.read("missing.json"))
+        self.assertEqual(
+            sorted(m["archive_path"] for m in missing),
+            sorted(questions[c.pk]["archive_path"] for c in self.crops[1:]),
+        )
+        self.assertEqual(names[-1], "missing.json")
+
+    async def test_asgi_export_streams_from_an_async_iterator(self):
+        crop = self.crops[0]
+        await sync_to_async(default_storage.save)(crop.image.name, io.BytesIO(b"image"))
+        for output in ("ndjson", "zip"):
+            response = await self.async_client.get("/api/cropped-images/export/", {"output": output})
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.is_async)
+            pieces = [piece async for piece in response.streaming_content]
+            self.assertGreater(len(pieces), 1 if output == "zip" else 0)
+            if output == "ndjson":
+                rows = [json.loads(line) for line in b"".join(pieces).decode().splitlines()]
+                self.assertEqual({row["id"] for row in rows}, {c.pk for c in self.crops})
+            else:
+                archive = zipfile.ZipFile(io.BytesIO(b"".join(pieces)))
+                manifest = json.loads(archive.read("manifest.json"))
+                self.assertEqual(len(manifest["questions"]), 3)
+                self.assertEqual(archive.read(manifest["questions"][-1]["archive_path"]), b"image")
+
+    def test_zip_pages_by_keyset_and_ignores_rows_added_meanwhile(self):
+        CroppedImage.objects.update(created_at=timezone.now())  # order falls back to pk
+        qs = CroppedImage.objects.order_by("-created_at")
+        with CaptureQueriesContext(connection) as ctx:
+            parts = iter_zip(qs, chunk_size=2)
+            data = [next(parts)]
+            late = CroppedImage.objects.get(pk=self.crops[0].pk)
+            late.pk, late.image = None, "cropped/late.png"
+            late.save()
+            data.extend(parts)
+
+        manifest = json.loads(zipfile.ZipFile(io.BytesIO(b"".join(data))).read("manifest.json"))
+        self.assertEqual([q["id"] for q in manifest["questions"]], sorted((c.pk for c in self.crops), reverse=True))
+        missing = json.loads(zipfile.ZipFile(io.BytesIO(b"".join(data))).read("missing.json"))
+        self.assertNotIn(late.image.name, [m["image"] for m in missing])
+        pages = [q["sql"] for q in ctx.captured_queries if '"question_croppedimage"."id" <=' in q["sql"]]
+        self.assertEqual(len(pages), 4)  # two pages of two, per pass
+        self.assertTrue(all("LIMIT 2" in sql for sql in pages))
+
+
+class ImportBankTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def snapshot(self):
+        """What an export/import round trip must keep, per crop in list order, without ids."""
+        return [
+            (
+                crop.created_at,
+                crop.updated_at,
+                crop.chapter.name,
+                crop.class_name.name,
+                crop.difficulty,
+                crop.marks,
+                crop.sha256,
+                sorted(u.name for u in crop.usage_types.all()),
+                [(e.sort_order, e.image_type.name, e.sha256) for e in crop.extra_images.all()],
+            )
+            for crop in CroppedImage.objects.order_by("-created_at")
+        ]
+
+    def test_round_trip_and_resume_from_checkpoint(self):
+        base = {"classId": "Class 10", "subjectId": "Physics", "imageType": "Question"}
+        items = [
+            {**base, "chapterId": "Optics", "usage": "Exam", "marks": 3, "groupKey": "g"},
+            {"groupKey": "g", "groupIndex": 2, "imageType": "Solution"},
+            {**base, "chapterId": "Lenses", "difficulty": "hard"},
+        ]
+        files = {f"image_{i}": png_upload(f"{i}.png", size=(10 + i, 10)) for i in range(len(items))}
+        response = self.client.post("/api/upload-crop-bulk/", {"items": json.dumps(items), **files})
+        self.assertEqual(response.status_code, 201, response.data)
+        before = self.snapshot()
+
+        bundle = os.path.join(self.media_root, "bundle.zip")
+        call_command("export_bank", format="zip", output=bundle)
+        CroppedImage.objects.all().delete()
+        out = io.StringIO()
+        call_command("import_bank", bundle, workers=1, batch_size=1, stdout=out)
+        self.assertIn("Imported 2 questions; 0 failed.", out.getvalue())
+        self.assertEqual(self.snapshot(), before)
+
+        out = io.StringIO()
+        call_command("import_bank", bundle, workers=1, stdout=out)
+        self.assertIn("Resuming at question #2.", out.getvalue())
+        self.assertEqual(CroppedImage.objects.count(), 2)
+
+    def test_resume_after_crash_between_commit_and_checkpoint(self):
+        base = {"classId": "Class 10", "subjectId": "Physics", "imageType": "Question"}
+        items = [{**base, "chapterId": "Optics"}, {**base, "chapterId": "Lenses"}]
+        files = {f"image_{i}": png_upload(f"{i}.png", size=(10 + i, 10)) for i in range(len(items))}
+        self.client.post("/api/upload-crop-bulk/", {"items": json.dumps(items), **files})
+        bundle = os.path.join(self.media_root, "bundle.zip")
+        call_command("export_bank", format="zip", output=bundle)
+        CroppedImage.objects.all().delete()
+
+        save_checkpoint = ImportBank._save_checkpoint
+        calls = []
+
+        def die_after_second_commit(command):
+            calls.append(1)
+            if len(calls) == 4:  # pending #0, done #0, pending #1, then this
+                raise RuntimeError("killed")
+            save_checkpoint(command)
+
+        with mock.patch.object(ImportBank, "_save_checkpoint", die_after_second_commit):
+            with self.assertRaisesMessage(RuntimeError, "killed"):
+                call_command("import_bank", bundle, workers=1, batch_size=1, stdout=io.StringIO())
+        self.assertEqual(CroppedImage.objects.count(), 2)
+
+        out = io.StringIO()
+        call_command("import_bank", bundle, workers=1, batch_size=1, stdout=out)
+        self.assertIn("Resuming at question #2.", out.getvalue())
+        self.assertIn("Imported 2 questions; 0 failed.", out.getvalue())
+        self.assertEqual(CroppedImage.objects.count(), 2)
+
+
+class SeedBankTests(TestCase):
+    def seed(self, seed):
+        """Rows seed_bank generates, by content, in a fresh media root and a rolled-back transaction."""
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        options = {"classes": 2, "subjects": 2, "chapters": 3, "concepts": 4, "topics": 5, "questions": 6}
+        with override_settings(MEDIA_ROOT=media_root), transaction.atomic():
+            call_command(
+                "seed_bank", seed=seed, workers=1, extras_ratio=0.5, image_size="24x8", stdout=io.StringIO(), **options
+            )
+            rows = list(
+                CroppedImage.objects.order_by("image").values_list(
+                    "image", "chapter__name", "topic__name", "difficulty", "marks", "priority", "verified",
+                    "source__name", "rect_pdf", "sha256",
+                )
+            )
+            extras = list(CroppedImageExtra.objects.order_by("image").values_list("image", "parent__image", "sha256"))
+            usage = sorted(QuestionUsage.objects.values_list("question__image", "usage_type__name"))
+            transaction.set_rollback(True)
+        return rows, extras, usage
+
+    def test_same_seed_same_bank(self):
+        first = self.seed(7)
+        self.assertEqual(len(first[0]), 6)
+        self.assertTrue(first[1])
+        self.assertEqual(self.seed(7), first)
+        # Image names carry the seed; the drawn content must differ too.
+        self.assertNotEqual([row[1:] for row in self.seed(8)[0]], [row[1:] for row in first[0]])
+
+
+class RecordingRouter(ReplicaRouter):
+    """ReplicaRouter noting where each read went, for AsyncListViewTests."""
+
+    reads = []
+
+    def db_for_read(self, model, **hints):
+        alias = super().db_for_read(model, **hints)
+        self.reads.append(alias)
+        return alias
+
+
+class AsyncListViewTests(TestCase):
+    """The read endpoints run as async views; exercise them as ASGI requests."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.crops = seed_bank(classes=2, subjects=2, chapters_per_pair=2, crops_per_chapter=6)
+
+    async def get(self, url, params=None, **kwargs):
+        response = await self.async_client.get(url, params or {}, **kwargs)
+        self.assertEqual(response.status_code, 200, getattr(response, "data", None))
+        return response.json()
+
+    async def test_cropped_images_filter_paginate_and_count(self):
+        class_name = self.crops[0].class_name
+        params = {"class_name": class_name.pk, "difficulty": "easy", "verified": "1", "page_size": 2}
+        expected = {
+            crop.pk
+            for crop in self.crops
+            if crop.class_name_id == class_name.pk and crop.difficulty == "easy" and crop.verified
+        }
+        self.assertGreater(len(expected), 2)
+
+        seen = []
+        for page in range(1, len(expected) // 2 + 2):
+            data = await self.get("/api/cropped-images/", {**params, "page": page})
+            self.assertEqual((data["page"], data["page_size"], data["count"]), (page, 2, len(expected)))
+            self.assertLessEqual(len(data["results"]), 2)
+            seen += [item["id"] for item in data["results"]]
+        self.assertEqual(len(seen), len(expected))
+        self.assertEqual(set(seen), expected)
+
+        data = await self.get("/api/cropped-images/", {"page_size": 500})
+        self.assertEqual((data["page_size"], data["count"], len(data["results"])), (200, 48, 48))
+        by_id = {item["id"]: item for item in data["results"]}
+        extra = self.crops[3]
+        self.assertEqual(len(by_id[extra.pk]["extra_images"]), 1)
+        self.assertEqual(len(by_id[extra.pk]["usage_types"]), 1)
+
+    async def test_taxonomy_lists(self):
+        self.assertEqual([c["name"] for c in await self.get("/api/classes/")], ["Class 10", "Class 9"])
+        self.assertEqual([s["name"] for s in await self.get("/api/subjects/")], ["Subject 0", "Subject 1"])
+
+        crop = self.crops[0]
+        chapters = await self.get("/api/chapters/", {"class": crop.class_name.name, "subject_id": crop.subject_id})
+        self.assertEqual([c["name"] for c in chapters], ["Chapter 0", "Chapter 1"])
+        concepts = await self.get("/api/concepts/", {"chapter_id": crop.chapter_id})
+        self.assertEqual([c["id"] for c in concepts], [crop.concept_id])
+        topics = await self.get("/api/topics/", {"concept": crop.concept_id})
+        self.assertEqual([t["id"] for t in topics], [crop.topic_id])
+        self.assertEqual(len(await self.get("/api/topics/")), 8)
+
+    @override_settings(
+        DATABASE_ROUTERS=["question.tests.RecordingRouter"],
+        # The test database has one alias; as the "replica" it shows up in
+        # the router's answer, which is None for reads left on the primary.
+        QUESTION_READ_REPLICAS=["default"],
+    )
+    async def test_list_reads_are_routed_to_replicas(self):
+        RecordingRouter.reads.clear()
+        await self.get("/api/cropped-images/", {"page_size": 5})
+        await self.get("/api/topics/")
+        self.assertTrue(RecordingRouter.reads)
+        self.assertEqual(set(RecordingRouter.reads), {"default"})
+
+        # Just after a write the client's reads stay on the primary.
+        RecordingRouter.reads.clear()
+        await self.get("/api/cropped-images/", {"page_size": 5}, headers={"X-Last-Write": str(time.time())})
+        self.assertTrue(RecordingRouter.reads)
+        self.assertEqual(set(RecordingRouter.reads), {None})
+
+
+class CroppedImageIndexTests(TestCase):
+    """EXPLAIN QUERY PLAN checks for the CroppedImageList indexes (0006)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        class_name = ClassName.objects.create(name="Class 10")
+        subject = Subject.objects.create(name="Physics")
+        cls.chapter = Chapter.objects.create(name="Optics", class_name=class_name, subject=subject)
+        image_type = ImageType.objects.create(name="Question")
+        CroppedImage.objects.bulk_create(
+            CroppedImage(
+                image=f"cropped/{i}.png",
+                image_type=image_type,
+                class_name=class_name,
+                subject=subject,
+                chapter=cls.chapter,
+                difficulty=("easy", "medium", "hard")[i % 3],
+                verified=i % 2 == 0,
+                is_active=i % 5 != 0,
+            )
+            for i in range(30)
+        )
+
+    def plan(self, params):
+        qs = CroppedImage.objects.all().order_by("-created_at")
+        return filter_cropped_images(qs, params)[:50].explain()
+
+    def test_list_filters_use_matching_index(self):
+        chapter = str(self.chapter.pk)
+        cases = [
+            ({}, "crop_created_idx"),
+            ({"chapter": chapter}, "crop_chapter_created_idx"),
+            ({"is_active": "1"}, "crop_active_created_idx"),
+            ({"chapter": chapter, "is_active": "1"}, "crop_chapter_active_idx"),
+            (
+                {"chapter": chapter, "difficulty": "hard", "verified": "1", "is_active": "1"},
+                "crop_chapter_diff_active_idx",
+            ),
+            ({"verified": "0"}, "crop_unverified_idx"),
+            ({"chapter": chapter, "verified": "0"}, "crop_chapter_unverified_idx"),
+        ]
+        for params, index_name in cases:
+            with self.subTest(params=params):
+                plan = self.plan(params)
+                self.assertIn(f"USING INDEX {index_name}", plan)
+                self.assertNotIn("TEMP B-TREE", plan)
+
+
+# "SCAN <table>" with nothing after it is a full table scan; "SCAN ... USING
+# [COVERING] INDEX" walks an index in order and is fine.
+FULL_SCAN = re.compile(r"^SCAN \S+$")
+LIMIT = re.compile(r"\bLIMIT \d+")
+COUNT = re.compile(r"^SELECT COUNT\(\*\) .* WHERE (.*)$")
+COLUMN = re.compile(r'"question_croppedimage"\."(\w+)"')
+# Each value of these matches a large share of the bank, so an index would
+# barely narrow an unpaginated COUNT(*) over them; it may scan.
+ENUM_COLUMNS = {"difficulty", "marks", "priority"}
+
+
+def enum_count(sql):
+    """Whether ``sql`` is an unpaginated COUNT(*) filtered only on enum-like columns."""
+    match = COUNT.match(sql)
+    return bool(match) and not LIMIT.search(sql) and set(COLUMN.findall(match.group(1))) <= ENUM_COLUMNS
+
+
+class QueryPlanRegressionTests(TestCase):
+    """Hot endpoints must not regress to full table scans or temp B-tree sorts.
+
+    Each case runs the real view, captures its SQL and runs EXPLAIN QUERY PLAN
+    on every SELECT. The test DB is never ANALYZEd, so plans come from the
+    schema alone, as on a freshly migrated production database.
+
+    Sorts are only flagged on paginated (LIMIT) queries: there a temp B-tree
+    means reading every match to return one page. Unpaginated taxonomy lists
+    return the whole filtered set anyway, so sorting it is the cheap part.
+    Likewise the paginator's COUNT(*) may scan when it filters only on
+    enum-like columns (``enum_count``).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_bank()
+        cls.chapter = Chapter.objects.order_by("pk").first()
+        cls.concept = cls.chapter.concepts.first()
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assertIndexedPlans(self, method, url, data=None, **extra):
+        with CaptureQueriesContext(connection) as ctx:
+            response = getattr(self.client, method)(url, data=data, **extra)
+        self.assertLess(response.status_code, 400, f"{method.upper()} {url}: {getattr(response, 'data', None)}")
+
+        selects = [q["sql"] for q in ctx.captured_queries if q["sql"].lstrip().upper().startswith("SELECT")]
+        self.assertTrue(selects, f"{url} ran no SELECTs")
+        for sql in selects:
+            for detail in self.explain(sql):
+                if (FULL_SCAN.match(detail) and not enum_count(sql)) or ("TEMP B-TREE" in detail and LIMIT.search(sql)):
+                    self.fail(f"{method.upper()} {url}\n  plan: {detail}\n  sql: {sql}")
+
+    def test_cropped_image_list_filters(self):
+        crop = CroppedImage.objects.select_related().order_by("pk").first()
+        usage_type = UsageType.objects.order_by("pk").first()
+        filters = {
+            "image_type": crop.image_type_id,
+            "class_name": crop.class_name_id,
+            "subject": crop.subject_id,
+            "chapter": crop.chapter_id,
+            "concept": crop.concept_id,
+            "topic": crop.topic_id,
+            "question_type": crop.question_type_id,
+            "source": crop.source_id,
+            "difficulty": "hard",
+            "marks": 2,
+            "priority": 1,
+            "verified": "0",
+            "is_active": "1",
+            "usage_types": usage_type.pk,
+        }
+        with self.subTest(filter="none"):
+            self.assertIndexedPlans("get", "/api/cropped-images/")
+        for key, value in filters.items():
+            with self.subTest(filter=key):
+                self.assertIndexedPlans("get", "/api/cropped-images/", {key: value, "page": 2, "page_size": 5})
+        with self.subTest(filter="chapter mix"):
+            self.assertIndexedPlans(
+                "get",
+                "/api/cropped-images/",
+                {"chapter": crop.chapter_id, "difficulty": "hard", "verified": "1", "is_active": "1"},
+            )
+
+    def test_taxonomy_lists_filtered_by_name(self):
+        chapter = self.chapter
+        cases = [
+            ("/api/chapters/", {"class": chapter.class_name.name}),
+            ("/api/chapters/", {"subject": chapter.subject.name}),
+            ("/api/chapters/", {"class": chapter.class_name.name, "subject": chapter.subject.name}),
+            ("/api/concepts/", {"class": chapter.class_name.name}),
+            ("/api/concepts/", {"subject": chapter.subject.name}),
+            ("/api/concepts/", {"chapter": chapter.name}),
+            ("/api/concepts/", {"chapter": chapter.pk}),
+            ("/api/topics/", {"class": chapter.class_name.name}),
+            ("/api/topics/", {"chapter": chapter.name}),
+            ("/api/topics/", {"concept": self.concept.name}),
+            ("/api/topics/", {"concept": self.concept.pk}),
+        ]
+        for url, params in cases:
+            with self.subTest(url=url, params=params):
+                self.assertIndexedPlans("get", url, params)
+
+    def test_upload_resolvers(self):
+        chapter = self.chapter
+        by_name = {
+            "classId": chapter.class_name.name,
+            "subjectId": chapter.subject.name,
+            "chapterId": chapter.name,
+            "conceptId": self.concept.name,
+            "topicId": "New topic",
+            "imageType": "Question",
+            "questionType": "MCQ",
+            "source": "Board",
+            "usage": "Exam",
+            "rectPdf": json.dumps({"x": 1}),
+        }
+        with self.subTest(view="UploadCrop"):
+            self.assertIndexedPlans("post", "/api/upload-crop/", {**by_name, "image": png_upload()})
+
+        items = [
+            {**by_name, "groupKey": "g1", "groupIndex": 1},
+            {"groupKey": "g1", "groupIndex": 2, "imageType": "Solution"},
+            {**by_name, "groupKey": "g2"},
+            {"groupKey": "g2"},
+        ]
+        with self.subTest(view="UploadCropBulk"):
+            self.assertIndexedPlans(
+                "post",
+                "/api/upload-crop-bulk/",
+                {"items": json.dumps(items), **{f"image_{i}": png_upload(f"{i}.png") for i in range(len(items))}},
+            )
+
+
+def seed_rows(n):
+    """n rows in every table; each crop sits in its own taxonomy chain so per-row lookups show up."""
+    classes = ClassName.objects.bulk_create(ClassName(name=f"Class {i}") for i in range(n))
+    subjects = Subject.objects.bulk_create(Subject(name=f"Subject {i}") for i in range(n))
+    chapters = Chapter.objects.bulk_create(
+        Chapter(name=f"Chapter {i}", class_name=classes[i], subject=subjects[i]) for i in range(n)
+    )
+    concepts = Concept.objects.bulk_create(Concept(name=f"Concept {i}", chapter=chapters[i]) for i in range(n))
+    topics = Topic.objects.bulk_create(Topic(name=f"Topic {i}", concept=concepts[i]) for i in range(n))
+    image_types = ImageType.objects.bulk_create(ImageType(name=f"Image type {i}") for i in range(n))
+    question_types = QuestionType.objects.bulk_create(QuestionType(name=f"Question type {i}") for i in range(n))
+    usage_types = UsageType.objects.bulk_create(UsageType(name=f"Usage {i}") for i in range(n))
+    sources = Sources.objects.bulk_create(Sources(name=f"Source {i}") for i in range(n))
+    crops = CroppedImage.objects.bulk_create(
+        CroppedImage(
+            image=f"cropped/{i}.png",
+            image_type=image_types[i],
+            class_name=classes[i],
+            subject=subjects[i],
+            chapter=chapters[i],
+            concept=concepts[i],
+            topic=topics[i],
+            question_type=question_types[i],
+            source=sources[i],
+        )
+        for i in range(n)
+    )
+    CroppedImageExtra.objects.bulk_create(
+        CroppedImageExtra(parent=crop, image=f"cropped/extra-{crop.pk}.png", image_type=crop.image_type, sort_order=2)
+        for crop in crops
+    )
+    QuestionUsage.objects.bulk_create(
+        QuestionUsage(question=crop, usage_type=usage_types[i]) for i, crop in enumerate(crops)
+    )
+    return SimpleNamespace(
+        classes=classes,
+        subjects=subjects,
+        chapters=chapters,
+        concepts=concepts,
+        topics=topics,
+        crops=crops,
+    )
+
+
+def _json(data):
+    return {"data": json.dumps(data), "content_type": "application/json"}
+
+
+def _finished_job():
+    job = UploadJob.objects.create(items=[{}], total=1, status=UploadJob.SUCCEEDED)
+    UploadJobEvent.objects.create(job=job, stage=UploadJob.SUCCEEDED)
+    return job
+
+
+def _upload_bulk(r):
+    return {"data": {
+        "items": json.dumps([
+            {"classId": r.classes[0].pk, "subjectId": r.subjects[0].pk, "chapterId": r.chapters[0].pk,
+             "imageType": "Image type 0", "groupKey": "g"},
+            {"groupKey": "g", "groupIndex": 2},
+        ]),
+        "image_0": png_upload("0.png"),
+        "image_1": png_upload("1.png"),
+    }}
+
+
+def _bulk(create, update_id, delete_id):
+    return _json({"create": [create], "update": [{"id": update_id, "name": "Renamed"}], "delete": [delete_id]})
+
+
+# Route -> request built from the seeded rows: (method, url, client kwargs).
+# Write requests touch a fixed number of rows; only the table size varies.
+# Bulk scenarios delete a spare row so updates still have a target at n=1.
+ROUTE_SCENARIOS = {
+    "api/upload-crop/": lambda r: (
+        "post",
+        "/api/upload-crop/",
+        {"data": {
+            "classId": r.classes[0].pk,
+            "subjectId": r.subjects[0].pk,
+            "chapterId": r.chapters[0].pk,
+            "conceptId": r.concepts[0].pk,
+            "topicId": r.topics[0].pk,
+            "imageType": "Image type 0",
+            "usage": "Usage 0",
+            "image": png_upload(),
+        }},
+    ),
+    "api/upload-crop-bulk/": lambda r: ("post", "/api/upload-crop-bulk/", _upload_bulk(r)),
+    "api/jobs/<int:pk>/": lambda r: ("get", f"/api/jobs/{UploadJob.objects.create(items=[{}], total=1).pk}/", {}),
+    "api/jobs/<int:pk>/events/": lambda r: ("get", f"/api/jobs/{_finished_job().pk}/events/", {}),
+    "api/uploads/": lambda r: ("post", "/api/uploads/", {"headers": {"Upload-Length": "3"}}),
+    "api/uploads/<uuid:upload_id>/": lambda r: (
+        "patch",
+        f"/api/uploads/{resumable.create(3)['id']}/",
+        {"data": b"abc", "content_type": resumable.CONTENT_TYPE, "headers": {"Upload-Offset": "0"}},
+    ),
+    "api/classes/": lambda r: ("get", "/api/classes/", {}),
+    "api/classes/bulk/": lambda r: (
+        "post", "/api/classes/bulk/", _bulk({"name": "New"}, r.classes[0].pk, ClassName.objects.create(name="Spare").pk)
+    ),
+    "api/classes/<int:pk>/": lambda r: ("patch", f"/api/classes/{r.classes[0].pk}/", _json({"name": "Renamed"})),
+    "api/subjects/": lambda r: ("get", "/api/subjects/", {}),
+    "api/subjects/bulk/": lambda r: (
+        "post", "/api/subjects/bulk/", _bulk({"name": "New"}, r.subjects[0].pk, Subject.objects.create(name="Spare").pk)
+    ),
+    "api/subjects/<int:pk>/": lambda r: ("patch", f"/api/subjects/{r.subjects[0].pk}/", _json({"name": "Renamed"})),
+    "api/chapters/": lambda r: ("get", "/api/chapters/", {}),
+    "api/chapters/bulk/": lambda r: (
+        "post",
+        "/api/chapters/bulk/",
+        _bulk(
+            {"name": "New", "class_name": r.classes[0].pk, "subject": r.subjects[0].pk},
+            r.chapters[0].pk,
+            Chapter.objects.create(name="Spare", class_name=r.classes[0], subject=r.subjects[0]).pk,
+        ),
+    ),
+    "api/chapters/<int:pk>/": lambda r: ("patch", f"/api/chapters/{r.chapters[0].pk}/", _json({"name": "Renamed"})),
+    "api/concepts/": lambda r: ("get", "/api/concepts/", {}),
+    "api/concepts/bulk/": lambda r: (
+        "post",
+        "/api/concepts/bulk/",
+        _bulk(
+            {"name": "New", "chapter": r.chapters[0].pk},
+            r.concepts[0].pk,
+            Concept.objects.create(name="Spare", chapter=r.chapters[0]).pk,
+        ),
+    ),
+    "api/concepts/<int:pk>/": lambda r: ("patch", f"/api/concepts/{r.concepts[0].pk}/", _json({"name": "Renamed"})),
+    "api/topics/": lambda r: ("get", "/api/topics/", {}),
+    "api/topics/bulk/": lambda r: (
+        "post",
+        "/api/topics/bulk/",
+        _bulk(
+            {"name": "New", "concept": r.concepts[0].pk},
+            r.topics[0].pk,
+            Topic.objects.create(name="Spare", concept=r.concepts[0]).pk,
+        ),
+    ),
+    "api/topics/<int:pk>/": lambda r: ("patch", f"/api/topics/{r.topics[0].pk}/", _json({"name": "Renamed"})),
+    "api/image-types/": lambda r: ("get", "/api/image-types/", {}),
+    "api/question-types/": lambda r: ("get", "/api/question-types/", {}),
+    "api/usage-types/": lambda r: ("get", "/api/usage-types/", {}),
+    "api/sources/": lambda r: ("get", "/api/sources/", {}),
+    "api/cropped-images/": lambda r: ("get", "/api/cropped-images/", {"data": {"page_size": 200}}),
+    "api/cropped-images/export/": lambda r: ("get", "/api/cropped-images/export/", {}),
+    "api/cropped-images/<int:pk>/": lambda r: (
+        "patch", f"/api/cropped-images/{r.crops[0].pk}/", _json({"marks": 3, "verified": True})
+    ),
+    "metrics/": lambda r: ("get", "/metrics/", {}),
+}
+
+# Extra requests for routes with more than one method.
+EXTRA_SCENARIOS = {
+    "DELETE api/classes/<int:pk>/": lambda r: ("delete", f"/api/classes/{r.classes[0].pk}/", {}),
+    "DELETE api/cropped-images/<int:pk>/": lambda r: ("delete", f"/api/cropped-images/{r.crops[0].pk}/", {}),
+    "POST api/topics/": lambda r: ("post", "/api/topics/", _json({"name": "New", "concept": r.concepts[0].pk})),
+    "POST api/upload-crop-bulk/?async=1": lambda r: ("post", "/api/upload-crop-bulk/?async=1", _upload_bulk(r)),
+}
+
+
+class QueryCountBudgetTests(TestCase):
+    """Query counts per route must not grow with the number of rows in the DB.
+
+    Each scenario runs against 1, 10 and 200 seeded rows per table, inside a
+    rolled-back savepoint. A failure prints a diff of the normalized SQL
+    between the smallest and largest run.
+    """
+
+    ROW_COUNTS = (1, 10, 200)
+
+    def setUp(self):
+        self.media_root, session_dir = tempfile.mkdtemp(), tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.addCleanup(shutil.rmtree, session_dir, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root, QUESTION_UPLOAD_SESSION_DIR=session_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def capture(self, scenario, n):
+        with transaction.atomic():
+            rows = seed_rows(n)
+            method, url, kwargs = scenario(rows)
+            with CaptureQueriesContext(connection) as ctx:
+                response = getattr(self.client, method)(url, **kwargs)
+                if response.streaming:
+                    b"".join(response.streaming_content)
+            transaction.set_rollback(True)
+        self.assertLess(response.status_code, 400, f"{method.upper()} {url}: {getattr(response, 'data', None)}")
+        return [normalize_sql(q["sql"]) for q in ctx.captured_queries]
+
+    def assertQueryBudget(self, name, scenario):
+        runs = {n: self.capture(scenario, n) for n in self.ROW_COUNTS}
+        counts = {n: len(queries) for n, queries in runs.items()}
+        if len(set(counts.values())) > 1:
+            small, large = self.ROW_COUNTS[0], self.ROW_COUNTS[-1]
+            diff = "\n".join(
+                difflib.unified_diff(runs[small], runs[large], f"{small} rows", f"{large} rows", lineterm="")
+            )
+            self.fail(f"{name}: query count grows with rows {counts}\n{diff}")
+
+    def test_every_route_has_a_scenario(self):
+        routes = {str(p.pattern) for p in question_urls.urlpatterns}
+        self.assertEqual(routes - ROUTE_SCENARIOS.keys(), set())
+
+    def test_query_count_is_constant(self):
+        for name, scenario in {**ROUTE_SCENARIOS, **EXTRA_SCENARIOS}.items():
+            with self.subTest(route=name):
+                self.assertQueryBudget(name, scenario)
+
+
+class UploadJobTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def submit(self, items, files):
+        response = self.client.post("/api/upload-crop-bulk/?async=1", {"items": json.dumps(items), **files})
+        self.assertEqual(response.status_code, 202, response.data)
+        self.assertEqual(response["Location"], response.data["url"])
+        self.assertEqual(response.data["status"], UploadJob.QUEUED)
+        call_command("upload_worker", once=True, chunk_size=1, stdout=io.StringIO())
+        return self.client.get(response.data["url"]).data
+
+    def test_worker_imports_queued_upload(self):
+        items = [
+            {"classId": "Class 10", "subjectId": "Physics", "chapterId": "Optics", "imageType": "Question", "groupKey": "g"},
+            {"groupKey": "g", "groupIndex": 2},
+        ]
+        job = self.submit(items, {"image_0": png_upload("0.png"), "image_1": png_upload("1.png")})
+
+        self.assertEqual((job["status"], job["processed"], job["errors"]), (UploadJob.SUCCEEDED, 2, {}))
+        crop = CroppedImage.objects.get()
+        self.assertEqual([r["id"] for r in job["result"]], [crop.pk])
+        self.assertEqual(crop.extra_images.count(), 1)
+        self.assertEqual(crop.chapter.name, "Optics")
+        self.assertEqual([f for _, _, fs in os.walk(os.path.join(self.media_root, "upload-jobs")) for f in fs], [])
+
+    def test_events_stream_item_stages_until_job_finishes(self):
+        items = [
+            {"classId": "Class 10", "subjectId": "Physics", "chapterId": "Optics", "imageType": "Question"},
+            {"classId": "Class 10", "imageType": "Question"},
+        ]
+        job = self.submit(items, {"image_0": png_upload("0.png")})
+
+        response = self.client.get(f"/api/jobs/{job['id']}/events/")
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        frames = [f for f in b"".join(response.streaming_content).decode().split("\n\n") if f.startswith("id:")]
+        data = [(f.split("\n")[1], json.loads(f.split("\n")[2][len("data: "):])) for f in frames]
+        self.assertEqual(data[0], ("event: job", {"status": UploadJob.RUNNING, "total": 2}))
+        self.assertEqual(
+            [(d["index"], d["stage"]) for kind, d in data if kind == "event: item"],
+            [(0, "validated"), (0, "thumbnailed"), (0, "stored"), (0, "committed"), (1, "error")],
+        )
+        self.assertEqual(data[-1], ("event: job", {"status": UploadJob.FAILED, "processed": 2, "total": 2, "errors": 1}))
+
+        last_id = frames[-2].split("\n")[0][len("id: "):]
+        resumed = self.client.get(f"/api/jobs/{job['id']}/events/", HTTP_LAST_EVENT_ID=last_id)
+        self.assertEqual(b"".join(resumed.streaming_content).decode().count("id:"), 1)
+
+    async def test_astream_subscribers_share_one_poller_per_job(self):
+        job = await UploadJob.objects.acreate(items=[], total=1)
+        started = await UploadJobEvent.objects.acreate(job=job, stage=UploadJob.RUNNING, detail={"total": 1})
+        stored = await UploadJobEvent.objects.acreate(job=job, index=0, stage="stored")
+        polls = []
+        query = events._query
+
+        def counting_query(job_id, last_id, up_to=None):
+            polls.append(up_to)
+            return query(job_id, last_id, up_to)
+
+        with mock.patch.object(events, "POLL_INTERVAL", 0.01), mock.patch.object(events, "_query", counting_query):
+            first = events.astream(job.pk, last_id=started.pk)
+            late = events.astream(job.pk)  # no Last-Event-ID: replays what came before the poller
+            self.assertTrue((await anext(first)).startswith("retry:"))
+            self.assertIn(f"id: {stored.pk}\n", await anext(first))
+            self.assertTrue((await anext(late)).startswith("retry:"))
+            self.assertEqual([f"id: {started.pk}", f"id: {stored.pk}"], [
+                line for line in ((await anext(late)) + (await anext(late))).split("\n") if line.startswith("id:")
+            ])
+            self.assertEqual(len(events._pollers), 1)
+
+            await UploadJobEvent.objects.acreate(job=job, stage=UploadJob.SUCCEEDED)
+            for stream in (first, late):
+                rest = "".join([frame async for frame in stream])
+                self.assertIn('"status":"succeeded"', rest)
+        self.assertEqual(events._pollers, {})
+        self.assertEqual(polls.count(started.pk), 1)  # the late client's own replay, up to the poller's start
+
+    def test_streams_end_after_max_duration(self):
+        job = UploadJob.objects.create(items=[], total=1)
+        started = UploadJobEvent.objects.create(job=job, stage=UploadJob.RUNNING, detail={"total": 1})
+        with mock.patch.object(events, "POLL_INTERVAL", 0.01), mock.patch.object(events, "MAX_DURATION", 0.05):
+            frames = list(events.stream(job.pk))
+            aframes = async_to_sync(self.collect)(events.astream(job.pk))
+        for body in (frames, aframes):
+            ids = [frame.split("\n")[0] for frame in body]
+            self.assertEqual(ids, [f"retry: {events.RETRY_MS}", f"id: {started.pk}"])
+
+    async def collect(self, stream):
+        return [frame async for frame in stream]
+
+    def test_failed_item_fails_whole_job(self):
+        items = [
+            {"classId": "Class 10", "subjectId": "Physics", "chapterId": "Optics", "imageType": "Question"},
+            {"classId": "Class 10", "imageType": "Question"},
+            {"classId": "Class 10", "imageType": "Question", "difficulty": "impossible"},
+        ]
+        job = self.submit(items, {"image_0": png_upload("0.png"), "image_2": png_upload("2.png")})
+
+        self.assertEqual((job["status"], job["processed"], job["result"]), (UploadJob.FAILED, 3, None))
+        self.assertEqual(set(job["errors"]), {"1", "2"})
+        self.assertEqual(job["errors"]["1"], {"image_1": "Missing file."})
+        self.assertIn("difficulty", job["errors"]["2"])
+        self.assertFalse(CroppedImage.objects.exists())
+        self.assertEqual(os.listdir(os.path.join(self.media_root, "cropped")), [])
+
+    ITEMS = [
+        {"classId": "Class 10", "subjectId": "Physics", "chapterId": "Optics", "imageType": "Question"},
+        {"classId": "Class 10", "subjectId": "Physics", "chapterId": "Optics", "imageType": "Question"},
+    ]
+
+    def enqueue(self):
+        files = {f"image_{i}": png_upload(f"{i}.png") for i in range(len(self.ITEMS))}
+        response = self.client.post("/api/upload-crop-bulk/?async=1", {"items": json.dumps(self.ITEMS), **files})
+        return UploadJob.objects.get(pk=response.data["id"])
+
+    def cropped_files(self):
+        directory = os.path.join(self.media_root, "cropped")
+        return os.listdir(directory) if os.path.isdir(directory) else []
+
+    def test_enqueue_stages_files_before_its_transaction(self):
+        calls = []
+        save, atomic = default_storage.save, transaction.atomic
+
+        def record(name, func):
+            def wrapper(*args, **kwargs):
+                calls.append(name)
+                return func(*args, **kwargs)
+            return wrapper
+
+        files = {f"image_{i}": png_upload(f"{i}.png") for i in range(len(self.ITEMS))}
+        with mock.patch.object(default_storage, "save", side_effect=record("save", save)):
+            with mock.patch.object(transaction, "atomic", side_effect=record("atomic", atomic)):
+                job = bulk.enqueue(self.ITEMS, files)
+        self.assertEqual(calls[:3], ["save", "save", "atomic"])
+        self.assertTrue(all(default_storage.exists(name) for name in job.files.values()))
+
+        files = {f"image_{i}": png_upload(f"{i}.png") for i in range(len(self.ITEMS))}
+        with mock.patch.object(UploadJob.objects, "create", side_effect=OperationalError("database is locked")):
+            with self.assertRaises(OperationalError):
+                bulk.enqueue(self.ITEMS, files)
+        staged = [f for _, _, fs in os.walk(os.path.join(self.media_root, "upload-jobs")) for f in fs]
+        self.assertEqual(len(staged), 2)  # only the first job's files
+
+    def test_chunk_that_raises_deletes_its_files(self):
+        self.enqueue()
+        with mock.patch.object(UploadJobEvent.objects, "bulk_create", side_effect=RuntimeError("disk full")):
+            job = run_job(claim_next_job(), chunk_size=2)
+
+        self.assertEqual((job.status, job.errors), (UploadJob.FAILED, {"job": "Import failed."}))
+        self.assertFalse(CroppedImage.objects.exists())
+        self.assertEqual(self.cropped_files(), [])
+        self.assertFalse(any(default_storage.exists(name) for name in job.files.values()))
+
+    def test_stale_running_job_is_reclaimed_and_rerun(self):
+        job = self.enqueue()
+        bulk_create = UploadJobEvent.objects.bulk_create
+        calls = []
+
+        def die_in_second_chunk(*args, **kwargs):
+            calls.append(1)
+            if len(calls) == 2:
+                raise KeyboardInterrupt  # the worker is killed; nothing after this runs
+            return bulk_create(*args, **kwargs)
+
+        with mock.patch.object(UploadJobEvent.objects, "bulk_create", side_effect=die_in_second_chunk):
+            with self.assertRaises(KeyboardInterrupt):
+                run_job(claim_next_job(), chunk_size=1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.processed, len(job.crop_ids)), (UploadJob.RUNNING, 1, 1))
+        self.assertEqual(len(self.cropped_files()), 1)
+
+        self.assertIsNone(claim_next_job())  # its heartbeat is still fresh
+        stale = timezone.now() - timedelta(seconds=settings.QUESTION_UPLOAD_JOB_TIMEOUT + 1)
+        UploadJob.objects.filter(pk=job.pk).update(heartbeat_at=stale)
+        reclaimed = claim_next_job()
+        self.assertEqual((reclaimed.pk, reclaimed.processed, reclaimed.crop_ids), (job.pk, 0, []))
+        self.assertFalse(CroppedImage.objects.exists())
+
+        job = run_job(reclaimed, chunk_size=1)
+        self.assertEqual((job.status, job.processed), (UploadJob.SUCCEEDED, 2))
+        self.assertEqual(sorted(CroppedImage.objects.values_list("pk", flat=True)), sorted(job.crop_ids))
+        self.assertEqual(len(self.cropped_files()), 2)
+
+    def test_worker_stops_writing_a_job_claimed_by_another(self):
+        self.enqueue()
+        job = claim_next_job()
+        # Another worker claimed it again meanwhile.
+        UploadJob.objects.filter(pk=job.pk).update(started_at=timezone.now() + timedelta(seconds=1))
+        with self.assertRaises(JobReclaimed):
+            run_job(job, chunk_size=1)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.processed, job.crop_ids), (UploadJob.RUNNING, 0, []))
+        self.assertFalse(CroppedImage.objects.exists())
+        self.assertEqual(self.cropped_files(), [])
+        self.assertTrue(all(default_storage.exists(name) for name in job.files.values()))
+
+
+class ImageMetadataTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def upload_pair(self):
+        items = [
+            {"classId": "Class 10", "subjectId": "Physics", "chapterId": "Optics", "imageType": "Question", "groupKey": "g"},
+            {"groupKey": "g", "groupIndex": 2},
+        ]
+        files = {"image_0": png_upload("0.png", size=(40, 10)), "image_1": png_upload("1.png", size=(12, 30))}
+        response = self.client.post("/api/upload-crop-bulk/", {"items": json.dumps(items), **files})
+        self.assertEqual(response.status_code, 201, response.data)
+        return CroppedImage.objects.get(), response
+
+    def test_upload_records_metadata(self):
+        crop, response = self.upload_pair()
+        extra = crop.extra_images.get()
+        self.assertEqual((crop.width, crop.height, crop.image_format), (40, 10, "png"))
+        self.assertEqual((extra.width, extra.height), (12, 30))
+        with crop.image.open("rb") as fp:
+            self.assertEqual((crop.sha256, crop.byte_size), (hashlib.sha256(fp.read()).hexdigest(), crop.image.size))
+        self.assertEqual(response.data[0]["sha256"], crop.sha256)
+        header, data = crop.placeholder.split(",", 1)
+        self.assertTrue(header.startswith("data:image/") and header.endswith(";base64"))
+        with Image.open(io.BytesIO(base64.b64decode(data))) as thumb:
+            self.assertEqual(thumb.size, (20, 5))
+
+        listed = self.client.get("/api/cropped-images/").data["results"][0]
+        self.assertEqual((listed["width"], listed["extra_images"][0]["height"]), (40, 30))
+        self.assertEqual(listed["placeholder"], crop.placeholder)
+
+    def test_backfill_fills_rows_without_metadata(self):
+        crop, _ = self.upload_pair()
+        blank = {
+            "width": None, "height": None, "byte_size": None, "image_format": "",
+            "sha256": "", "placeholder": "",
+        }
+        CroppedImage.objects.update(**blank)
+        CroppedImageExtra.objects.update(**blank)
+        gone = CroppedImage.objects.create(
+            image="cropped/gone.png", image_type=crop.image_type, class_name=crop.class_name,
+            subject=crop.subject, chapter=crop.chapter,
+        )
+
+        out = io.StringIO()
+        call_command("backfill_image_metadata", workers=1, stdout=out)
+        self.assertIn("CroppedImage: 1 filled, 1 files missing.", out.getvalue())
+        refreshed = CroppedImage.objects.get(pk=crop.pk)
+        self.assertEqual(
+            (refreshed.width, refreshed.sha256, refreshed.placeholder), (40, crop.sha256, crop.placeholder)
+        )
+        self.assertEqual(CroppedImageExtra.objects.get().width, 12)
+        self.assertEqual(CroppedImage.objects.get(pk=gone.pk).sha256, "")
+
+
+class ResumableUploadTests(TestCase):
+    def setUp(self):
+        self.media_root, session_dir = tempfile.mkdtemp(), tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.addCleanup(shutil.rmtree, session_dir, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root, QUESTION_UPLOAD_SESSION_DIR=session_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def patch(self, url, offset, data):
+        return self.client.patch(
+            url, data, content_type=resumable.CONTENT_TYPE, headers={"Upload-Offset": str(offset)}
+        )
+
+    def test_resumed_upload_feeds_bulk_item(self):
+        content = png_upload("q.png").read()
+        response = self.client.post(
+            "/api/uploads/",
+            headers={"Upload-Length": str(len(content)), "Upload-Metadata": "filename cS5wbmc="},
+        )
+        self.assertEqual(response.status_code, 201)
+        url = response["Location"]
+
+        self.assertEqual(self.patch(url, 0, content[:10]).status_code, 204)
+        self.assertEqual(self.patch(url, 0, content[:10]).status_code, 409)
+        self.assertEqual(self.client.head(url)["Upload-Offset"], "10")
+        items = [{
+            "classId": "Class 10", "subjectId": "Physics", "chapterId": "Optics", "imageType": "Question",
+            "uploadId": response.data["id"],
+        }]
+        incomplete = self.client.post("/api/upload-crop-bulk/", {"items": json.dumps(items)})
+        self.assertEqual(incomplete.status_code, 400)
+        self.assertIn("incomplete", str(incomplete.data["items"]))
+
+        self.assertEqual(self.patch(url, 10, content[10:])["Upload-Offset"], str(len(content)))
+        created = self.client.post("/api/upload-crop-bulk/", {"items": json.dumps(items)})
+        self.assertEqual(created.status_code, 201, created.data)
+        crop = CroppedImage.objects.get()
+        self.assertTrue(crop.image.name.endswith(".png"))
+        self.assertEqual(crop.image.read(), content)
+        self.assertEqual(self.client.head(url).status_code, 404)
+
+    def test_expired_uploads_are_purged(self):
+        upload = resumable.create(3)
+        self.assertEqual(resumable.purge_expired(now=time.time()), 0)
+        self.assertEqual(resumable.purge_expired(now=upload["expires"] + 1), 1)
+        self.assertEqual(os.listdir(resumable.session_dir()), [])
+
+    def test_orphaned_part_and_tmp_files_are_purged(self):
+        live = resumable.create(3)
+        orphans = [os.path.join(resumable.session_dir(), name) for name in (f"{uuid.uuid4().hex}.part", "x.tmp")]
+        for path in orphans:
+            open(path, "wb").close()
+        self.assertEqual(resumable.purge_expired(), 0)
+        self.assertEqual(len(os.listdir(resumable.session_dir())), 4)  # too young to be abandoned
+
+        self.assertEqual(resumable.purge_expired(now=time.time() + resumable.ORPHAN_AGE + 1), 0)
+        left = sorted(os.listdir(resumable.session_dir()))
+        self.assertEqual(left, [f"{live['id'].hex}.json", f"{live['id'].hex}.part"])
+
+    def test_concurrent_patch_of_one_upload_gets_409(self):
+        url = self.client.post("/api/uploads/", headers={"Upload-Length": "6"})["Location"]
+        upload_id = url.rstrip("/").rsplit("/", 1)[1]
+        with open(resumable._paths(upload_id)[0], "rb") as part:
+            fcntl.flock(part, fcntl.LOCK_EX)  # a PATCH still writing
+            busy = self.patch(url, 0, b"abc")
+        self.assertEqual(busy.status_code, 409)
+        self.assertIn("Another request", busy.data["detail"])
+        self.assertEqual(self.patch(url, 0, b"abc").status_code, 204)
+
+
+class IdempotencyKeyTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def upload(self, key, chapter="Optics"):
+        data = {"classId": "Class 10", "subjectId": "Physics", "chapterId": chapter, "imageType": "Question"}
+        return self.client.post(
+            "/api/upload-crop/", {**data, "image": png_upload("q.png")}, headers={"Idempotency-Key": key}
+        )
+
+    def test_retry_replays_first_response(self):
+        first = self.upload("k1")
+        self.assertEqual(first.status_code, 201, first.data)
+        retry = self.upload("k1")
+
+        self.assertEqual((retry.status_code, retry.data), (201, first.data))
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(CroppedImage.objects.count(), 1)
+        self.assertEqual(len(os.listdir(os.path.join(self.media_root, "cropped"))), 1)
+        self.assertEqual(self.upload("k1", chapter="Lenses").status_code, 422)
+        self.assertEqual(self.upload("k2").status_code, 201)
+
+    def test_failed_request_releases_key(self):
+        self.client.post("/api/upload-crop/", {"classId": "Class 10"}, headers={"Idempotency-Key": "k"})
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.assertEqual(self.upload("k").status_code, 201)
+
+
+class GroupCommitTests(TransactionTestCase):
+    def test_concurrent_calls_commit_together_with_own_results(self):
+        batcher = GroupCommit(window=0.2, max_batch=10)
+        results = {}
+
+        def create(i):
+            if i == 2:
+                ClassName.objects.create(name="Rolled back")
+                raise ValueError("bad item")
+            return ClassName.objects.create(name=f"Class {i}"), threading.get_ident()
+
+        def request(i):
+            try:
+                results[i] = batcher.run(lambda: create(i))
+            except ValueError as exc:
+                results[i] = exc
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=request, args=(i,)) for i in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertIsInstance(results.pop(2), ValueError)
+        self.assertEqual({i: row.name for i, (row, _) in results.items()}, {i: f"Class {i}" for i in (0, 1, 3, 4)})
+        self.assertEqual(len({leader for _, leader in results.values()}), 1)
+        self.assertEqual(sorted(ClassName.objects.values_list("name", flat=True)), [f"Class {i}" for i in (0, 1, 3, 4)])
+
+    @override_settings(QUESTION_GROUP_COMMIT={"window_ms": 1})
+    def test_upload_crop_through_group_commit(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        data = {"classId": "Class 10", "subjectId": "Physics", "chapterId": "Optics", "imageType": "Question"}
+        with override_settings(MEDIA_ROOT=media_root):
+            created = self.client.post("/api/upload-crop/", {**data, "image": png_upload("q.png")})
+            invalid = self.client.post("/api/upload-crop/", data)
+        self.assertEqual((created.status_code, invalid.status_code), (201, 400))
+        self.assertEqual(CroppedImage.objects.get().pk, created.data["id"])
+
+    def test_rolled_back_crop_keeps_its_upload_and_drops_its_file(self):
+        media_root, session_dir = tempfile.mkdtemp(), tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.addCleanup(shutil.rmtree, session_dir, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root, QUESTION_UPLOAD_SESSION_DIR=session_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        content = png_upload("q.png").read()
+        upload_id = resumable.create(len(content), {"filename": "q.png"})["id"]
+        resumable.append(upload_id, 0, io.BytesIO(content))
+        batcher = GroupCommit(window=0)
+
+        def create_crop(usage):
+            payload = {
+                "class_name": "Class 10",
+                "subject": "Physics",
+                "chapter": "Optics",
+                "image_type": "Question",
+                "usage_type": usage,
+                "image": resumable.open_upload(upload_id),
+            }
+            return batcher.run(lambda: UploadCrop().create_crop(payload, upload_id))
+
+        # The crop is saved, then its savepoint rolls back on the unknown usage type id.
+        with self.assertRaises(UsageType.DoesNotExist):
+            create_crop(999)
+        self.assertFalse(CroppedImage.objects.exists())
+        self.assertEqual(os.listdir(os.path.join(media_root, "cropped")), [])
+        self.assertEqual(resumable.get(upload_id)["offset"], len(content))
+
+        self.assertEqual(create_crop("Exam").status_code, 201)
+        self.assertEqual(CroppedImage.objects.get().image.read(), content)
+        with self.assertRaises(NotFound):
+            resumable.get(upload_id)
+
+
+class PerformanceMiddlewareTests(TestCase):
+    def test_server_timing_and_perf_log(self):
+        ClassName.objects.create(name="Class 10")
+        with self.assertLogs("question.perf", "INFO") as logs:
+            response = self.client.get("/api/classes/", headers={"Origin": "http://localhost:5173"})
+
+        timing = dict(entry.split(";", 1) for entry in response["Server-Timing"].split(", "))
+        self.assertRegex(timing["total"], r"^dur=\d+\.\d$")
+        self.assertRegex(timing["db"], r'^dur=\d+\.\d;desc="1 queries"$')
+        self.assertIn("serializer", timing)
+        self.assertEqual(response["Timing-Allow-Origin"], "http://localhost:5173")
+
+        [record] = logs.records
+        self.assertEqual(json.loads(record.getMessage()), record.perf)
+        self.assertEqual(
+            {k: record.perf[k] for k in ("method", "path", "route", "status", "queries")},
+            {"method": "GET", "path": "/api/classes/", "route": "api/classes/", "status": 200, "queries": 1},
+        )
+
+    def test_perf_log_is_off_by_default(self):
+        self.assertFalse(logging.getLogger("question.perf").isEnabledFor(logging.INFO))
+
+
+class MetricsTests(SimpleTestCase):
+    def test_exited_threads_fold_into_base(self):
+        counter = Counter("question_test_threads_total", "Test counter.")
+        self.addCleanup(REGISTRY.metrics.pop, counter.name)
+        for _ in range(20):
+            thread = threading.Thread(target=counter.inc)
+            thread.start()
+            thread.join()
+        counter.inc()
+
+        self.assertLessEqual(len(counter._shards), 2)
+        self.assertEqual(counter.collect(), {(): 21})
+        self.assertEqual(list(counter._shards), [threading.current_thread()])
+
+    def test_snapshots_of_exited_processes_are_archived(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        meta = {"help": "Test.", "labelnames": [], "buckets": []}
+        snapshot = {
+            "question_dead_total": {"type": "counter", **meta, "values": {"[]": 5}},
+            "question_dead_gauge": {"type": "gauge", **meta, "values": {"[]": 1}},
+        }
+        # A pid that cannot exist, and a live pid whose start time is not the file's (reused).
+        for name in ("999999999-1.json", f"{os.getppid()}-1.json"):
+            with open(os.path.join(directory, name), "w") as fh:
+                json.dump(snapshot, fh)
+
+        with override_settings(QUESTION_METRICS_DIR=directory):
+            for _ in range(2):
+                text = REGISTRY.exposition()
+                self.assertIn("question_dead_total 10\n", text)
+                self.assertNotIn("question_dead_gauge", text)
+        self.assertEqual(sorted(os.listdir(directory)), [".lock", "archive.json"])
+
+
+def _busy_wait(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+class ProfilingTests(TestCase):
+    def setUp(self):
+        self.profile_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.profile_dir, ignore_errors=True)
+        settings_override = override_settings(QUESTION_PROFILE_DIR=self.profile_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_stack_sampler_collapses_stacks(self):
+        with StackSampler(threading.get_ident(), 0.001) as sampler:
+            _busy_wait(0.05)
+        path = os.path.join(self.profile_dir, "out.collapsed")
+        sampler.write_collapsed(path)
+
+        with open(path) as fh:
+            lines = fh.read().splitlines()
+        self.assertTrue(lines)
+        _, count = lines[0].rsplit(" ", 1)
+        self.assertGreater(int(count), 0)
+        self.assertTrue(any("_busy_wait (tests.py:" in line for line in lines))
+        self.assertTrue(all(";" in line for line in lines))
+
+    def test_only_staff_requests_are_profiled(self):
+        user = User.objects.create_user("reviewer", password="x")
+        self.client.force_login(user)
+        self.assertNotIn("X-Profile-Id", self.client.get("/api/classes/", headers={"X-Profile": "1"}))
+
+        user.is_staff = True
+        user.save()
+        self.assertNotIn("X-Profile-Id", self.client.get("/api/classes/"))
+        self.assertEqual(os.listdir(self.profile_dir), [])
+
+        name = self.client.get("/api/classes/?profile=1")["X-Profile-Id"]
+        self.assertEqual(sorted(os.listdir(self.profile_dir)), [f"{name}.collapsed", f"{name}.prof"])
+        pstats.Stats(os.path.join(self.profile_dir, f"{name}.prof"))
+
+    def test_a_taken_profiler_falls_back_to_sampling(self):
+        # Up to 3.11 one cProfile per thread; from 3.12 one per process.
+        for per_thread in (True, False):
+            with self.subTest(per_thread=per_thread), mock.patch.object(profiling, "_PROFILER_PER_THREAD", per_thread):
+                first = ProfileSession(self.profile_dir, f"first-{per_thread}", 0.001)
+                second = ProfileSession(self.profile_dir, f"second-{per_thread}", 0.001)
+                other_thread = []
+
+                def run_in_other_thread():
+                    second.start_thread()
+                    other_thread.append(second._threads[threading.get_ident()][0])
+                    second.stop_thread()
+
+                self.assertTrue(first.start_thread())
+                # A concurrent profiled request on the same thread, as on ASGI's event loop.
+                self.assertTrue(second.start_thread())
+                thread = threading.Thread(target=run_in_other_thread)
+                thread.start()
+                thread.join()
+                _busy_wait(0.02)
+                second.stop_thread()
+                first.stop_thread()
+                first.write()
+                second.write()
+
+                self.assertIsNone(second._threads[threading.get_ident()][0])
+                self.assertEqual(other_thread[0] is not None, per_thread)
+                self.assertIn(f"first-{per_thread}.prof", os.listdir(self.profile_dir))
+                with open(os.path.join(self.profile_dir, f"second-{per_thread}.collapsed")) as fh:
+                    self.assertIn("_busy_wait (tests.py:", fh.read())
+                self.assertEqual(profiling._profilers_busy, set())
+
+    def stats(self, name):
+        return pstats.Stats(os.path.join(self.profile_dir, f"{name}.prof")).stats
+
+    def assertProfiled(self, name, view_method):
+        functions = {(path, line, func) for path, line, func in self.stats(name)}
+        code = view_method.__code__
+        self.assertIn((code.co_filename, code.co_firstlineno, code.co_name), functions)
+
+    def staff(self):
+        return User.objects.create_user("reviewer", password="x", is_staff=True)
+
+    def test_async_view_under_wsgi_profiles_its_event_loop_thread(self):
+        self.client.force_login(self.staff())
+        name = self.client.get("/api/classes/?profile=1")["X-Profile-Id"]
+        self.assertProfiled(name, ClassList.get)
+
+    async def test_asgi_profiles_the_threads_running_the_view(self):
+        await self.async_client.aforce_login(await sync_to_async(self.staff)())
+        # A sync view, run by Django in the request's sync thread.
+        name = (await self.async_client.get("/api/jobs/999/?profile=1"))["X-Profile-Id"]
+        self.assertProfiled(name, UploadJobDetail.get)
+
+        # An async handler on the event loop, and the queries it awaits in the sync thread.
+        name = (await self.async_client.get("/api/classes/?profile=1"))["X-Profile-Id"]
+        self.assertProfiled(name, ClassList.get)
+        self.assertTrue(any(func == "execute" and "sqlite3" in path for path, _, func in self.stats(name)))
+
+
+class LoggingTests(SimpleTestCase):
+    def record(self, level=logging.INFO, msg="hello"):
+        return logging.LogRecord("question.test", level, __file__, 1, msg, None, None)
+
+    def test_non_blocking_handler_starts_listener_on_first_record(self):
+        handler = NonBlockingHandler(maxsize=10)
+        handler.setFormatter(logging.Formatter("%(levelname)s %(message)s"))
+        handler.target.setStream(io.StringIO())
+        self.assertIsNone(handler.listener)
+
+        handler.handle(self.record())
+        self.assertIsNotNone(handler.listener._thread)
+        stream = handler.target.stream
+        handler.close()  # drains the queue
+        self.assertEqual(stream.getvalue(), "INFO hello\n")
+
+    def test_full_queue_drops_and_counts(self):
+        handler = NonBlockingHandler(maxsize=1)
+        handler._listener_pid = os.getpid()  # as if started, but nothing drains the queue
+        before = DROPPED.collect().get((), 0)
+        for _ in range(3):
+            handler.handle(self.record())
+        self.assertEqual(DROPPED.collect().get((), 0) - before, 2)
+        self.assertEqual(handler.queue.qsize(), 1)
+
+    def test_sampling_filter(self):
+        self.assertTrue(SamplingFilter(rate=1).filter(self.record()))
+        never = SamplingFilter(rate=0)
+        self.assertFalse(never.filter(self.record()))
+        self.assertTrue(never.filter(self.record(logging.WARNING)))
+
+        random.seed(0)
+        kept = sum(SamplingFilter(rate=0.25).filter(self.record()) for _ in range(2000))
+        self.assertTrue(400 < kept < 600, kept)
+
+
+class SlowQueryLogTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        class_name = ClassName.objects.create(name="Class 10")
+        Chapter.objects.create(name="Optics", class_name=class_name, subject=Subject.objects.create(name="Physics"))
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.log_path = os.path.join(directory, "slow.jsonl")
+
+    def get_chapters(self, **settings):
+        with override_settings(QUESTION_SLOW_QUERY_LOG=self.log_path, **settings):
+            return self.client.get("/api/chapters/", {"class": "Class 10"})
+
+    def test_off_by_default_and_below_threshold(self):
+        with self.assertNoLogs("question.slow_query"):
+            self.get_chapters()
+            self.get_chapters(QUESTION_SLOW_QUERY_MS=0)
+            self.get_chapters(QUESTION_SLOW_QUERY_MS=60_000)
+        self.assertFalse(os.path.exists(self.log_path))
+
+    def test_records_plan_and_redacted_params(self):
+        with self.assertLogs("question.slow_query", "WARNING"):
+            self.get_chapters(QUESTION_SLOW_QUERY_MS=1e-9)
+        with open(self.log_path) as fh:
+            entries = [json.loads(line) for line in fh]
+        entry = next(e for e in entries if "question_chapter" in e["sql"] and e["sql"].startswith("SELECT"))
+        self.assertEqual(entry["view"], "ChapterList")
+        self.assertEqual(entry["path"], "/api/chapters/")
+        self.assertIn("<str, 8 chars>", entry["params"])
+        self.assertNotIn("Class 10", json.dumps(entry))
+        self.assertTrue(any(step.startswith(("SEARCH", "SCAN")) for step in entry["plan"]))
+
+        with self.assertLogs("question.slow_query", "WARNING"):
+            self.get_chapters(QUESTION_SLOW_QUERY_MS=1e-9, QUESTION_SLOW_QUERY_PARAMS=True)
+        with open(self.log_path) as fh:
+            self.assertIn("Class 10", fh.read())
+
+    def test_async_view_queries_are_attributed_to_the_view(self):
+        with self.assertLogs("question.slow_query", "WARNING"):
+            self.get_chapters(QUESTION_SLOW_QUERY_MS=1e-9)
+            with override_settings(QUESTION_SLOW_QUERY_LOG=self.log_path, QUESTION_SLOW_QUERY_MS=1e-9):
+                self.client.get("/api/cropped-images/", {"page_size": 1})
+        with open(self.log_path) as fh:
+            entries = [json.loads(line) for line in fh]
+        sites = {e["call_site"] for e in entries if e["view"] in ("ChapterList", "CroppedImageList")}
+        self.assertNotIn(None, sites)
+        self.assertFalse([s for s in sites if "middleware.py" in s])
+
+        # _alist queries get the origin the view passes, also when run as a
+        # task by asyncio.gather; other awaited queries get the handler.
+        _, handler_line = inspect.getsourcelines(CroppedImageList.get)
+        chapters = next(e for e in entries if e["view"] == "ChapterList" and "question_chapter" in e["sql"])
+        self.assertEqual(chapters["call_site"], "ChapterList.get")
+        page = next(e for e in entries if e["view"] == "CroppedImageList" and "LIMIT" in e["sql"])
+        self.assertEqual(page["call_site"], "CroppedImageList.get")
+        count = next(e for e in entries if e["view"] == "CroppedImageList" and "COUNT(" in e["sql"])
+        self.assertEqual(count["call_site"], f"question/views.py:{handler_line} (get)")
+
+    def test_slow_queries_command_summarizes_by_fingerprint(self):
+        with self.assertLogs("question.slow_query", "WARNING"):
+            for _ in range(2):
+                self.get_chapters(QUESTION_SLOW_QUERY_MS=1e-9)
+        with open(self.log_path) as fh:
+            fingerprints = {json.loads(line)["fingerprint"] for line in fh}
+
+        out = io.StringIO()
+        call_command("slow_queries", file=self.log_path, json=True, stdout=out)
+        summary = json.loads(out.getvalue())
+        self.assertEqual({s["fingerprint"] for s in summary}, fingerprints)
+        self.assertTrue(all(s["count"] == 2 and s["views"] == {"ChapterList": 2} for s in summary))
+
+        out = io.StringIO()
+        call_command("slow_queries", file=self.log_path, top=1, sort="count", stdout=out)
+        text = out.getvalue()
+        self.assertRegex(text, r"#1 \[[0-9a-f]{12}\] 2x")
+        self.assertIn("views: ChapterList (2)", text)
+        self.assertNotIn("#2 ", text)
+
+
+class WriteQueueTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.path = os.path.join(directory, "queue.sqlite3")
+        self.queue = write_queue(self.path)
+        db = self.wrapper()
+        db.cursor().execute("CREATE TABLE item (n INTEGER)")
+        db.close()
+
+    def connect(self, **options):
+        settings_dict = {
+            **connection.settings_dict,
+            "NAME": self.path,
+            "OPTIONS": {"transaction_mode": "IMMEDIATE", "timeout": 5, **options},
+        }
+        return SQLiteQueueWrapper(settings_dict, alias="write-queue-test")
+
+    def wrapper(self, **options):
+        db = self.connect(**options)
+        self.addCleanup(db.close)
+        return db
+
+    def begin(self, db):
+        # What atomic() does on SQLite.
+        db.set_autocommit(False, force_begin_transaction_with_broken_autocommit=True)
+
+    def rows(self):
+        with sqlite3.connect(self.path) as db:
+            return [n for (n,) in db.execute("SELECT n FROM item ORDER BY rowid")]
+
+    def test_writers_get_their_turn_in_order(self):
+        self.assertTrue(self.queue.acquire(timeout=0))
+
+        def insert(n):
+            db = self.connect()
+            db.cursor().execute("INSERT INTO item VALUES (%s)", [n])
+            db.close()
+
+        threads = []
+        for n in range(5):
+            threads.append(threading.Thread(target=insert, args=(n,)))
+            threads[-1].start()
+            while len(self.queue._waiters) < n + 1:
+                time.sleep(0.001)
+        self.queue.release()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.rows(), [0, 1, 2, 3, 4])
+        self.assertFalse(self.queue._held)
+
+    def test_queue_timeout_raises_operational_error(self):
+        self.assertTrue(self.queue.acquire(timeout=0))
+        self.addCleanup(self.queue.release)
+        db = self.wrapper(timeout=0.01)
+        with self.assertRaisesMessage(OperationalError, "timed out in the write queue"):
+            db.cursor().execute("INSERT INTO item VALUES (1)")
+        self.assertEqual(self.queue._waiters, deque())
+
+    def test_immediate_transaction_holds_turn_until_it_ends(self):
+        db = self.wrapper()
+        for end in (db.commit, db.rollback):
+            with self.subTest(end=end.__name__):
+                self.begin(db)
+                self.assertTrue(db.holds_write_turn)
+                db.cursor().execute("INSERT INTO item VALUES (1)")
+                self.assertFalse(self.queue.acquire(timeout=0))
+                end()
+                self.assertFalse(db.holds_write_turn)
+                self.assertTrue(self.queue.acquire(timeout=0))
+                self.queue.release()
+                db.set_autocommit(True)
+        self.assertEqual(self.rows(), [1])
+
+    def test_close_after_error_releases_turn(self):
+        db = self.wrapper()
+        self.begin(db)
+        with self.assertRaises(OperationalError):
+            db.cursor().execute("INSERT INTO missing VALUES (1)")
+        self.assertTrue(db.holds_write_turn)
+        db.close()
+        self.assertFalse(db.holds_write_turn)
+        self.assertFalse(self.queue._held)
+
+    def test_serialize_writes_false_bypasses_queue(self):
+        self.assertTrue(self.queue.acquire(timeout=0))
+        self.addCleanup(self.queue.release)
+        db = self.wrapper(serialize_writes=False, timeout=0.01)
+        db.cursor().execute("INSERT INTO item VALUES (7)")
+        self.begin(db)
+        self.assertFalse(db.holds_write_turn)
+        db.rollback()
+        self.assertEqual(self.rows(), [7])
+
+
+class AdmissionControlTests(SimpleTestCase):
+    def test_waiters_get_slots_in_order_until_queue_is_full(self):
+        limit = Limiter("test", slots=1, queue=1, timeout=5)
+        self.assertIsNone(limit.acquire())
+        outcome = []
+        waiter = threading.Thread(target=lambda: outcome.append(limit.acquire()))
+        waiter.start()
+        while not limit._waiters:
+            time.sleep(0.001)
+
+        self.assertEqual(limit.acquire(), admission.QUEUE_FULL)
+        limit.release()
+        waiter.join()
+        self.assertEqual(outcome, [None])
+        self.assertEqual(limit._free, 0)  # handed over, not returned to the pool
+
+    def test_wait_times_out(self):
+        limit = Limiter("test", slots=1, queue=1, timeout=0.01)
+        limit.acquire()
+        self.assertEqual(limit.acquire(), admission.TIMEOUT)
+        self.assertEqual(limit._waiters, deque())
+
+    @override_settings(QUESTION_ADMISSION={"UploadCropBulk": {"slots": 1, "queue": 0}})
+    def test_saturated_endpoint_answers_429(self):
+        limit = admission.limiter("UploadCropBulk")
+        limit.acquire()
+        self.addCleanup(limit.release)
+        response = self.client.post("/api/upload-crop-bulk/", {"items": "[]"})
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response["Retry-After"]), 1)
+
+
+@override_settings(QUESTION_READ_REPLICAS=["replica1"], QUESTION_REPLICA_STICKY_SECONDS=5)
+class ReplicaRoutingTests(SimpleTestCase):
+    def route(self, method, view, headers=None, cookies=None):
+        """(alias the view's reads go to, response) for one request through ReadReplicaMiddleware."""
+        factory = RequestFactory()
+        for name, value in (cookies or {}).items():
+            factory.cookies[name] = value
+        request = getattr(factory, method)("/", headers=headers or {})
+        seen = {}
+
+        def get_response(request):
+            middleware.process_view(request, view.as_view(), (), {})
+            seen["db"] = router.db_for_read(CroppedImage)
+            return HttpResponse(status=201 if method == "post" else 200)
+
+        middleware = ReadReplicaMiddleware(get_response)
+        response = middleware(request)
+        self.assertEqual(router.db_for_read(CroppedImage), "default")  # reset after the request
+        return seen["db"], response
+
+    def test_list_reads_go_to_replica(self):
+        self.assertEqual(self.route("get", CroppedImageList)[0], "replica1")
+        self.assertEqual(self.route("get", CroppedImageDetail)[0], "default")
+        self.assertEqual(self.route("post", ClassList)[0], "default")
+
+    def test_reads_stick_to_primary_after_a_write(self):
+        _, response = self.route("post", ClassList)
+        stamp = response.cookies[LAST_WRITE_COOKIE].value
+        self.assertEqual(response["X-Last-Write"], stamp)
+
+        self.assertEqual(self.route("get", CroppedImageList, cookies={LAST_WRITE_COOKIE: stamp})[0], "default")
+        self.assertEqual(self.route("get", CroppedImageList, headers={"X-Last-Write": stamp})[0], "default")
+        stale = str(time.time() - 60)
+        self.assertEqual(self.route("get", CroppedImageList, cookies={LAST_WRITE_COOKIE: stale})[0], "replica1")
+
+    def test_copy_database_keeps_replica_in_step(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        primary, replica = os.path.join(directory, "primary.sqlite3"), os.path.join(directory, "replica.sqlite3")
+        with sqlite3.connect(primary) as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("CREATE TABLE item (name TEXT)")
+            db.execute("INSERT INTO item VALUES ('first')")
+
+        copy_database(primary, replica)
+        with sqlite3.connect(primary) as db:
+            db.execute("INSERT INTO item VALUES ('second')")
+        copy_database(primary, replica)
+
+        with sqlite3.connect(replica) as db:
+            self.assertEqual(db.execute("SELECT name FROM item ORDER BY rowid").fetchall(), [("first",), ("second",)])
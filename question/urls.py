@@ -10,8 +10,10 @@ from .views import (
     ConceptDetail,
     ConceptList,
     CroppedImageDetail,
+    CroppedImageExport,
     CroppedImageList,
     ImageTypeList,
+    MetricsView,
     QuestionTypeList,
     SourcesList,
     SubjectBulk,
@@ -22,12 +24,20 @@ from .views import (
     TopicList,
     UploadCrop,
     UploadCropBulk,
+    UploadJobDetail,
+    UploadJobEvents,
+    UploadSessionDetail,
+    UploadSessionList,
     UsageTypeList,
 )
 
 urlpatterns = [
     path("api/upload-crop/", UploadCrop.as_view()),
     path("api/upload-crop-bulk/", UploadCropBulk.as_view()),
+    path("api/jobs/<int:pk>/", UploadJobDetail.as_view()),
+    path("api/jobs/<int:pk>/events/", UploadJobEvents.as_view()),
+    path("api/uploads/", UploadSessionList.as_view()),
+    path("api/uploads/<uuid:upload_id>/", UploadSessionDetail.as_view()),
     path("api/classes/", ClassList.as_view()),
     path("api/classes/bulk/", ClassBulk.as_view()),
     path("api/classes/<int:pk>/", ClassDetail.as_view()),
@@ -48,5 +58,7 @@ urlpatterns = [
     path("api/usage-types/", UsageTypeList.as_view()),
     path("api/sources/", SourcesList.as_view()),
     path("api/cropped-images/", CroppedImageList.as_view()),
+    path("api/cropped-images/export/", CroppedImageExport.as_view()),
     path("api/cropped-images/<int:pk>/", CroppedImageDetail.as_view()),
+    path("metrics/", MetricsView.as_view()),
 ]
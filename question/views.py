@@ -2,12 +2,24 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.exceptions import ValidationError
+from rest_framework.exceptions import ParseError, UnsupportedMediaType, ValidationError
 from rest_framework.parsers import MultiPartParser, FormParser
+from django.conf import settings
 from django.db import transaction
-from django.core.files.storage import default_storage
-from django.db.models import Max
+from django.db.models import Prefetch
+from django.http import HttpResponse, StreamingHttpResponse
 from django.db import IntegrityError
+from django.core.files.storage import default_storage
+from django.core.handlers.asgi import ASGIRequest
+from . import events, export, groupcommit, querylog, resumable
+from .admission import admission_controlled
+from .asyncapi import AsyncAPIView
+from .bulk import BulkImport, enqueue, parse_items
+from .export import EXPORT_FORMATS
+from .filters import as_int, filter_cropped_images
+from .idempotency import idempotent
+from .log import preview
+from .metrics import BULK_ITEMS, CONTENT_TYPE as METRICS_CONTENT_TYPE, REGISTRY
 from .models import (
     Chapter,
     ClassName,
@@ -19,6 +31,7 @@ from .models import (
     Sources,
     Subject,
     Topic,
+    UploadJob,
     UsageType,
 )
 from .serializers import (
@@ -38,25 +51,44 @@ from .serializers import (
     SubjectWriteSerializer,
     TopicSerializer,
     TopicWriteSerializer,
+    UploadJobSerializer,
     UsageTypeSerializer,
 )
+import asyncio
 import json
+import logging
+
+logger = logging.getLogger("question.upload")
+
+
+async def _alist(qs, origin, chunk_size=2000):
+    """Evaluate ``qs`` with the async ORM, attributing its queries to ``origin`` in the slow query log.
+
+    The chunk size also bounds each prefetch_related batch.
+    """
+    with querylog.query_origin(origin):
+        return [obj async for obj in qs.aiterator(chunk_size=chunk_size)]
 
 
 class UploadCrop(APIView):
     # ensure multipart/form-data (files + fields) is parsed correctly
     parser_classes = (MultiPartParser, FormParser)
 
+    @admission_controlled
+    @idempotent
     def post(self, request):
         # Build a plain dict payload (not a QueryDict) so we can store
         # non-string values (like parsed JSON) without coercion.
         payload = {}
 
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "upload_crop fields %s",
+                json.dumps({k: preview(v) for k, v in request.data.items()}),
+            )
+
         # Copy scalar/form fields and attempt to parse JSON-encoded fields
         for k, v in request.data.items():
-            # log types for easier debugging
-            print(f"Received field {k}: type={type(v).__name__} repr={repr(v)[:200]}")
-
             if k in ("rectPdf", "rectScreen", "rect_pdf", "rect_screen") and isinstance(v, str):
                 try:
                     payload[k] = json.loads(v)
@@ -67,9 +99,17 @@ class UploadCrop(APIView):
 
             payload[k] = v
 
-        # Include uploaded file (if present) from request.FILES
+        # Include uploaded file (if present) from request.FILES,
+        # else a finished resumable upload named by uploadId
+        upload_id = None
         if "image" in request.FILES:
             payload["image"] = request.FILES.get("image")
+        elif resumable.upload_id_of(payload) is not None:
+            upload_id = resumable.upload_id_of(payload)
+            try:
+                payload["image"] = resumable.open_upload(upload_id)
+            except ValidationError as e:
+                return Response(e.detail, status=400)
 
         # ---- Field name normalization (frontend camelCase -> backend snake_case) ----
         rename_map = {
@@ -94,17 +134,18 @@ class UploadCrop(APIView):
         payload.pop("page_no", None)
         payload.pop("document_name", None)
 
-        # ---- Resolve / create related objects by ID or name ----
-        def _as_int(val):
-            try:
-                return int(val)
-            except (TypeError, ValueError):
-                return None
+        batcher = groupcommit.batcher()
+        if batcher is None:
+            return self.create_crop(payload, upload_id)
+        return batcher.run(lambda: self.create_crop(payload, upload_id))
 
+    def create_crop(self, payload, upload_id):
+        """Resolve taxonomy, then validate and save the crop: the part that may be group-committed."""
+        # ---- Resolve / create related objects by ID or name ----
         def _get_by_id_or_name(model, value, name_field="name"):
             if value is None:
                 return None
-            pk = _as_int(value)
+            pk = as_int(value)
             if pk is not None:
                 return model.objects.get(pk=pk)
             obj, _ = model.objects.get_or_create(**{name_field: str(value)})
@@ -117,7 +158,7 @@ class UploadCrop(APIView):
         chapter_val = payload.get("chapter")
         chapter_obj = None
         if chapter_val is not None and class_obj is not None and subject_obj is not None:
-            pk = _as_int(chapter_val)
+            pk = as_int(chapter_val)
             if pk is not None:
                 chapter_obj = Chapter.objects.get(pk=pk)
             else:
@@ -130,7 +171,7 @@ class UploadCrop(APIView):
         concept_val = payload.get("concept")
         concept_obj = None
         if concept_val is not None and chapter_obj is not None:
-            pk = _as_int(concept_val)
+            pk = as_int(concept_val)
             if pk is not None:
                 concept_obj = Concept.objects.get(pk=pk)
             else:
@@ -142,7 +183,7 @@ class UploadCrop(APIView):
         topic_val = payload.get("topic")
         topic_obj = None
         if topic_val is not None and concept_obj is not None:
-            pk = _as_int(topic_val)
+            pk = as_int(topic_val)
             if pk is not None:
                 topic_obj = Topic.objects.get(pk=pk)
             else:
@@ -178,15 +219,27 @@ class UploadCrop(APIView):
 
         serializer = CropSerializer(data=payload)
 
-        if serializer.is_valid():
-            cropped = serializer.save()
+        try:
+            valid = serializer.is_valid()
+            if valid:
+                cropped = serializer.save()
+                # Under group commit the row may still be rolled back with its batch.
+                groupcommit.on_rollback(lambda: default_storage.delete(cropped.image.name))
+        finally:
+            if upload_id is not None:
+                payload["image"].close()
+
+        if valid:
             if usage_value is not None:
                 usage_obj = _get_by_id_or_name(UsageType, usage_value)
                 if usage_obj is not None:
                     cropped.usage_types.add(usage_obj)
+            if upload_id is not None:
+                # Kept for a retry until the crop is committed.
+                transaction.on_commit(lambda: resumable.discard(upload_id))
             return Response(CropSerializer(cropped).data, status=201)
 
-        print("❌ Serializer errors:", serializer.errors)
+        logger.info("upload_crop invalid %s", preview(json.dumps(serializer.errors), limit=1000))
         return Response(serializer.errors, status=400)
 
 
@@ -195,252 +248,146 @@ class UploadCropBulk(APIView):
 
     Expects multipart/form-data with:
     - items: JSON array of metadata objects (one per image)
-    - image_0, image_1, ...: corresponding files
+    - image_0, image_1, ...: corresponding files, or an item's ``uploadId``
+      naming a finished resumable upload (see question.resumable)
 
     If any item fails validation or save, nothing is persisted.
+
+    With ``?async=1`` the files are only staged and the response is
+    202 with an UploadJob; ``manage.py upload_worker`` imports it and
+    ``/api/jobs/<id>/`` reports its progress, errors and result.
+
+    Retries that repeat the ``Idempotency-Key`` header get the first
+    response back (see question.idempotency). When QUESTION_ADMISSION's
+    slots and queue for this view are full the answer is 429 with
+    Retry-After (see question.admission).
     """
 
     parser_classes = (MultiPartParser, FormParser)
 
+    @admission_controlled
+    @idempotent
     def post(self, request):
-        items_raw = request.data.get("items")
-        if not items_raw:
-            return Response(
-                {"items": ["This field is required."]},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
-
         try:
-            items = json.loads(items_raw) if isinstance(items_raw, str) else items_raw
-        except json.JSONDecodeError:
-            return Response(
-                {"items": ["Invalid JSON."]},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
-
-        if not isinstance(items, list):
-            return Response(
-                {"items": ["Must be a JSON array."]},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
-
-        rename_map = {
-            "rectPdf": "rect_pdf",
-            "rectScreen": "rect_screen",
-            "usage": "usage_type",
-            "questionType": "question_type",
-            "imageType": "image_type",
-            "classId": "class_name",
-            "subjectId": "subject",
-            "chapterId": "chapter",
-            "conceptId": "concept",
-            "topicId": "topic",
-        }
-
-        def _as_int(val):
-            try:
-                return int(val)
-            except (TypeError, ValueError):
-                return None
-
-        def _get_by_id_or_name(model, value, name_field="name"):
-            if value is None:
-                return None
-            pk = _as_int(value)
-            if pk is not None:
-                return model.objects.get(pk=pk)
-            obj, _ = model.objects.get_or_create(**{name_field: str(value)})
-            return obj
-
-        created = []
-        created_extras = []
-        created_file_names = []
-        primary_by_group_key = {}
+            items = parse_items(request.data.get("items"))
+        except ValidationError as e:
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
+        BULK_ITEMS.observe(len(items), operation=type(self).__name__)
 
+        try:
+            with resumable.referenced_files(items, request.FILES) as (files, upload_ids):
+                response = self.upload(request, items, files)
+        except ValidationError as e:
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
+        # The uploads are in storage now; failed requests keep them for a retry.
+        if response.status_code < 300:
+            resumable.discard(*upload_ids)
+        return response
+
+    def upload(self, request, items, files):
+        if request.query_params.get("async") in ("1", "true"):
+            job = enqueue(items, files)
+            data = UploadJobSerializer(job).data
+            return Response(data, status=status.HTTP_202_ACCEPTED, headers={"Location": data["url"]})
+
+        bulk = BulkImport()
         try:
             with transaction.atomic():
                 for idx, item in enumerate(items):
-                    if not isinstance(item, dict):
-                        raise ValidationError({"items": {idx: "Each item must be an object."}})
-
-                    payload = dict(item)
-
-                    group_key = (
-                        payload.get("groupKey")
-                        or payload.get("group_key")
-                        or payload.get("questionGroup")
-                        or payload.get("question_group")
-                    )
-                    if group_key is None:
-                        group_key = f"__single__{idx}"
-
-                    # Attach file
-                    file_key = f"image_{idx}"
-                    upload_file = request.FILES.get(file_key)
-                    if not upload_file:
-                        raise ValidationError({"items": {idx: {file_key: "Missing file."}}})
-                    payload["image"] = upload_file
-
-                    # Parse JSON fields if needed
-                    for k in ("rectPdf", "rectScreen", "rect_pdf", "rect_screen"):
-                        if k in payload and isinstance(payload[k], str):
-                            try:
-                                payload[k] = json.loads(payload[k])
-                            except json.JSONDecodeError:
-                                pass
-
-                    # Normalize keys
-                    for src, dst in rename_map.items():
-                        if src in payload and dst not in payload:
-                            payload[dst] = payload.pop(src)
-
-                    # Drop removed fields if frontend still sends them
-                    payload.pop("pageNo", None)
-                    payload.pop("documentName", None)
-                    payload.pop("page_no", None)
-                    payload.pop("document_name", None)
-
-                    group_index_raw = payload.get("groupIndex") or payload.get("group_index")
-                    group_index = _as_int(group_index_raw)
-
-                    # If this group already has a primary CroppedImage, store this as an extra image.
-                    primary = primary_by_group_key.get(str(group_key))
-                    if primary is not None:
-                        # Extra images inherit question metadata from primary.
-                        extra_image_type_obj = None
-                        if payload.get("image_type") not in (None, ""):
-                            extra_image_type_obj = _get_by_id_or_name(ImageType, payload.get("image_type"))
-
-                        # Determine stable order within the group.
-                        # If frontend provides groupIndex (1=primary, 2..n=extras) we store it.
-                        # Otherwise we append after the last known extra.
-                        if group_index is None or group_index < 2:
-                            last = primary.extra_images.aggregate(m=Max("sort_order")).get("m")
-                            group_index = (last or 1) + 1
-
-                        extra = CroppedImageExtra.objects.create(
-                            parent=primary,
-                            image=payload["image"],
-                            image_type=extra_image_type_obj or primary.image_type,
-                            rect_pdf=payload.get("rect_pdf") or {},
-                            rect_screen=payload.get("rect_screen") or {},
-                            sort_order=group_index,
-                        )
-                        created_extras.append(extra)
-                        if getattr(extra.image, "name", None):
-                            created_file_names.append(extra.image.name)
-                        continue
-
-                    # Resolve taxonomy
-                    class_obj = _get_by_id_or_name(ClassName, payload.get("class_name"))
-                    subject_obj = _get_by_id_or_name(Subject, payload.get("subject"))
-
-                    chapter_val = payload.get("chapter")
-                    chapter_obj = None
-                    if chapter_val is not None and class_obj is not None and subject_obj is not None:
-                        pk = _as_int(chapter_val)
-                        if pk is not None:
-                            chapter_obj = Chapter.objects.get(pk=pk)
-                        else:
-                            chapter_obj, _ = Chapter.objects.get_or_create(
-                                name=str(chapter_val),
-                                class_name=class_obj,
-                                subject=subject_obj,
-                            )
-
-                    concept_val = payload.get("concept")
-                    concept_obj = None
-                    if concept_val is not None and chapter_obj is not None:
-                        pk = _as_int(concept_val)
-                        if pk is not None:
-                            concept_obj = Concept.objects.get(pk=pk)
-                        else:
-                            concept_obj, _ = Concept.objects.get_or_create(
-                                name=str(concept_val),
-                                chapter=chapter_obj,
-                            )
-
-                    topic_val = payload.get("topic")
-                    topic_obj = None
-                    if topic_val is not None and concept_obj is not None:
-                        pk = _as_int(topic_val)
-                        if pk is not None:
-                            topic_obj = Topic.objects.get(pk=pk)
-                        else:
-                            topic_obj, _ = Topic.objects.get_or_create(
-                                name=str(topic_val),
-                                concept=concept_obj,
-                            )
-
-                    question_type_obj = _get_by_id_or_name(QuestionType, payload.get("question_type"))
-                    image_type_obj = _get_by_id_or_name(ImageType, payload.get("image_type"))
-                    source_obj = _get_by_id_or_name(Sources, payload.get("source"))
-
-                    if class_obj is not None:
-                        payload["class_name"] = class_obj.pk
-                    if subject_obj is not None:
-                        payload["subject"] = subject_obj.pk
-                    if chapter_obj is not None:
-                        payload["chapter"] = chapter_obj.pk
-                    if concept_obj is not None:
-                        payload["concept"] = concept_obj.pk
-                    if topic_obj is not None:
-                        payload["topic"] = topic_obj.pk
-                    if question_type_obj is not None:
-                        payload["question_type"] = question_type_obj.pk
-                    if image_type_obj is not None:
-                        payload["image_type"] = image_type_obj.pk
-                    if source_obj is not None:
-                        payload["source"] = source_obj.pk
-
-                    usage_value = payload.pop("usage_type", None)
-
-                    # Not a model field on CroppedImage; used only for grouping.
-                    payload.pop("groupIndex", None)
-                    payload.pop("group_index", None)
-
-                    serializer = CropSerializer(data=payload)
-                    serializer.is_valid(raise_exception=True)
-                    cropped = serializer.save()
-                    created.append(cropped)
-                    if getattr(cropped.image, "name", None):
-                        created_file_names.append(cropped.image.name)
-
-                    primary_by_group_key[str(group_key)] = cropped
-
-                    if usage_value is not None:
-                        usage_obj = _get_by_id_or_name(UsageType, usage_value)
-                        if usage_obj is not None:
-                            cropped.usage_types.add(usage_obj)
+                    bulk.add(idx, item, files.get(f"image_{idx}"))
 
             # Backward-compatible response: still returns created primary crops.
             # Extras are linked and can be fetched via CroppedImageReadSerializer.
-            return Response(CropSerializer(created, many=True).data, status=201)
+            return Response(CropSerializer(bulk.created, many=True).data, status=201)
 
         except ValidationError as e:
             # Ensure no orphan files remain if storage wrote files before DB rollback
-            for name in created_file_names:
-                try:
-                    default_storage.delete(name)
-                except Exception:
-                    pass
+            bulk.delete_files()
             return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
-            for name in created_file_names:
-                try:
-                    default_storage.delete(name)
-                except Exception:
-                    pass
+            bulk.delete_files()
             return Response(
                 {"detail": "Upload failed."},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
 
 
-class ClassList(APIView):
-    def get(self, request):
+class UploadSessionList(APIView):
+    """Create a resumable upload (tus creation); see question.resumable."""
+
+    def post(self, request):
+        upload = resumable.create(
+            as_int(request.headers.get("Upload-Length")),
+            resumable.parse_metadata(request.headers.get("Upload-Metadata")),
+        )
+        data = resumable.describe(upload)
+        return Response(
+            data, status=status.HTTP_201_CREATED, headers={**resumable.headers(upload), "Location": data["url"]}
+        )
+
+    def options(self, request, *args, **kwargs):
+        response = super().options(request, *args, **kwargs)
+        response["Tus-Resumable"] = resumable.TUS_VERSION
+        response["Tus-Version"] = resumable.TUS_VERSION
+        response["Tus-Extension"] = resumable.TUS_EXTENSIONS
+        response["Tus-Max-Size"] = str(settings.QUESTION_UPLOAD_MAX_SIZE)
+        return response
+
+
+class UploadSessionDetail(APIView):
+    """HEAD/GET report the offset, PATCH appends bytes at it, DELETE abandons the upload."""
+
+    def get(self, request, upload_id):
+        upload = resumable.get(upload_id)
+        return Response(resumable.describe(upload), headers=resumable.headers(upload))
+
+    def patch(self, request, upload_id):
+        if request.content_type.split(";")[0].strip() != resumable.CONTENT_TYPE:
+            raise UnsupportedMediaType(request.content_type)
+        offset = as_int(request.headers.get("Upload-Offset"))
+        if offset is None:
+            raise ParseError("Upload-Offset must be an integer.")
+        upload = resumable.append(upload_id, offset, request.stream, as_int(request.headers.get("Content-Length")))
+        return Response(status=status.HTTP_204_NO_CONTENT, headers=resumable.headers(upload))
+
+    def delete(self, request, upload_id):
+        resumable.get(upload_id)
+        resumable.discard(upload_id)
+        return Response(status=status.HTTP_204_NO_CONTENT, headers={"Tus-Resumable": resumable.TUS_VERSION})
+
+
+class UploadJobDetail(APIView):
+    def get(self, request, pk):
+        try:
+            job = UploadJob.objects.get(pk=pk)
+        except UploadJob.DoesNotExist:
+            return Response({"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(UploadJobSerializer(job).data)
+
+
+class UploadJobEvents(AsyncAPIView):
+    """Progress of an upload job as Server-Sent Events (``text/event-stream``)."""
+
+    async def get(self, request, pk):
+        if not await UploadJob.objects.filter(pk=pk).aexists():
+            return Response({"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND)
+        last_id = as_int(request.headers.get("Last-Event-ID")) or 0
+        if isinstance(request._request, ASGIRequest):
+            body = events.astream(pk, last_id)
+        else:
+            body = events.stream(pk, last_id)
+        response = StreamingHttpResponse(body, content_type="text/event-stream")
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+
+class ClassList(AsyncAPIView):
+    read_replica = True
+
+    async def get(self, request):
         qs = ClassName.objects.all().order_by("name")
-        return Response(ClassNameSerializer(qs, many=True).data)
+        return Response(ClassNameSerializer(await _alist(qs, "ClassList.get"), many=True).data)
 
     def post(self, request):
         serializer = ClassNameWriteSerializer(data=request.data)
@@ -486,6 +433,7 @@ class ClassBulk(APIView):
 
         if not isinstance(create_items, list) or not isinstance(update_items, list) or not isinstance(delete_items, list):
             raise ValidationError({"detail": "create/update/delete must be arrays."})
+        BULK_ITEMS.observe(len(create_items) + len(update_items) + len(delete_items), operation=type(self).__name__)
 
         created = []
         updated = []
@@ -527,10 +475,12 @@ class ClassBulk(APIView):
         )
 
 
-class SubjectList(APIView):
-    def get(self, request):
+class SubjectList(AsyncAPIView):
+    read_replica = True
+
+    async def get(self, request):
         qs = Subject.objects.all().order_by("name")
-        return Response(SubjectSerializer(qs, many=True).data)
+        return Response(SubjectSerializer(await _alist(qs, "SubjectList.get"), many=True).data)
 
     def post(self, request):
         serializer = SubjectWriteSerializer(data=request.data)
@@ -566,6 +516,7 @@ class SubjectBulk(APIView):
 
         if not isinstance(create_items, list) or not isinstance(update_items, list) or not isinstance(delete_items, list):
             raise ValidationError({"detail": "create/update/delete must be arrays."})
+        BULK_ITEMS.observe(len(create_items) + len(update_items) + len(delete_items), operation=type(self).__name__)
 
         created = []
         updated = []
@@ -601,15 +552,11 @@ class SubjectBulk(APIView):
         )
 
 
-class ChapterList(APIView):
-    def get(self, request):
-        qs = Chapter.objects.select_related("class_name", "subject").all()
+class ChapterList(AsyncAPIView):
+    read_replica = True
 
-        def _as_int(val):
-            try:
-                return int(val)
-            except (TypeError, ValueError):
-                return None
+    async def get(self, request):
+        qs = Chapter.objects.select_related("class_name", "subject").all()
 
         class_val = (
             request.query_params.get("class_id")
@@ -623,21 +570,21 @@ class ChapterList(APIView):
         )
 
         if class_val is not None:
-            class_pk = _as_int(class_val)
+            class_pk = as_int(class_val)
             if class_pk is not None:
                 qs = qs.filter(class_name_id=class_pk)
             else:
                 qs = qs.filter(class_name__name=class_val)
 
         if subject_val is not None:
-            subject_pk = _as_int(subject_val)
+            subject_pk = as_int(subject_val)
             if subject_pk is not None:
                 qs = qs.filter(subject_id=subject_pk)
             else:
                 qs = qs.filter(subject__name=subject_val)
 
         qs = qs.order_by("name")
-        return Response(ChapterSerializer(qs, many=True).data)
+        return Response(ChapterSerializer(await _alist(qs, "ChapterList.get"), many=True).data)
 
     def post(self, request):
         serializer = ChapterWriteSerializer(data=request.data)
@@ -673,6 +620,7 @@ class ChapterBulk(APIView):
 
         if not isinstance(create_items, list) or not isinstance(update_items, list) or not isinstance(delete_items, list):
             raise ValidationError({"detail": "create/update/delete must be arrays."})
+        BULK_ITEMS.observe(len(create_items) + len(update_items) + len(delete_items), operation=type(self).__name__)
 
         created = []
         updated = []
@@ -710,20 +658,16 @@ class ChapterBulk(APIView):
         )
 
 
-class ConceptList(APIView):
-    def get(self, request):
+class ConceptList(AsyncAPIView):
+    read_replica = True
+
+    async def get(self, request):
         qs = Concept.objects.select_related(
             "chapter",
             "chapter__class_name",
             "chapter__subject",
         ).all()
 
-        def _as_int(val):
-            try:
-                return int(val)
-            except (TypeError, ValueError):
-                return None
-
         class_val = (
             request.query_params.get("class_id")
             or request.query_params.get("classId")
@@ -741,28 +685,28 @@ class ConceptList(APIView):
         )
 
         if class_val is not None:
-            class_pk = _as_int(class_val)
+            class_pk = as_int(class_val)
             if class_pk is not None:
                 qs = qs.filter(chapter__class_name_id=class_pk)
             else:
                 qs = qs.filter(chapter__class_name__name=class_val)
 
         if subject_val is not None:
-            subject_pk = _as_int(subject_val)
+            subject_pk = as_int(subject_val)
             if subject_pk is not None:
                 qs = qs.filter(chapter__subject_id=subject_pk)
             else:
                 qs = qs.filter(chapter__subject__name=subject_val)
 
         if chapter_val is not None:
-            chapter_pk = _as_int(chapter_val)
+            chapter_pk = as_int(chapter_val)
             if chapter_pk is not None:
                 qs = qs.filter(chapter_id=chapter_pk)
             else:
                 qs = qs.filter(chapter__name=chapter_val)
 
         qs = qs.order_by("name")
-        return Response(ConceptSerializer(qs, many=True).data)
+        return Response(ConceptSerializer(await _alist(qs, "ConceptList.get"), many=True).data)
 
     def post(self, request):
         serializer = ConceptWriteSerializer(data=request.data)
@@ -804,6 +748,7 @@ class ConceptBulk(APIView):
 
         if not isinstance(create_items, list) or not isinstance(update_items, list) or not isinstance(delete_items, list):
             raise ValidationError({"detail": "create/update/delete must be arrays."})
+        BULK_ITEMS.observe(len(create_items) + len(update_items) + len(delete_items), operation=type(self).__name__)
 
         created = []
         updated = []
@@ -854,8 +799,10 @@ class ConceptBulk(APIView):
         )
 
 
-class TopicList(APIView):
-    def get(self, request):
+class TopicList(AsyncAPIView):
+    read_replica = True
+
+    async def get(self, request):
         qs = Topic.objects.select_related(
             "concept",
             "concept__chapter",
@@ -863,12 +810,6 @@ class TopicList(APIView):
             "concept__chapter__subject",
         ).all()
 
-        def _as_int(val):
-            try:
-                return int(val)
-            except (TypeError, ValueError):
-                return None
-
         class_val = (
             request.query_params.get("class_id")
             or request.query_params.get("classId")
@@ -891,35 +832,35 @@ class TopicList(APIView):
         )
 
         if class_val is not None:
-            class_pk = _as_int(class_val)
+            class_pk = as_int(class_val)
             if class_pk is not None:
                 qs = qs.filter(concept__chapter__class_name_id=class_pk)
             else:
                 qs = qs.filter(concept__chapter__class_name__name=class_val)
 
         if subject_val is not None:
-            subject_pk = _as_int(subject_val)
+            subject_pk = as_int(subject_val)
             if subject_pk is not None:
                 qs = qs.filter(concept__chapter__subject_id=subject_pk)
             else:
                 qs = qs.filter(concept__chapter__subject__name=subject_val)
 
         if chapter_val is not None:
-            chapter_pk = _as_int(chapter_val)
+            chapter_pk = as_int(chapter_val)
             if chapter_pk is not None:
                 qs = qs.filter(concept__chapter_id=chapter_pk)
             else:
                 qs = qs.filter(concept__chapter__name=chapter_val)
 
         if concept_val is not None:
-            concept_pk = _as_int(concept_val)
+            concept_pk = as_int(concept_val)
             if concept_pk is not None:
                 qs = qs.filter(concept_id=concept_pk)
             else:
                 qs = qs.filter(concept__name=concept_val)
 
         qs = qs.order_by("concept_id", "name")
-        return Response(TopicSerializer(qs, many=True).data)
+        return Response(TopicSerializer(await _alist(qs, "TopicList.get"), many=True).data)
 
     def post(self, request):
         serializer = TopicWriteSerializer(data=request.data)
@@ -961,6 +902,7 @@ class TopicBulk(APIView):
 
         if not isinstance(create_items, list) or not isinstance(update_items, list) or not isinstance(delete_items, list):
             raise ValidationError({"detail": "create/update/delete must be arrays."})
+        BULK_ITEMS.observe(len(create_items) + len(update_items) + len(delete_items), operation=type(self).__name__)
 
         created = []
         updated = []
@@ -998,100 +940,70 @@ class TopicBulk(APIView):
         )
 
 
-class ImageTypeList(APIView):
-    def get(self, request):
+class ImageTypeList(AsyncAPIView):
+    read_replica = True
+
+    async def get(self, request):
         qs = ImageType.objects.all().order_by("created_at")
-        return Response(ImageTypeSerializer(qs, many=True).data)
+        return Response(ImageTypeSerializer(await _alist(qs, "ImageTypeList.get"), many=True).data)
 
 
-class QuestionTypeList(APIView):
-    def get(self, request):
+class QuestionTypeList(AsyncAPIView):
+    read_replica = True
+
+    async def get(self, request):
         qs = QuestionType.objects.all().order_by("created_at")
-        return Response(QuestionTypeSerializer(qs, many=True).data)
+        return Response(QuestionTypeSerializer(await _alist(qs, "QuestionTypeList.get"), many=True).data)
 
 
-class UsageTypeList(APIView):
-    def get(self, request):
+class UsageTypeList(AsyncAPIView):
+    read_replica = True
+
+    async def get(self, request):
         qs = UsageType.objects.all().order_by("created_at")
-        return Response(UsageTypeSerializer(qs, many=True).data)
+        return Response(UsageTypeSerializer(await _alist(qs, "UsageTypeList.get"), many=True).data)
 
 
-class SourcesList(APIView):
-    def get(self, request):
-        qs = Sources.objects.all().order_by("created_at")
-        return Response(SourcesSerializer(qs, many=True).data)
+class SourcesList(AsyncAPIView):
+    read_replica = True
 
+    async def get(self, request):
+        qs = Sources.objects.all().order_by("created_at")
+        return Response(SourcesSerializer(await _alist(qs, "SourcesList.get"), many=True).data)
 
-def _as_int(value):
-    try:
-        return int(value)
-    except (TypeError, ValueError):
-        return None
 
+class CroppedImageList(AsyncAPIView):
+    read_replica = True
 
-class CroppedImageList(APIView):
-    def get(self, request):
+    async def get(self, request):
         qs = CroppedImage.objects.all().order_by("-created_at")
+        qs = filter_cropped_images(qs, request.query_params)
 
-        fk_filters = {
-            "image_type": "image_type_id",
-            "class_name": "class_name_id",
-            "subject": "subject_id",
-            "chapter": "chapter_id",
-            "concept": "concept_id",
-            "topic": "topic_id",
-            "question_type": "question_type_id",
-            "source": "source_id",
-        }
-        for query_key, field_name in fk_filters.items():
-            value = request.query_params.get(query_key)
-            if value in (None, ""):
-                continue
-            parsed = _as_int(value)
-            if parsed is None:
-                continue
-            qs = qs.filter(**{field_name: parsed})
-
-        difficulty = request.query_params.get("difficulty")
-        if difficulty:
-            qs = qs.filter(difficulty=difficulty)
-
-        marks = request.query_params.get("marks")
-        if marks not in (None, ""):
-            parsed_marks = _as_int(marks)
-            if parsed_marks is not None:
-                qs = qs.filter(marks=parsed_marks)
-
-        priority = request.query_params.get("priority")
-        if priority not in (None, ""):
-            parsed_priority = _as_int(priority)
-            if parsed_priority is not None:
-                qs = qs.filter(priority=parsed_priority)
-
-        verified = request.query_params.get("verified")
-        if verified in ("0", "1", "true", "false", "True", "False"):
-            truthy = verified in ("1", "true", "True")
-            qs = qs.filter(verified=truthy)
-
-        is_active = request.query_params.get("is_active")
-        if is_active in ("0", "1", "true", "false", "True", "False"):
-            truthy = is_active in ("1", "true", "True")
-            qs = qs.filter(is_active=truthy)
-
-        usage_types = request.query_params.get("usage_types") or request.query_params.get("usage_type")
-        if usage_types:
-            parts = [p.strip() for p in str(usage_types).split(",") if p.strip()]
-            ids = [i for i in (_as_int(p) for p in parts) if i is not None]
-            if ids:
-                qs = qs.filter(usage_types__id__in=ids).distinct()
-
-        page = _as_int(request.query_params.get("page") or 1) or 1
-        page_size = _as_int(request.query_params.get("page_size") or 50) or 50
+        page = as_int(request.query_params.get("page") or 1) or 1
+        page_size = as_int(request.query_params.get("page_size") or 50) or 50
         page_size = max(1, min(page_size, 200))
         start = (page - 1) * page_size
         end = start + page_size
 
-        items = list(qs[start:end])
+        # Load every relation the read serializer touches up front, so the
+        # page costs the same number of queries whatever its size.
+        page_qs = qs.select_related(
+            "image_type",
+            "class_name",
+            "subject",
+            "chapter",
+            "concept",
+            "topic",
+            "question_type",
+            "source",
+        ).prefetch_related(
+            "usage_types",
+            Prefetch("extra_images", queryset=CroppedImageExtra.objects.select_related("image_type")),
+        )
+        # Page and count are independent queries; issue both before waiting.
+        items, count = await asyncio.gather(
+            _alist(page_qs[start:end], "CroppedImageList.get", chunk_size=page_size), qs.acount()
+        )
         serializer = CroppedImageReadSerializer(items, many=True, context={"request": request})
 
         return Response(
@@ -1099,11 +1011,39 @@ class CroppedImageList(APIView):
                 "results": serializer.data,
                 "page": page,
                 "page_size": page_size,
-                "count": qs.count(),
+                "count": count,
             }
         )
 
 
+class CroppedImageExport(APIView):
+    """Stream every matching crop as NDJSON (default), CSV or a ZIP bundle.
+
+    Accepts the same filters as CroppedImageList but is not paginated;
+    choose the encoding with ?output=ndjson|csv|zip. The ZIP holds a
+    manifest.json with the metadata plus the primary and extra images.
+    """
+
+    def get(self, request):
+        output = (request.query_params.get("output") or "ndjson").lower()
+        if output not in EXPORT_FORMATS:
+            return Response(
+                {"output": [f"Must be one of: {', '.join(sorted(EXPORT_FORMATS))}."]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        stream, content_type, extension = EXPORT_FORMATS[output]
+
+        qs = CroppedImage.objects.all().order_by("-created_at")
+        qs = filter_cropped_images(qs, request.query_params)
+
+        body = stream(qs)
+        if isinstance(request._request, ASGIRequest):
+            body = export.astream(body)
+        response = StreamingHttpResponse(body, content_type=content_type)
+        response["Content-Disposition"] = f'attachment; filename="cropped-images.{extension}"'
+        return response
+
+
 class CroppedImageDetail(APIView):
     def patch(self, request, pk):
         try:
@@ -1124,3 +1064,17 @@ class CroppedImageDetail(APIView):
 
         item.delete()
         return Response(status=204)
+
+
+class MetricsView(APIView):
+    """Prometheus scrape endpoint, summed over all worker processes.
+
+    Only answers clients in settings.QUESTION_METRICS_ALLOWED_IPS (loopback
+    by default) so it can be scraped by a local collector without being public.
+    """
+
+    def get(self, request):
+        if request.META.get("REMOTE_ADDR") not in settings.QUESTION_METRICS_ALLOWED_IPS:
+            return HttpResponse(status=status.HTTP_403_FORBIDDEN)
+        REGISTRY.flush()
+        return HttpResponse(REGISTRY.exposition(), content_type=METRICS_CONTENT_TYPE)